@@ -0,0 +1,345 @@
+"""
+Flughafen-/Städte-Auflösung für Startorte (IATA-Code, Stadt, Flughafenname).
+
+Datenbasis ist `data/airports.csv` (Flughäfen plus Metropolcodes wie LON,
+PAR, MIL, mit Koordinaten; eigene Datei per Setting `AIRPORTS_CSV`, gleiche
+Spalten, `lat`/`lon` dürfen fehlen). Der
+Index wird erst beim ersten Lookup gebaut (App-Start bleibt schnell) und
+ist ein sortiertes Array normalisierter Namen: Präfixsuche per Bisektion,
+Akzente/Umlaute werden ignoriert (München = Muenchen = Munchen), Tippfehler
+fängt eine begrenzte Editierdistanz über vorgefilterte Kandidaten ab.
+
+    resolve_location("Mailand")      -> "MIL"
+    resolve_location("Muenchen")     -> "MUC"
+    resolve_location("Barcelna")     -> "BCN"
+    suggest_locations("Lon")         -> [{"code": "LON", ...}, {"code": "LHR", ...}, ...]
+    distance_matrix_km(["BER"], ["FCO", "LIS"]) -> array([[1178., 2304.]])
+"""
+import csv
+import os
+import threading
+import unicodedata
+from collections import Counter
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy as np
+
+from amadeus_client import get_setting
+
+DEFAULT_AIRPORTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+
+KIND_CITY = "city"
+KIND_AIRPORT = "airport"
+
+SUGGEST_LIMIT = 8
+# Namenswörter ab dieser Länge sind einzeln suchbar ("Heathrow", "Malpensa")
+MIN_WORD_LEN = 4
+
+EARTH_RADIUS_KM = 6371.0
+
+# Rang eines Index-Schlüssels: kleiner = wichtiger
+_RANK_CODE = 0
+_RANK_CITY = 1
+_RANK_ALIAS = 2
+_RANK_NAME = 3
+_RANK_WORD = 4
+
+_UMLAUTS = str.maketrans({"Ä": "AE", "Ö": "OE", "Ü": "UE"})
+_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 "
+_ALPHABET_IDX = {ch: i for i, ch in enumerate(_ALPHABET)}
+
+
+def normalize_name(text: str) -> str:
+    """
+    Vergleichsform eines Namens: Großbuchstaben, ohne Akzente, ß -> SS,
+    Satzzeichen als Leerzeichen.
+    """
+    text = unicodedata.normalize("NFKD", text.upper().replace("ß", "SS"))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = "".join(ch if ch.isalnum() else " " for ch in text)
+    return " ".join(text.split())
+
+
+def _name_variants(text: str) -> set:
+    # Umlaute zusätzlich ausgeschrieben indexieren (MÜNCHEN -> MUNCHEN und MUENCHEN)
+    return {normalize_name(text), normalize_name(text.upper().translate(_UMLAUTS))} - {""}
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Damerau-Levenshtein (Vertauschung zweier Nachbarn = 1), bricht ab, sobald
+    `max_distance` überschritten ist; dann wird `max_distance + 1` geliefert.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, row
+    return min(prev[-1], max_distance + 1)
+
+
+def _fuzzy_budget(query: str) -> int:
+    # Kurze Eingaben nur mit einem Tippfehler, längere mit zwei
+    if len(query) < 4:
+        return 0
+    return 1 if len(query) <= 6 else 2
+
+
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class AirportIndex:
+    """
+    Nur-Lese-Index über Flughäfen und Metropolcodes.
+
+    `_keys` ist sortiert (Präfixsuche per `bisect`), `_postings[i]` die
+    Einträge zum Schlüssel `_keys[i]` als (Rang, Reihenfolge, Eintrag-Index).
+    `_lengths` / `_letters` (Länge und Buchstabenzählung je Schlüssel, eine
+    Zeile pro Zeichen) filtern für die Tippfehler-Suche vektorisiert vor.
+    `_coords` hält (Breite, Länge) im Bogenmaß je Eintrag (NaN = unbekannt).
+    """
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        self._by_code = {}
+        postings = {}
+
+        for idx, entry in enumerate(entries):
+            self._by_code.setdefault(entry["code"], idx)
+            keys = {(entry["code"], _RANK_CODE)}
+            keys |= {(k, _RANK_CITY) for k in _name_variants(entry["city"])}
+            keys |= {(k, _RANK_NAME) for k in _name_variants(entry["name"])}
+            for alias in entry["aliases"]:
+                keys |= {(k, _RANK_ALIAS) for k in _name_variants(alias)}
+            words = {w for k, _ in keys for w in k.split() if len(w) >= MIN_WORD_LEN}
+            keys |= {(w, _RANK_WORD) for w in words}
+
+            for key, rank in keys:
+                postings.setdefault(key, {})
+                # Pro Schlüssel zählt der beste Rang eines Eintrags
+                postings[key][idx] = min(rank, postings[key].get(idx, rank))
+
+        self._keys = sorted(postings)
+        self._postings = [
+            sorted((rank, self._order(idx), idx) for idx, rank in postings[key].items())
+            for key in self._keys
+        ]
+        self._lengths = np.array([len(key) for key in self._keys], dtype=np.int16)
+        self._letters = np.zeros((len(_ALPHABET) + 1, len(self._keys)), dtype=np.int16)
+        for i, key in enumerate(self._keys):
+            for ch in key:
+                self._letters[_ALPHABET_IDX.get(ch, len(_ALPHABET)), i] += 1
+        self._coords = np.radians(np.array(
+            [(entry["lat"], entry["lon"]) for entry in entries], dtype=np.float64,
+        ).reshape(-1, 2))
+
+    def _order(self, idx: int) -> tuple:
+        # Metropolcodes vor einzelnen Flughäfen, sonst Reihenfolge in der Datei
+        return (0 if self.entries[idx]["kind"] == KIND_CITY else 1, idx)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "AirportIndex":
+        entries = []
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                code = (row.get("code") or "").strip().upper()
+                if len(code) != 3:
+                    continue
+                entries.append({
+                    "code": code,
+                    "kind": (row.get("kind") or KIND_AIRPORT).strip(),
+                    "name": (row.get("name") or "").strip(),
+                    "city": (row.get("city") or "").strip(),
+                    "country": (row.get("country") or "").strip(),
+                    "metro": (row.get("metro") or "").strip().upper(),
+                    "aliases": [a.strip() for a in (row.get("aliases") or "").split("|") if a.strip()],
+                    "lat": _coordinate(row.get("lat")),
+                    "lon": _coordinate(row.get("lon")),
+                })
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, code: str):
+        idx = self._by_code.get((code or "").strip().upper())
+        return None if idx is None else self.entries[idx]
+
+    def distance_matrix_km(self, origins: list, destinations: list) -> np.ndarray:
+        """
+        Großkreis-Entfernungen (Haversine) als Matrix Startort × Ziel in km,
+        vektorisiert; unbekannte Codes oder Koordinaten ergeben NaN.
+        """
+        def radians(codes):
+            rows = [self._by_code.get((c or "").upper()) for c in codes]
+            out = np.full((len(rows), 2), np.nan)
+            known = [i for i, idx in enumerate(rows) if idx is not None]
+            out[known] = self._coords[[rows[i] for i in known]]
+            return out
+
+        a, b = radians(origins), radians(destinations)
+        lat1, lon1 = a[:, 0:1], a[:, 1:2]
+        lat2, lon2 = b[:, 0][None, :], b[:, 1][None, :]
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+    def exact(self, query: str) -> list:
+        # Einträge, deren Code/Name/Alias genau `query` ist, bester zuerst
+        key = normalize_name(query)
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return [idx for _, _, idx in self._postings[i]]
+        return []
+
+    def _prefix_scores(self, key: str) -> dict:
+        # Eintrag-Index -> (länger als Eingabe?, Rang, fehlende Zeichen, Reihenfolge)
+        best = {}
+        i = bisect_left(self._keys, key)
+        while key and i < len(self._keys) and self._keys[i].startswith(key):
+            extra = len(self._keys[i]) - len(key)
+            for rank, order, idx in self._postings[i]:
+                score = (extra > 0, rank, extra, order)
+                if idx not in best or score < best[idx]:
+                    best[idx] = score
+            i += 1
+        return best
+
+    def _fuzzy_scores(self, key: str, max_distance: int) -> dict:
+        # Eintrag-Index -> (Distanz, Rang, Reihenfolge)
+        if not key or max_distance <= 0:
+            return {}
+        # Untere Schranke ohne Editierdistanz: jede Operation fügt höchstens
+        # einen Buchstaben hinzu und nimmt höchstens einen weg. Gemeinsame
+        # Buchstaben nur über die Zeichen der Eingabe zählen (wenige Spalten).
+        common = np.zeros(len(self._keys), dtype=np.int16)
+        for ch, count in Counter(key).items():
+            column = self._letters[_ALPHABET_IDX.get(ch, len(_ALPHABET))]
+            common += np.minimum(column, count)
+        bound = np.maximum(self._lengths - common, len(key) - common)
+        near = np.abs(self._lengths - len(key)) <= max_distance
+        near &= bound <= max_distance
+
+        best = {}
+        for i in np.flatnonzero(near):
+            distance = edit_distance(key, self._keys[i], max_distance)
+            if distance > max_distance:
+                continue
+            for rank, order, idx in self._postings[i]:
+                score = (distance, rank, order)
+                if idx not in best or score < best[idx]:
+                    best[idx] = score
+        return best
+
+    def prefix(self, query: str, limit: int = SUGGEST_LIMIT) -> list:
+        # Autovervollständigung: genaue Treffer, bessere Ränge und kürzere Ergänzungen zuerst
+        best = self._prefix_scores(normalize_name(query))
+        return sorted(best, key=best.get)[:limit]
+
+    def fuzzy(self, query: str, limit: int = SUGGEST_LIMIT, max_distance: int = None) -> list:
+        # Tippfehler-Treffer als (Distanz, Eintrag-Index), nächste zuerst
+        key = normalize_name(query)
+        best = self._fuzzy_scores(key, _fuzzy_budget(key) if max_distance is None else max_distance)
+        return [(best[idx][0], idx) for idx in sorted(best, key=best.get)[:limit]]
+
+    def _winner(self, best: dict):
+        """
+        Eindeutiger Sieger einer Trefferliste: alle Treffer mit gleich gutem
+        (Distanz bzw. Präfix, Rang) wie der beste sind derselbe Eintrag oder
+        Flughäfen seines Metropolcodes. Sonst None (mehrdeutig).
+        """
+        if not best:
+            return None
+        top = min(best, key=best.get)
+        code = self.entries[top]["code"]
+        for idx, score in best.items():
+            if score[:2] == best[top][:2] and idx != top and self.entries[idx]["metro"] != code:
+                return None
+        return code
+
+    def resolve(self, query: str):
+        """
+        Code für eine Eingabe (IATA-Code, Stadt, Flughafenname, Alias) oder
+        None. Reihenfolge: exakter Treffer, eindeutiges Präfix, eindeutig
+        nächster Tippfehler-Treffer.
+        """
+        key = normalize_name(query)
+        if not key:
+            return None
+
+        hits = self.exact(key)
+        if hits:
+            return self.entries[hits[0]]["code"]
+        if len(key) <= 3:
+            return None
+        return self._winner(self._prefix_scores(key)) or self._winner(self._fuzzy_scores(key, _fuzzy_budget(key)))
+
+    def suggest(self, query: str, limit: int = SUGGEST_LIMIT) -> list:
+        # Präfix-Treffer, aufgefüllt mit Tippfehler-Treffern (kurze Eingaben wie Codes: ein Tippfehler)
+        hits = self.prefix(query, limit)
+        if len(hits) < limit:
+            max_distance = max(_fuzzy_budget(normalize_name(query)), 1)
+            hits += [idx for _, idx in self.fuzzy(query, limit, max_distance) if idx not in hits]
+        return [self.entries[idx] for idx in hits[:limit]]
+
+
+# -----------------------------
+# Prozessweiter Index (lazy)
+# -----------------------------
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_airport_index() -> AirportIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AirportIndex.from_csv(get_setting("AIRPORTS_CSV", DEFAULT_AIRPORTS_PATH))
+    return _index
+
+
+@lru_cache(maxsize=1024)
+def resolve_location(value: str):
+    """
+    IATA-Code (Flughafen oder Metropolcode) für eine Nutzereingabe, None wenn
+    nichts eindeutig passt.
+    """
+    return get_airport_index().resolve(value or "")
+
+
+def suggest_locations(value: str, limit: int = SUGGEST_LIMIT) -> list:
+    return get_airport_index().suggest(value or "", limit)
+
+
+def distance_matrix_km(origins: list, destinations: list) -> np.ndarray:
+    return get_airport_index().distance_matrix_km(origins, destinations)
+
+
+def is_known_location(code: str) -> bool:
+    # Nur Codes aus dem Index gehen an die API (Tippfehler und erfundene Codes nicht)
+    return get_airport_index().get(code) is not None
+
+
+def describe_location(code: str) -> str:
+    # Anzeige wie "Mailand (alle Flughäfen) (MIL)" / "Wien-Schwechat (VIE)"
+    entry = get_airport_index().get(code)
+    if entry is None:
+        return code
+    return f"{entry['name'] or entry['city']} ({entry['code']})"
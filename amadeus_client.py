@@ -1,28 +1,463 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
 import requests
-import streamlit as st
+from requests.adapters import HTTPAdapter
 
+from metrics import METRICS, annotate, span
 
-def get_amadeus_token():
-    base_url = st.secrets.get("AMADEUS_BASE_URL", "https://test.api.amadeus.com")
-    client_id = st.secrets["AMADEUS_CLIENT_ID"]
-    client_secret = st.secrets["AMADEUS_CLIENT_SECRET"]
-
-    url = f"{base_url}/v1/security/oauth2/token"
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret,
-    }
+try:
+    import orjson
+except ImportError:  # optional: schnellerer JSON-Parser
+    orjson = None
 
-    resp = requests.post(
-        url,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data=data,
-        timeout=20,
-    )
-    resp.raise_for_status()
-    payload = resp.json()
-    return payload["access_token"]
+# Token wird so viele Sekunden vor Ablauf (expires_in) erneuert,
+# damit kein Request mit einem gerade abgelaufenen Token rausgeht.
+TOKEN_REFRESH_MARGIN_S = 60
+
+# Größe des Keep-Alive-Pools pro Host (sollte >= Anzahl paralleler Requests sein)
+HTTP_POOL_SIZE = 16
+
+# Standard-Anzahl Angebote pro Flight-Offers-Anfrage (Amadeus liefert nach Preis sortiert)
+DEFAULT_MAX_OFFERS = 5
+
+_ISO_DURATION = re.compile(r"P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?")
+
+
+def parse_json(content: bytes):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+# Wiederholungen bei 429 / 5xx / Verbindungsfehlern (Full-Jitter-Backoff, Retry-After hat Vorrang)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 8.0
+
+# Hedging: läuft ein Request länger als p95, wird ein Duplikat geschickt
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_S = 0.3
+HEDGE_MAX_RATIO = 0.1
+
+# Amadeus Self-Service Quota: Test = 10 TPS (max. 1 Request pro 100 ms), Production = 40 TPS
+DEFAULT_MAX_TPS = 10.0
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+_request_context = threading.local()
+
+
+@contextmanager
+def deadline_scope(deadline: float):
+    """
+    Setzt für den aktuellen Thread eine Deadline (`time.monotonic()`-Zeitpunkt),
+    die alle Client-Requests samt Retries/Backoff einhalten.
+    """
+    previous = getattr(_request_context, "deadline", None)
+    _request_context.deadline = deadline
+    try:
+        yield
+    finally:
+        _request_context.deadline = previous
+
+
+def current_deadline():
+    return getattr(_request_context, "deadline", None)
+
+
+def parse_retry_after(value: str):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """
+    Gleitendes Fenster der letzten Request-Latenzen (nur erfolgreiche Antworten).
+    """
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float):
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(p / 100.0 * len(ordered)), len(ordered) - 1)]
+
+
+class TokenBucket:
+    """
+    Thread-sicherer Token-Bucket: `acquire()` blockiert, bis wieder ein
+    Request ins Quota passt. `burst` = wie viele Requests direkt
+    hintereinander erlaubt sind.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait_s = (1.0 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class AmadeusClient:
+    """
+    Wiederverwendbarer Amadeus-Client:
+    - OAuth-Token wird bis kurz vor `expires_in` gecacht und bei Bedarf
+      genau einmal (unter Lock) erneuert, auch wenn mehrere Threads warten.
+    - Alle Calls laufen über eine gemeinsame Keep-Alive-`requests.Session`
+      mit dimensioniertem Connection-Pool und gzip.
+    - Jeder Request (auch der Token-Request) geht durch einen Token-Bucket,
+      der auf das Amadeus-TPS-Quota eingestellt ist.
+    - Bei 429 / 5xx / Verbindungsfehlern wird mit Jitter-Backoff wiederholt
+      (`Retry-After` wird beachtet), immer innerhalb der Deadline aus `deadline_scope`.
+    - Läuft ein Request länger als die p95-Latenz, geht ein Hedge-Duplikat
+      raus; die erste Antwort gewinnt (höchstens `HEDGE_MAX_RATIO` der Requests).
+    - `stats()` zählt Token-Refreshes, Requests, Retries, Hedges und
+      wiederverwendete Verbindungen.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        client_id: str,
+        client_secret: str,
+        pool_size: int = HTTP_POOL_SIZE,
+        max_tps: float = DEFAULT_MAX_TPS,
+        max_retries: int = MAX_RETRIES,
+        hedge: bool = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.rate_limiter = TokenBucket(rate=max_tps)
+        self.max_retries = int(max_retries)
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="amadeus-hedge")
+
+        self._session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._token_refreshes = 0
+        self._api_requests = 0
+        self._retries = 0
+        self._throttled = 0
+        self._hedges_sent = 0
+        self._hedges_won = 0
+
+    # -----------------------------
+    # Token
+    # -----------------------------
+    def _token_valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._token_expires_at
+
+    def get_token(self) -> str:
+        if self._token_valid():
+            return self._token
+
+        with self._token_lock:
+            # Ein anderer Thread kann den Token inzwischen erneuert haben
+            if self._token_valid():
+                return self._token
+
+            with span("token"):
+                return self._refresh_token()
+
+    def _refresh_token(self) -> str:
+        # Nur unter `_token_lock` aufrufen
+        self._throttle()
+        t0 = time.monotonic()
+        resp = self._session.post(
+            f"{self.base_url}/v1/security/oauth2/token",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data={
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            },
+            timeout=20,
+        )
+        METRICS.observe("amadeus_token_seconds", time.monotonic() - t0)
+        METRICS.inc("amadeus_requests_total", path="/v1/security/oauth2/token", status=resp.status_code)
+        resp.raise_for_status()
+        payload = resp.json()
+
+        expires_in = float(payload.get("expires_in", 0))
+        self._token = payload["access_token"]
+        self._token_expires_at = time.monotonic() + max(expires_in - TOKEN_REFRESH_MARGIN_S, 0)
+        with self._stats_lock:
+            self._token_refreshes += 1
+        return self._token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0.0
+
+    # -----------------------------
+    # Requests
+    # -----------------------------
+    def _throttle(self):
+        # Wartezeit im TPS-Limit messen (zeigt, ob mehr Parallelität überhaupt etwas bringt)
+        t0 = time.monotonic()
+        self.rate_limiter.acquire()
+        waited = time.monotonic() - t0
+        METRICS.observe("amadeus_ratelimit_wait_seconds", waited)
+        annotate(ratelimit_wait_s=round(waited, 4))
+
+    def _send_get(self, path: str, params: dict, timeout: float, throttle: bool = True):
+        token = self.get_token()
+        if throttle:
+            self._throttle()
+        t0 = time.monotonic()
+        resp = self._session.get(
+            f"{self.base_url}{path}",
+            headers={"Authorization": f"Bearer {token}"},
+            params=params,
+            timeout=timeout,
+        )
+        elapsed = time.monotonic() - t0
+        with self._stats_lock:
+            self._api_requests += 1
+        METRICS.inc("amadeus_requests_total", path=path, status=resp.status_code)
+        METRICS.observe("amadeus_request_seconds", elapsed, path=path)
+        if resp.ok:
+            self.latency.add(elapsed)
+        return resp
+
+    def _hedge_allowed(self) -> bool:
+        with self._stats_lock:
+            return self._hedges_sent < max(self._api_requests, 1) * HEDGE_MAX_RATIO
+
+    def _send_hedged(self, path: str, params: dict, timeout: float):
+        p95 = self.latency.percentile(95) if self.hedge else None
+        if p95 is None:
+            return self._send_get(path, params, timeout)
+        delay = max(p95, HEDGE_MIN_DELAY_S)
+        if delay >= timeout:
+            return self._send_get(path, params, timeout)
+
+        # Wartezeit im Ratelimiter zählt nicht zur Hedge-Verzögerung
+        self._throttle()
+        primary = self._hedge_pool.submit(self._send_get, path, params, timeout, False)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._hedge_allowed():
+            return primary.result()
+
+        hedge = self._hedge_pool.submit(self._send_get, path, params, max(timeout - delay, 0.1))
+        with self._stats_lock:
+            self._hedges_sent += 1
+        METRICS.inc("amadeus_hedges_total", outcome="sent")
+
+        done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        first = next(iter(done))
+        other = hedge if first is primary else primary
+        try:
+            resp = first.result()
+        except Exception:
+            # Erster Versuch ist fehlgeschlagen -> auf den anderen warten
+            first, resp = other, other.result()
+        if first is hedge:
+            with self._stats_lock:
+                self._hedges_won += 1
+            METRICS.inc("amadeus_hedges_total", outcome="won")
+        return resp
+
+    def _backoff_s(self, attempt: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+    def get(self, path: str, params: dict, timeout: float = 30):
+        # Ein Span pro logischem Request (inkl. Retries / Hedge) im Trace der laufenden Suche
+        with span("api", path=path):
+            return self._get(path, params, timeout)
+
+    def _get(self, path: str, params: dict, timeout: float):
+        deadline = current_deadline()
+        attempt = 0
+        token_refreshed = False
+
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"Deadline erreicht vor Request an {path}")
+            request_timeout = timeout if remaining is None else min(timeout, remaining)
+
+            retry_after = None
+            try:
+                resp = self._send_hedged(path, params, request_timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                # Token wurde serverseitig vorzeitig ungültig -> einmal erneuern und wiederholen
+                if resp.status_code == 401 and not token_refreshed:
+                    self.invalidate_token()
+                    token_refreshed = True
+                    continue
+                if resp.status_code not in RETRY_STATUS:
+                    resp.raise_for_status()
+                    return parse_json(resp.content)
+
+                if resp.status_code == 429:
+                    with self._stats_lock:
+                        self._throttled += 1
+                    METRICS.inc("amadeus_throttled_total")
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                error = requests.HTTPError(f"{resp.status_code} für {path}", response=resp)
+
+            if attempt >= self.max_retries:
+                raise error
+
+            sleep_s = self._backoff_s(attempt, retry_after)
+            if deadline is not None and time.monotonic() + sleep_s >= deadline:
+                raise DeadlineExceeded(f"Deadline erreicht beim Warten auf Retry ({path})") from error
+            time.sleep(sleep_s)
+            attempt += 1
+            annotate(attempts=attempt + 1)
+            with self._stats_lock:
+                self._retries += 1
+            METRICS.inc("amadeus_retries_total")
+
+    def stats(self) -> dict:
+        """
+        Zähler für Token-Refreshes und Verbindungs-Wiederverwendung.
+        `connections_opened` / `connections_reused` stammen direkt aus den
+        urllib3-Pools der Session (inkl. Token-Requests).
+        """
+        opened = 0
+        pool_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            pool_requests += pool.num_requests
+
+        with self._stats_lock:
+            return {
+                "token_refreshes": self._token_refreshes,
+                "api_requests": self._api_requests,
+                "retries": self._retries,
+                "throttled": self._throttled,
+                "hedges_sent": self._hedges_sent,
+                "hedges_won": self._hedges_won,
+                "latency_p95_s": self.latency.percentile(95),
+                "connections_opened": opened,
+                "connections_reused": max(pool_requests - opened, 0),
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_setting(name: str, default=None):
+    """
+    Konfiguration aus Umgebungsvariablen, sonst aus Streamlit-Secrets
+    (`.streamlit/secrets.toml`). So laufen CLI, Batch-Service und
+    Worker-Prozesse auch ohne Streamlit.
+    """
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        import streamlit as st
+        return st.secrets.get(name, default)
+    except Exception:
+        return default
+
+
+def _required_setting(name: str) -> str:
+    value = get_setting(name)
+    if not value:
+        raise KeyError(f"{name} fehlt (Umgebungsvariable oder .streamlit/secrets.toml)")
+    return value
+
+
+def get_client() -> AmadeusClient:
+    """
+    Prozessweiter Client (geteilt über alle Streamlit-Sessions und Threads).
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            _client = AmadeusClient(
+                base_url=get_setting("AMADEUS_BASE_URL", "https://test.api.amadeus.com"),
+                client_id=_required_setting("AMADEUS_CLIENT_ID"),
+                client_secret=_required_setting("AMADEUS_CLIENT_SECRET"),
+                max_tps=float(get_setting("AMADEUS_MAX_TPS", DEFAULT_MAX_TPS)),
+            )
+        return _client
+
+
+def configure_client(client: AmadeusClient):
+    """
+    Setzt den prozessweiten Client explizit (z. B. Benchmark gegen den Mock-Server).
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_amadeus_token():
+    return get_client().get_token()
 
 
 def search_roundtrip_flights(
@@ -32,66 +467,259 @@ def search_roundtrip_flights(
     return_date: str,
     adults: int = 1,
     currency: str = "EUR",
-    max_results: int = 5,
+    max_results: int = DEFAULT_MAX_OFFERS,
+    non_stop: bool = False,
+    max_price: int = None,
 ):
     """
     Nutzt Amadeus Flight Offers Search (v2).
+    `non_stop` / `max_price` (pro Person) filtern bereits serverseitig.
+    Ohne `return_date` nur der Hinflug (Einzelflug).
     Gibt rohe JSON-Antwort zurück.
     """
-    base_url = st.secrets.get("AMADEUS_BASE_URL", "https://test.api.amadeus.com")
-    token = get_amadeus_token()
-
-    url = f"{base_url}/v2/shopping/flight-offers"
     params = {
         "originLocationCode": origin_iata,
         "destinationLocationCode": destination_iata,
         "departureDate": departure_date,   # YYYY-MM-DD
-        "returnDate": return_date,         # YYYY-MM-DD
         "adults": adults,
         "currencyCode": currency,
         "max": max_results,
     }
+    if return_date:
+        params["returnDate"] = return_date  # YYYY-MM-DD
+    if non_stop:
+        params["nonStop"] = "true"
+    if max_price:
+        params["maxPrice"] = int(max_price)
+    return get_client().get("/v2/shopping/flight-offers", params=params, timeout=30)
 
-    resp = requests.get(
-        url,
-        headers={"Authorization": f"Bearer {token}"},
-        params=params,
-        timeout=30,
-    )
-    resp.raise_for_status()
-    return resp.json()
 
+def search_flight_dates(
+    origin_iata: str,
+    destination_iata: str,
+    first_departure: str,
+    last_departure: str,
+    min_nights: int,
+    max_nights: int,
+    non_stop: bool = False,
+    max_price: int = None,
+):
+    """
+    Nutzt Amadeus Flight Cheapest Date Search (v1): günstigster Preis je
+    Abflugtag × Reisedauer einer Route in einem Call (Daten aus dem
+    Amadeus-Cache, ohne Stops/Airlines). Gibt rohe JSON-Antwort zurück.
+    """
+    params = {
+        "origin": origin_iata,
+        "destination": destination_iata,
+        "departureDate": f"{first_departure},{last_departure}",
+        "duration": f"{int(min_nights)},{int(max_nights)}",
+        "oneWay": "false",
+        "viewBy": "DURATION",
+    }
+    if non_stop:
+        params["nonStop"] = "true"
+    if max_price:
+        params["maxPrice"] = int(max_price)
+    return get_client().get("/v1/shopping/flight-dates", params=params, timeout=30)
 
-def extract_cheapest_offer_summary(flight_offers_json):
+
+def extract_flight_dates(flight_dates_json) -> list:
     """
-    Gibt die günstigste Option in einfacher Form zurück:
-    { price_total, stops_outbound, stops_inbound }
-    oder None, wenn keine Daten.
+    Preis-Kalender aus einer Flight-Dates-Antwort: [[abflug, rückflug, preis], ...]
+    (Liste statt dict, damit sie direkt in den Quote-Cache passt).
     """
-    data = flight_offers_json.get("data", [])
-    if not data:
-        return None
+    grid = []
+    for item in flight_dates_json.get("data") or []:
+        try:
+            grid.append([item["departureDate"], item["returnDate"], float(item["price"]["total"])])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return grid
 
-    cheapest = None
 
-    for offer in data:
+def search_flight_destinations(
+    origin_iata: str,
+    first_departure: str,
+    last_departure: str,
+    min_nights: int,
+    max_nights: int,
+    non_stop: bool = False,
+    max_price: int = None,
+):
+    """
+    Nutzt Amadeus Flight Inspiration Search (v1): günstigster bekannter Preis
+    je Ziel ab einem Startort im Zeitraum, ein Call für alle Ziele (Daten aus
+    dem Amadeus-Cache). Gibt rohe JSON-Antwort zurück.
+    """
+    params = {
+        "origin": origin_iata,
+        "departureDate": f"{first_departure},{last_departure}",
+        "duration": f"{int(min_nights)},{int(max_nights)}",
+        "oneWay": "false",
+        "viewBy": "DESTINATION",
+    }
+    if non_stop:
+        params["nonStop"] = "true"
+    if max_price:
+        params["maxPrice"] = int(max_price)
+    return get_client().get("/v1/shopping/flight-destinations", params=params, timeout=30)
+
+
+def extract_flight_destinations(flight_destinations_json) -> dict:
+    """
+    Günstigster Preis je Ziel aus einer Flight-Destinations-Antwort: {iata: preis}.
+    """
+    prices = {}
+    for item in flight_destinations_json.get("data") or []:
         try:
-            price_total = float(offer["price"]["grandTotal"])
-            itineraries = offer.get("itineraries", [])
+            code, price = item["destination"].upper(), float(item["price"]["total"])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        prices[code] = min(price, prices.get(code, price))
+    return prices
 
-            # stops = Segmente - 1
-            stops_outbound = max(len(itineraries[0].get("segments", [])) - 1, 0) if len(itineraries) > 0 else 99
-            stops_inbound = max(len(itineraries[1].get("segments", [])) - 1, 0) if len(itineraries) > 1 else 99
 
-            row = {
-                "price_total": price_total,
-                "stops_outbound": stops_outbound,
-                "stops_inbound": stops_inbound,
-            }
+class Quote:
+    """
+    Kompakte Zusammenfassung des günstigsten Angebots eines Legs.
 
-            if cheapest is None or row["price_total"] < cheapest["price_total"]:
-                cheapest = row
-        except Exception:
+    `__slots__` statt dict; `to_record()` / `from_record()` als kleine Liste
+    für den persistenten Cache. `quote["price_total"]` funktioniert weiter
+    wie beim früheren dict.
+    """
+
+    __slots__ = (
+        "price_total",
+        "currency",
+        "stops_outbound",
+        "stops_inbound",
+        "carriers",
+        "duration_outbound_min",
+        "duration_inbound_min",
+        "outbound_departure",
+        "outbound_arrival",
+        "inbound_departure",
+        "inbound_arrival",
+    )
+
+    def __init__(
+        self,
+        price_total: float,
+        currency: str = "EUR",
+        stops_outbound: int = 99,
+        stops_inbound: int = 99,
+        carriers: tuple = (),
+        duration_outbound_min: int = None,
+        duration_inbound_min: int = None,
+        outbound_departure: str = None,
+        outbound_arrival: str = None,
+        inbound_departure: str = None,
+        inbound_arrival: str = None,
+    ):
+        self.price_total = float(price_total)
+        self.currency = currency
+        self.stops_outbound = int(stops_outbound)
+        self.stops_inbound = int(stops_inbound)
+        self.carriers = tuple(carriers)
+        self.duration_outbound_min = duration_outbound_min
+        self.duration_inbound_min = duration_inbound_min
+        self.outbound_departure = outbound_departure
+        self.outbound_arrival = outbound_arrival
+        self.inbound_departure = inbound_departure
+        self.inbound_arrival = inbound_arrival
+
+    def __getitem__(self, name: str):
+        return getattr(self, name)
+
+    def __getstate__(self):
+        return self.to_record()
+
+    def __setstate__(self, record):
+        self.__init__(*record)
+
+    def __repr__(self) -> str:
+        return f"Quote({self.price_total:.2f} {self.currency}, stops {self.stops_outbound}+{self.stops_inbound})"
+
+    def to_record(self) -> list:
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_record(cls, record):
+        if record is None:
+            return None
+        if isinstance(record, dict):
+            # Einträge im alten Format { price_total, stops_outbound, stops_inbound }
+            return cls(**{k: v for k, v in record.items() if k in cls.__slots__})
+        return cls(*record)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _duration_minutes(value: str):
+    if not value:
+        return None
+    m = _ISO_DURATION.fullmatch(value)
+    if not m:
+        return None
+    days, hours, minutes = (int(x) if x else 0 for x in m.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def _itinerary_summary(itineraries: list, idx: int):
+    if len(itineraries) <= idx:
+        return 99, None, None, None, ()
+    itinerary = itineraries[idx]
+    segments = itinerary.get("segments", [])
+    if not segments:
+        return 0, None, None, None, ()
+    # stops = Segmente - 1
+    return (
+        len(segments) - 1,
+        _duration_minutes(itinerary.get("duration")),
+        segments[0].get("departure", {}).get("at"),
+        segments[-1].get("arrival", {}).get("at"),
+        tuple(seg.get("carrierCode") for seg in segments if seg.get("carrierCode")),
+    )
+
+
+def extract_cheapest_offer_summary(flight_offers_json):
+    """
+    Gibt die günstigste Option als `Quote` zurück (Preis, Stops, Airlines,
+    Dauer, erste/letzte Segmentzeiten) oder None, wenn keine Daten.
+    Ein Durchlauf über die Preise; Details werden nur für das günstigste
+    Angebot ausgelesen.
+    """
+    data = flight_offers_json.get("data") or []
+
+    best_offer = None
+    best_price = None
+    for offer in data:
+        try:
+            price = float(offer["price"]["grandTotal"])
+        except (KeyError, TypeError, ValueError):
             continue
+        if best_price is None or price < best_price:
+            best_price, best_offer = price, offer
 
-    return cheapest
\ No newline at end of file
+    if best_offer is None:
+        return None
+
+    itineraries = best_offer.get("itineraries") or []
+    stops_out, duration_out, out_dep, out_arr, carriers_out = _itinerary_summary(itineraries, 0)
+    stops_in, duration_in, in_dep, in_arr, carriers_in = _itinerary_summary(itineraries, 1)
+
+    return Quote(
+        price_total=best_price,
+        currency=best_offer["price"].get("currency", "EUR"),
+        stops_outbound=stops_out,
+        stops_inbound=stops_in,
+        carriers=tuple(dict.fromkeys(carriers_out + carriers_in)),
+        duration_outbound_min=duration_out,
+        duration_inbound_min=duration_in,
+        outbound_departure=out_dep,
+        outbound_arrival=out_arr,
+        inbound_departure=in_dep,
+        inbound_arrival=in_arr,
+    )
@@ -1,47 +1,68 @@
 import streamlit as st
+import time
+import altair as alt
 import pandas as pd
-from datetime import date, timedelta
-from amadeus_client import search_roundtrip_flights, extract_cheapest_offer_summary
+from datetime import date, datetime, timezone
+from airports import describe_location, is_known_location
+from amadeus_client import search_roundtrip_flights, extract_cheapest_offer_summary, get_client
+from quote_cache import DEFAULT_CACHE_PATH, QuoteCache, SingleFlight
+from metrics import METRICS, SearchTrace, annotate, current_span, stage, trace_scope
+from prewarm import CachePrewarmer
+from price_history import DEFAULT_HISTORY_PATH, PriceHistory
+from quote_providers import FareDataset
+from ranking import ResultTable
+from search_engine import DEFAULT_MAX_WORKERS
+from trip_search import (
+    DEFAULT_SEARCH_DEADLINE_S,
+    SUPPORTED_COUNTRIES,
+    WINDOW_STRATEGY_ADAPTIVE,
+    WINDOW_STRATEGY_CALENDAR,
+    WINDOW_STRATEGY_ONEWAY,
+    WINDOW_STRATEGY_WEEKLY,
+    LegFetcher,
+    SearchParams,
+    new_combo_count,
+    normalize_origin_to_iata,
+    rank_results,
+    run_search,
+    unknown_origin_message,
+)
 
 st.set_page_config(page_title="MeetMeCheap MVP", layout="wide")
 
 st.title("MeetMeCheap — gemeinsamer günstiger Tripfinder (MVP)")
-st.caption("Version 2: Echte Flugdaten (Amadeus Test API) + Ranking für 1 oder 2 Startstädte")
+st.caption("Version 2: Echte Flugdaten (Amadeus Test API) + Ranking für 1, 2 oder eine Gruppe von Startstädten")
 
 # -----------------------------
-# Config (klein halten = gratis-freundlich)
+# Anzeige-Config (Ziele, Fenster, Filter: siehe trip_search.py)
 # -----------------------------
-DESTINATIONS = [
-    {"destination": "Rom", "country": "Italien", "iata": "FCO"},
-    {"destination": "Mailand", "country": "Italien", "iata": "MXP"},
-    {"destination": "Neapel", "country": "Italien", "iata": "NAP"},
-    {"destination": "Barcelona", "country": "Spanien", "iata": "BCN"},
-    {"destination": "Valencia", "country": "Spanien", "iata": "VLC"},
-    {"destination": "Palma", "country": "Spanien", "iata": "PMI"},
-    {"destination": "Lissabon", "country": "Portugal", "iata": "LIS"},
-    {"destination": "Porto", "country": "Portugal", "iata": "OPO"},
-    {"destination": "Athen", "country": "Griechenland", "iata": "ATH"},
-    {"destination": "Prag", "country": "Tschechien", "iata": "PRG"},
-    {"destination": "Budapest", "country": "Ungarn", "iata": "BUD"},
-    {"destination": "Kopenhagen", "country": "Dänemark", "iata": "CPH"},
-]
-
-SUPPORTED_COUNTRIES = sorted(list({d["country"] for d in DESTINATIONS}))
-
-CITY_TO_IATA = {
-    "BERLIN": "BER",
-    "BER": "BER",
-    "WIEN": "VIE",
-    "VIENNA": "VIE",
-    "VIE": "VIE",
-    "MÜNCHEN": "MUC",
-    "MUENCHEN": "MUC",
-    "MUNICH": "MUC",
-    "MUC": "MUC",
-    "HAMBURG": "HAM",
-    "HAM": "HAM",
-    "FRANKFURT": "FRA",
-    "FRA": "FRA",
+# Ergebnistabelle: so viele Zeilen werden angezeigt (CSV enthält alle)
+RESULTS_TOP_N = 50
+
+# Streaming-Anzeige: so viele Zeilen im Zwischenstand, höchstens alle X Sekunden neu zeichnen
+STREAM_TOP_N = 10
+STREAM_RENDER_INTERVAL_S = 0.5
+MISSING_LEGS_SHOWN = 30
+
+# Preisverlauf: Beobachtungen der letzten X Tage, Stabilität für die Top-N
+PRICE_HISTORY_DAYS = 60
+PRICE_HISTORY_TOP_N = 3
+
+# Performance-Panel: so viele Spans im Wasserfall (die längsten zuerst behalten)
+WATERFALL_MAX_SPANS = 1500
+
+WINDOW_STRATEGY_LABELS = {
+    WINDOW_STRATEGY_ADAPTIVE: "Adaptiv (ganzer Zeitraum)",
+    WINDOW_STRATEGY_WEEKLY: "Wöchentlich ab Startdatum",
+    WINDOW_STRATEGY_CALENDAR: "Preiskalender (alle Ziele & Tage, dann bestätigen)",
+    WINDOW_STRATEGY_ONEWAY: "Einzelflüge kombinieren (alle Reisedauern, dann bestätigen)",
+}
+
+DATA_SOURCE_API = "amadeus"
+DATA_SOURCE_DATASET = "dataset"
+DATA_SOURCE_LABELS = {
+    DATA_SOURCE_API: "Amadeus (live)",
+    DATA_SOURCE_DATASET: "Offline-Datensatz (ohne API-Quota)",
 }
 
 # -----------------------------
@@ -55,6 +76,11 @@ origin_b = st.sidebar.text_input(
     value="Wien",
     help="Leer lassen = Single-Origin-Modus (nur günstigste Flüge von Start A)"
 )
+origin_group = st.sidebar.text_input(
+    "Weitere Startstädte (optional, Gruppe)",
+    value="",
+    help="Kommagetrennt, z. B. `HAM, Frankfurt, London` – jede Person fliegt von ihrer eigenen Stadt (3–6 Startorte). Städte mit mehreren Flughäfen (London, Paris, Mailand …) werden als Metropolcode gesucht."
+)
 
 date_range = st.sidebar.date_input(
     "Suchzeitraum (Abflugdatum von–bis)",
@@ -77,21 +103,60 @@ nonstop_only = st.sidebar.checkbox("Nur Direktflüge", value=False)
 st.sidebar.markdown("---")
 max_destinations = st.sidebar.slider("Max. Ziele prüfen (API-Calls sparen)", 3, 12, 6)
 max_date_windows = st.sidebar.slider("Max. Datumsfenster prüfen (API-Calls sparen)", 1, 10, 4)
+window_strategy = st.sidebar.radio(
+    "Datumsfenster-Strategie",
+    options=list(WINDOW_STRATEGY_LABELS),
+    format_func=WINDOW_STRATEGY_LABELS.get,
+    help="Adaptiv: gleiche Anzahl Calls, aber erst grob über den ganzen Zeitraum, "
+         "dann verfeinert rund um die günstigsten Termine je Ziel. "
+         "Preiskalender: ein Call pro Route liefert alle Abflugtage × Reisedauern (alle Ziele der Länderauswahl); "
+         "nur die günstigsten Ziele/Termine werden danach mit echten Angeboten bestätigt – gut für lange Zeiträume. "
+         "Einzelflüge: Hinflüge je Abflugtag und Rückflüge je Rückflugtag, kombiniert zu jeder Reisedauer – "
+         "gut für eine große Nächte-Spanne (z. B. 2–10); geprüft wird ein zusammenhängender Block von Abflugtagen "
+         "ab Beginn des Zeitraums, die besten Paare werden als Hin- und Rückflug bestätigt. "
+         "Wären Hin-/Rückflüge für dieselben Termine billiger, wird normal gesucht."
+)
+stream_results = st.sidebar.checkbox(
+    "Ergebnisse live anzeigen",
+    value=True,
+    help="Zeigt und sortiert Treffer schon während der Suche; die Suche kann dann abgebrochen werden."
+)
+max_parallel_calls = st.sidebar.slider(
+    "Parallele API-Anfragen",
+    1, 8, DEFAULT_MAX_WORKERS,
+    help="Mehr parallele Anfragen = schnellere Suche. Das Amadeus-TPS-Limit wird trotzdem eingehalten."
+)
+max_search_seconds = st.sidebar.slider(
+    "Max. Suchdauer (Sekunden)",
+    10, 120, DEFAULT_SEARCH_DEADLINE_S, step=5,
+    help="Danach wird mit den bis dahin gefundenen Flügen gerankt; fehlende Verbindungen werden angezeigt."
+)
+
+# Offline-Datensatz nur anbieten, wenn FARE_DATASET_PATH gesetzt ist (siehe quote_providers.FareDataset)
+data_source = DATA_SOURCE_API
+if st.secrets.get("FARE_DATASET_PATH"):
+    data_source = st.sidebar.radio(
+        "Datenquelle",
+        options=list(DATA_SOURCE_LABELS),
+        format_func=DATA_SOURCE_LABELS.get,
+        help="Offline: Preise aus einer lokalen Preisdatei (Demos, Lasttests) – ganze Raster in Millisekunden, "
+             "dafür so aktuell wie die Datei. Mehr Ziele/Datumsfenster kosten dort nichts."
+    )
+
+show_perf_panel = st.sidebar.checkbox(
+    "Performance-Panel anzeigen",
+    value=False,
+    help="Wasserfall der letzten Suche, Cache-Treffer und Quota-Verbrauch – zum Einstellen von Parallelität und Cache-Dauer."
+)
 
 # Button-Text je nach Modus
-single_mode_preview = (origin_b.strip() == "")
+single_mode_preview = (origin_b.strip() == "" and origin_group.strip() == "")
 find_btn_label = "Günstige Flüge finden" if single_mode_preview else "Günstige gemeinsame Trips finden"
 find_btn = st.sidebar.button(find_btn_label)
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def normalize_origin_to_iata(value: str) -> str:
-    if not value:
-        return ""
-    cleaned = value.strip().upper()
-    return CITY_TO_IATA.get(cleaned, cleaned)
-
 def parse_date_range(input_value):
     if isinstance(input_value, (tuple, list)) and len(input_value) == 2:
         start_date, end_date = input_value[0], input_value[1]
@@ -102,210 +167,362 @@ def parse_date_range(input_value):
         return input_value, input_value
     return None, None
 
-def generate_trip_windows(start_date: date, end_date: date, min_nights: int, max_nights: int, max_windows: int = 4):
-    windows = []
-    if not start_date or not end_date:
-        return windows
-
-    current = start_date
-    preferred_nights = sorted(set([min_nights, max_nights, (min_nights + max_nights) // 2]))
-
-    while current <= end_date and len(windows) < max_windows:
-        added = False
-        for nights in preferred_nights:
-            ret = current + timedelta(days=int(nights))
-            if ret <= (end_date + timedelta(days=max_nights)):
-                windows.append({
-                    "depart_date": current.isoformat(),
-                    "return_date": ret.isoformat(),
-                    "nights": nights,
-                })
-                added = True
-                if len(windows) >= max_windows:
-                    break
-        current += timedelta(days=7)
-        if not added and current > end_date:
-            break
-
-    unique = []
-    seen = set()
-    for w in windows:
-        key = (w["depart_date"], w["return_date"], w["nights"])
-        if key not in seen:
-            seen.add(key)
-            unique.append(w)
-    return unique[:max_windows]
-
-def score_joint_results(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df["total_price"] = df["price_a"] + df["price_b"]
-    df["fairness_gap"] = (df["price_a"] - df["price_b"]).abs()
-    df["travel_penalty"] = (df["stops_a"] + df["stops_b"]) * 15
-    df["score"] = df["total_price"] + 0.35 * df["fairness_gap"] + df["travel_penalty"]
-    return df.sort_values(["score", "total_price", "fairness_gap"], ascending=True)
-
-def score_single_results(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df["travel_penalty"] = df["stops_a"] * 15
-    df["score"] = df["price_a"] + df["travel_penalty"]
-    return df.sort_values(["score", "price_a"], ascending=True)
-
-def apply_post_filters(df: pd.DataFrame, single_mode: bool) -> pd.DataFrame:
-    df = df.copy()
-
-    if country_filter:
-        df = df[df["country"].isin(country_filter)]
-
-    min_nights, max_nights = nights_range
-    df = df[(df["nights"] >= min_nights) & (df["nights"] <= max_nights)]
-
-    if budget_per_person and budget_per_person > 0:
-        if single_mode:
-            df = df[df["price_a"] <= budget_per_person]
-        else:
-            df = df[(df["price_a"] <= budget_per_person) & (df["price_b"] <= budget_per_person)]
-
-    if nonstop_only:
-        if single_mode:
-            df = df[df["stops_a"] == 0]
-        else:
-            df = df[(df["stops_a"] == 0) & (df["stops_b"] == 0)]
-
-    return df
+@st.cache_resource(show_spinner=False)
+def get_quote_cache() -> QuoteCache:
+    # Prozessweit geteilt; über die SQLite-Datei auch zwischen Prozessen/Neustarts
+    return QuoteCache(path=st.secrets.get("QUOTE_CACHE_PATH", DEFAULT_CACHE_PATH))
+
+@st.cache_resource(show_spinner=False)
+def get_leg_single_flight() -> SingleFlight:
+    # Prozessweit: identische Leg-Abfragen aus mehreren Sessions teilen sich einen API-Call
+    return SingleFlight()
+
+@st.cache_resource(show_spinner=False)
+def get_price_history() -> PriceHistory:
+    # Jeder API-Preis wird mitgeschrieben (Parquet, partitioniert nach Ziel/Startort/Monat)
+    return PriceHistory(st.secrets.get("PRICE_HISTORY_PATH", DEFAULT_HISTORY_PATH))
+
+@st.cache_resource(show_spinner=False)
+def get_prewarmer():
+    # Optional: im Hintergrund die meistgefragten Legs vor Ablauf neu laden (nur mit freiem Quota)
+    if not st.secrets.get("CACHE_PREWARM", False):
+        return None
+    single_flight = get_leg_single_flight()
+    return CachePrewarmer(
+        get_quote_cache(),
+        is_busy=lambda: single_flight.stats()["in_flight"] > 0,
+        single_flight=single_flight,
+        price_history=get_price_history(),
+    ).start()
+
+@st.cache_resource(show_spinner=False)
+def get_leg_fetcher() -> LegFetcher:
+    return LegFetcher(get_quote_cache(), get_leg_single_flight(), price_history=get_price_history())
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_fetcher() -> LegFetcher:
+    # Einmal pro Prozess umwandeln/öffnen (Memory-Map); ohne Cache und Preisverlauf
+    return LegFetcher(provider=FareDataset(st.secrets["FARE_DATASET_PATH"]).load())
 
 @st.cache_data(ttl=1800, show_spinner=False)
-def fetch_cheapest_for_leg(origin_iata: str, destination_iata: str, departure_date: str, return_date: str):
-    raw = search_roundtrip_flights(
-        origin_iata=origin_iata,
-        destination_iata=destination_iata,
-        departure_date=departure_date,
-        return_date=return_date,
-        adults=1,
-        currency="EUR",
-        max_results=5,
-    )
-    return extract_cheapest_offer_summary(raw)
-
-def build_real_results(origin_a_iata: str, origin_b_iata: str, start_date: date, end_date: date, single_mode: bool) -> pd.DataFrame:
-    min_nights, max_nights = nights_range
-    windows = generate_trip_windows(
-        start_date=start_date,
-        end_date=end_date,
-        min_nights=min_nights,
-        max_nights=max_nights,
-        max_windows=max_date_windows,
-    )
-
-    if not windows:
-        return pd.DataFrame()
-
-    candidates = DESTINATIONS
-    if country_filter:
-        candidates = [d for d in candidates if d["country"] in country_filter]
-    candidates = candidates[:max_destinations]
-
-    rows = []
-    calls_per_combo = 1 if single_mode else 2
-    total_calls_est = len(candidates) * len(windows) * calls_per_combo
+def fetch_cheapest_for_leg(
+    origin_iata: str,
+    destination_iata: str,
+    departure_date: str,
+    return_date: str,
+    non_stop: bool = False,
+    max_price: int = None,
+):
+    """
+    Leg-Abfrage über den headless Kern (persistenter Cache → Single-Flight → API),
+    zusätzlich pro Streamlit-Prozess im Speicher gecacht.
+    """
+    return get_leg_fetcher()(origin_iata, destination_iata, departure_date, return_date, non_stop, max_price)
+
+def fetch_leg_traced(**leg):
+    # Treffer im Speicher-Cache von st.cache_data erreichen den LegFetcher nicht -> hier zählen
+    record = current_span()
+    quote = fetch_cheapest_for_leg(**leg)
+    if record is not None and "source" not in record:
+        METRICS.inc("leg_fetch_total", source="memo")
+        annotate(source="memo")
+    return quote
+
+def build_real_results(params: SearchParams, on_update=None, base=None, source: str = DATA_SOURCE_API):
+    """
+    Führt die Suche über `trip_search.run_search` aus und zeigt Fortschritt,
+    eingesparte Calls und fehlende Verbindungen an; gibt den `PriceTensor` zurück.
+    `on_update(tensor, complete_combos)` wird nach jeder fertigen
+    (Ziel, Fenster)-Kombination aufgerufen (Streaming-Anzeige).
+    `base`: Tensor der letzten Suche dieser Session – nur fehlende Kombinationen werden geladen.
+    `source`: Datenquelle (`DATA_SOURCE_API` oder `DATA_SOURCE_DATASET`).
+    """
+    offline = source == DATA_SOURCE_DATASET
+    fetcher = get_dataset_fetcher() if offline else get_leg_fetcher()
     progress = st.progress(0)
     status = st.empty()
-    done_calls = 0
-
-    for dest in candidates:
-        for w in windows:
-            if single_mode:
-                status.info(
-                    f"Suche: {origin_a_iata} → {dest['destination']} "
-                    f"({w['depart_date']} bis {w['return_date']})"
-                )
-            else:
-                status.info(
-                    f"Suche: {origin_a_iata}/{origin_b_iata} → {dest['destination']} "
-                    f"({w['depart_date']} bis {w['return_date']})"
-                )
-
-            try:
-                quote_a = fetch_cheapest_for_leg(
-                    origin_iata=origin_a_iata,
-                    destination_iata=dest["iata"],
-                    departure_date=w["depart_date"],
-                    return_date=w["return_date"],
-                )
-            except Exception:
-                quote_a = None
-            done_calls += 1
-            progress.progress(min(done_calls / max(total_calls_est, 1), 1.0))
-
-            if not quote_a:
-                continue
-
-            if single_mode:
-                rows.append({
-                    "destination": dest["destination"],
-                    "country": dest["country"],
-                    "destination_iata": dest["iata"],
-                    "depart_date": w["depart_date"],
-                    "return_date": w["return_date"],
-                    "nights": w["nights"],
-                    "price_a": float(quote_a["price_total"]),
-                    "stops_a": int(quote_a["stops_outbound"]) + int(quote_a["stops_inbound"]),
-                })
-                continue
-
-            try:
-                quote_b = fetch_cheapest_for_leg(
-                    origin_iata=origin_b_iata,
-                    destination_iata=dest["iata"],
-                    departure_date=w["depart_date"],
-                    return_date=w["return_date"],
-                )
-            except Exception:
-                quote_b = None
-            done_calls += 1
-            progress.progress(min(done_calls / max(total_calls_est, 1), 1.0))
-
-            if not quote_b:
-                continue
-
-            rows.append({
-                "destination": dest["destination"],
-                "country": dest["country"],
-                "destination_iata": dest["iata"],
-                "depart_date": w["depart_date"],
-                "return_date": w["return_date"],
-                "nights": w["nights"],
-                "price_a": float(quote_a["price_total"]),
-                "price_b": float(quote_b["price_total"]),
-                "stops_a": int(quote_a["stops_outbound"]) + int(quote_a["stops_inbound"]),
-                "stops_b": int(quote_b["stops_outbound"]) + int(quote_b["stops_inbound"]),
-            })
+    phase = [""]
+
+    def show_phase(name):
+        phase[0] = name
+        progress.progress(0)
+
+    def show_progress(leg, quote, done_calls, total_calls_est):
+        progress.progress(min(done_calls / max(total_calls_est, 1), 1.0))
+        depart, ret = leg_dates(leg)
+        status.info(
+            f"{phase[0]}: {leg['origin_iata']} → {leg['destination_iata']} "
+            f"({depart} bis {ret}) • {done_calls}/{total_calls_est}"
+        )
+
+    result = run_search(
+        params,
+        fetch=fetcher if offline else fetch_leg_traced,
+        on_leg=show_progress,
+        on_update=on_update,
+        on_phase=show_phase,
+        base=base,
+        fetch_dates=fetcher.date_grid,
+        fetch_inspiration=fetcher.inspiration,
+        fetch_grid=fetcher.price_grid,
+        fetch_oneway=fetcher.oneway,
+    )
 
     progress.empty()
     status.empty()
+    fetcher.record_demand(result["requested_keys"])
+    fetcher.flush_history()
+    if result["calls_saved"]:
+        st.caption(f"{result['calls_saved']} API-Calls durch Filter (Budget/Direktflug) eingespart.")
+    prescreen = result["prescreen"]
+    if prescreen and prescreen["selected"] < prescreen["catalogue"]:
+        st.caption(
+            f"Vorauswahl: {prescreen['selected']} von {prescreen['catalogue']} Zielen nach Entfernung und "
+            f"Balance zwischen den Startorten ({prescreen['priced']} mit Inspiration-Preis)."
+        )
+    calendar = result["calendar"]
+    if calendar:
+        st.caption(
+            f"Preiskalender: {calendar['routes']} Routen in {calendar['calls']} Calls geprüft, "
+            f"{calendar['confirmed']} günstigste Termine mit echten Angeboten bestätigt."
+            + (f" Ohne Kalenderdaten (grobe Fenster): {', '.join(calendar['fallback'])}." if calendar["fallback"] else "")
+        )
+    oneway = result["oneway"]
+    if oneway and not oneway["supported"]:
+        st.info(
+            "Einzelflüge: Die Datenquelle kennt nur Hin- und Rückflüge – "
+            "stattdessen wurden gleichmäßig verteilte Reisefenster geprüft."
+        )
+    elif oneway and not oneway["screened"]:
+        st.info(
+            f"Einzelflüge lohnen sich hier nicht ({oneway['plan_calls']} Abfragen je Route für nur "
+            f"{oneway['pairs']} Termin-Paare) – stattdessen wurden gleichmäßig verteilte Reisefenster geprüft."
+        )
+    elif oneway:
+        st.caption(
+            f"Einzelflüge: {oneway['calls']} Abfragen für {oneway['pairs']} Termin-Paare je Route "
+            f"(Abflug {oneway['first_departure']} bis {oneway['last_departure']}; als Hin-/Rückflug wären es "
+            f"{oneway['roundtrip_calls']} Abfragen), {oneway['confirmed']} günstigste Paare als Hin- und Rückflug bestätigt."
+            + (f" Ohne Einzelflüge (grobe Fenster): {', '.join(oneway['fallback'])}." if oneway["fallback"] else "")
+        )
+    if result["reused"]:
+        st.caption(f"{result['reused']} Kombinationen aus der letzten Suche übernommen (nicht neu geladen).")
+    show_missing_legs(result["missing"], result["failed"])
+
+    return result["tensor"]
+
+def leg_dates(leg: dict) -> tuple:
+    """
+    (Abflug, Rückflug) eines Legs; Kalender-Routen haben stattdessen einen Abflug-Zeitraum.
+    """
+    if "first_departure" in leg:
+        return leg["first_departure"], leg["last_departure"]
+    return leg["departure_date"], leg.get("return_date") or "–"
+
+def show_missing_legs(missing_legs: list, failed_legs: list):
+    if not missing_legs and not failed_legs:
+        return
+    st.warning(
+        f"Unvollständige Suche: {len(missing_legs)} Verbindungen nicht rechtzeitig geladen, "
+        f"{len(failed_legs)} fehlgeschlagen. Die Ergebnisse basieren auf den fertigen Abfragen."
+    )
+    rows = [(leg, "Zeitlimit erreicht") for leg in missing_legs] + list(failed_legs)
+    with st.expander("Fehlende Verbindungen anzeigen"):
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Von": leg["origin_iata"],
+                    "Nach": leg["destination_iata"],
+                    "Abflug": leg_dates(leg)[0],
+                    "Rückflug": leg_dates(leg)[1],
+                    "Grund": reason,
+                }
+                for leg, reason in rows[:MISSING_LEGS_SHOWN]
+            ]),
+            use_container_width=True,
+        )
+        if len(rows) > MISSING_LEGS_SHOWN:
+            st.caption(f"… und {len(rows) - MISSING_LEGS_SHOWN} weitere.")
+
+def show_performance_panel(trace: SearchTrace):
+    """
+    Wasserfall der letzten Suche (ein Balken pro Span, eine Zeile pro Thread)
+    plus Cache-/Quota-Übersicht; Export als JSON Lines / Prometheus-Text.
+    """
+    summary = trace.summary()
+    stages = summary["stages"]
+    legs = stages.get("leg", {})
+    sources = legs.get("sources", {})
+    cached = sources.get("cache", 0) + sources.get("memo", 0) + sources.get("coalesced", 0)
+    spans = list(trace.spans)
+
+    with st.expander("Performance der letzten Suche", expanded=True):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Suchdauer", f"{summary['wall_s']:.1f} s")
+        col2.metric("Legs aus Cache", f"{cached}/{legs.get('count', 0)}")
+        col3.metric("API-Requests (Quota)", stages.get("api", {}).get("count", 0) + stages.get("token", {}).get("count", 0))
+        col4.metric("Wartezeit TPS-Limit", f"{sum(s.get('ratelimit_wait_s', 0) for s in spans):.1f} s")
+        st.caption(
+            "Quellen: " + (" • ".join(f"{count}× {source}" for source, count in sorted(sources.items())) or "–")
+            + " (memo = Speicher-Cache dieser App, cache = SQLite, coalesced = gleiche Abfrage lief schon)"
+        )
 
-    if not rows:
-        return pd.DataFrame()
+        if spans:
+            if len(spans) > WATERFALL_MAX_SPANS:
+                spans = sorted(spans, key=lambda s: s["duration_s"], reverse=True)[:WATERFALL_MAX_SPANS]
+            frame = pd.DataFrame(spans)
+            frame["end_s"] = frame["start_s"] + frame["duration_s"]
+            tooltip = [c for c in ("name", "origin", "destination", "depart", "source", "path", "duration_s", "ratelimit_wait_s") if c in frame]
+            chart = alt.Chart(frame).mark_bar().encode(
+                x=alt.X("start_s:Q", title="Sekunden seit Suchstart"),
+                x2="end_s:Q",
+                y=alt.Y("thread:N", title=None, sort="ascending"),
+                color=alt.Color("name:N", title="Span"),
+                tooltip=tooltip,
+            )
+            st.altair_chart(chart, use_container_width=True)
+
+        st.dataframe(
+            pd.DataFrame([
+                {"Abschnitt": name, "Anzahl": s["count"], "Summe (s)": s["total_s"], "Max (s)": s["max_s"]}
+                for name, s in stages.items()
+            ]),
+            use_container_width=True,
+        )
 
-    df = pd.DataFrame(rows)
-    df["depart_date_dt"] = pd.to_datetime(df["depart_date"]).dt.date
-    df["return_date_dt"] = pd.to_datetime(df["return_date"]).dt.date
-    return df
+        request_hist = METRICS.histogram("amadeus_request_seconds")
+        st.caption(
+            f"Seit Prozessstart: {int(METRICS.total('amadeus_requests_total'))} API-Requests • "
+            f"p50/p95 ≤ {request_hist['p50'] or '–'} / {request_hist['p95'] or '–'} s • "
+            f"{int(METRICS.total('amadeus_throttled_total'))}× 429 • "
+            f"{int(METRICS.total('leg_fetch_total', source='api'))} Legs von der API, "
+            f"{int(METRICS.total('leg_fetch_total') - METRICS.total('leg_fetch_total', source='api'))} aus Caches"
+        )
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            "Trace (JSON Lines)", data=trace.to_json_lines(), file_name="meetcheap_trace.jsonl", mime="application/x-ndjson"
+        )
+        col2.download_button(
+            "Metriken (Prometheus)", data=METRICS.to_prometheus(), file_name="meetcheap_metrics.prom", mime="text/plain"
+        )
+
+def rank_table(table: ResultTable, params: SearchParams, k: int = None) -> pd.DataFrame:
+    """
+    Filter (Masken) + Score + Top-k auf der Spaltentabelle; gibt nur die
+    gezeigten Zeilen als Anzeige-DataFrame zurück.
+    """
+    idx, scores = rank_results(table, params, k)
+    return table.to_display_frame(idx, scores)
+
+def render_top3(out: pd.DataFrame, origin_labels: list):
+    st.subheader("Top 3 (kompakt)")
+    top3 = out.head(3).to_dict(orient="records")
+    for i, row in enumerate(top3, start=1):
+        if len(origin_labels) == 1:
+            st.markdown(
+                f"**{i}. {row['Ziel']} ({row['Land']})** — {row['Nächte']} Nächte "
+                f"({row['Abflug']} bis {row['Rückflug']}) • "
+                f"**Preis: {row['Preis (€)']}€** "
+                f"(Stops: {row['Stops (hin+zurück)']})"
+            )
+        else:
+            prices = " • ".join(f"{label}: {row[f'Preis {label} (€)']}€" for label in origin_labels)
+            stops = ", ".join(f"Stops {label}: {row[f'Stops {label} (hin+zurück)']}" for label in origin_labels)
+            st.markdown(
+                f"**{i}. {row['Ziel']} ({row['Land']})** — {row['Nächte']} Nächte "
+                f"({row['Abflug']} bis {row['Rückflug']}) • "
+                f"{prices} • "
+                f"**Gesamt: {row['Gesamtpreis (€)']}€** "
+                f"({stops})"
+            )
+
+def show_price_history(table: ResultTable, params: SearchParams):
+    """
+    Beobachtete Preise über Zeit je Ziel der Top-Ergebnisse (alle Startorte
+    der Suche) und wie stark sich der Preis der Top-Trips bisher bewegt hat.
+    """
+    history = get_price_history()
+    if not history.enabled:
+        return
+    idx, scores = rank_results(table, params, PRICE_HISTORY_TOP_N)
+    top = table.to_records(idx, scores)
+    if not top:
+        return
+
+    with st.expander("Preisverlauf (bisher beobachtete Preise)"):
+        labels = {r["destination_iata"]: r["destination"] for r in top}
+        destination = st.selectbox("Ziel", options=list(labels), format_func=labels.get, key="price_history_destination")
+        since = datetime.fromtimestamp(time.time() - PRICE_HISTORY_DAYS * 86400, tz=timezone.utc)
+        trend = history.trend(destination, since=since, by_origin=True)
+        trend = trend[trend["origin"].isin(table.origins)]
+        if trend.empty:
+            st.caption("Noch keine Beobachtungen für dieses Ziel.")
+        else:
+            st.altair_chart(
+                alt.Chart(trend).mark_line(point=True).encode(
+                    x=alt.X("bucket:T", title="Beobachtet am"),
+                    y=alt.Y("min:Q", title="Günstigster Preis (€)"),
+                    color=alt.Color("origin:N", title="Start"),
+                    tooltip=["origin", "bucket:T", "min", "median", "count"],
+                ),
+                use_container_width=True,
+            )
+
+        st.markdown("**Wie stabil sind die Preise der Top-Trips?**")
+        for i, row in enumerate(top, start=1):
+            parts = []
+            for origin in table.origins:
+                info = history.leg_stability(origin, row["destination_iata"], row["depart_date"], row["return_date"])
+                if info["change_pct_per_h"] is None:
+                    parts.append(f"{origin}: erst {info['observations']}× gesehen")
+                else:
+                    parts.append(
+                        f"{origin}: {info['observations']}× gesehen, ~{info['change_pct_per_h']:.2f} %/h "
+                        f"→ seit letzter Abfrage ±{info['expected_change_pct']:.0f} % zu erwarten"
+                    )
+            st.caption(f"{i}. {row['destination']} ({row['depart_date']} bis {row['return_date']}): " + " • ".join(parts))
 
 # -----------------------------
 # Main
 # -----------------------------
+get_prewarmer()
+
 origin_a_iata = normalize_origin_to_iata(origin_a)
 origin_b_iata = normalize_origin_to_iata(origin_b) if origin_b.strip() else ""
-single_mode = (origin_b_iata == "")
+group_inputs = [v.strip() for v in origin_group.split(",") if v.strip()]
+group_iatas = [normalize_origin_to_iata(v) for v in group_inputs]
+
+# Reihenfolge bleibt erhalten, doppelte Startorte werden nur einmal abgefragt
+origins = list(dict.fromkeys([origin_a_iata] + ([origin_b_iata] if origin_b_iata else []) + group_iatas))
+single_mode = len(origins) == 1
+group_mode = len(origins) > 2
 
 start_date, end_date = parse_date_range(date_range)
 
+search_params = SearchParams(
+    origins=origins,
+    start_date=start_date,
+    end_date=end_date,
+    nights_range=nights_range,
+    countries=country_filter,
+    budget_per_person=budget_per_person,
+    nonstop_only=nonstop_only,
+    max_destinations=max_destinations,
+    max_date_windows=max_date_windows,
+    window_strategy=window_strategy,
+    max_workers=max_parallel_calls,
+    deadline_s=max_search_seconds,
+)
+
 if single_mode:
     st.write(f"**Modus:** Single-Origin")
-    st.write(f"**Start A:** {origin_a} → `{origin_a_iata}`")
+    st.write(f"**Start A:** {origin_a} → `{describe_location(origin_a_iata)}`")
+elif group_mode:
+    st.write(f"**Modus:** Gruppe ({len(origins)} Startorte)")
+    st.write("**Startorte:** " + "  |  ".join(f"`{describe_location(o)}`" for o in origins))
 else:
     st.write(f"**Modus:** Two-Origin")
-    st.write(f"**Start A:** {origin_a} → `{origin_a_iata}`  |  **Start B:** {origin_b} → `{origin_b_iata}`")
+    st.write(f"**Start A:** {origin_a} → `{describe_location(origin_a_iata)}`  |  **Start B:** {origin_b} → `{describe_location(origin_b_iata)}`")
 
 if start_date and end_date:
     st.write(f"**Suchzeitraum:** {start_date} bis {end_date}")
@@ -314,9 +531,10 @@ with st.expander("Hinweise (wichtig für gratis Nutzung)", expanded=False):
     st.markdown(
         "- Diese Version nutzt die **Amadeus Test API** (echte API, aber Test/Quota-begrenzt).\n"
         "- Um im Gratis-Bereich zu bleiben, sind **Ziele** und **Datumsfenster** begrenzt.\n"
-        "- Nutze am besten IATA-Codes wie `BER`, `VIE` (Namen wie Berlin/Wien werden teilweise gemappt).\n"
+        "- Startorte als IATA-Code (`BER`, `VIE`) oder Name (Berlin, Wien, München, London …); Tippfehler werden erkannt, Städte mit mehreren Flughäfen als Metropolcode (`LON`, `PAR`, `MIL`) gesucht.\n"
         "- Lässt du Start B leer, läuft ein **Single-Origin-Testmodus** (gut zum Preisvergleich mit Skyscanner).\n"
-        "- Erste Ergebnisse können langsam sein; wiederholte gleiche Suchen sind durch Cache schneller."
+        "- Erste Ergebnisse können langsam sein; wiederholte gleiche Suchen sind durch Cache schneller "
+        "(Preise werden 30 Minuten auf der Festplatte gecacht, auch über Neustarts hinweg)."
     )
 
 # Optionaler API-Testbutton
@@ -333,124 +551,155 @@ if st.sidebar.button("API-Test BER → FCO (15.–18.05.2026)"):
         )
         cheapest_test = extract_cheapest_offer_summary(raw_test)
         st.success("API-Test erfolgreich ✅")
-        st.json(cheapest_test if cheapest_test else {"message": "Keine Angebote gefunden"})
+        st.json(cheapest_test.to_dict() if cheapest_test else {"message": "Keine Angebote gefunden"})
     except Exception as e:
         st.error(f"API-Test fehlgeschlagen: {e}")
 
+def show_final_results(table: ResultTable, params: SearchParams):
+    single_mode = len(table.origins) == 1
+    if len(table) == 0:
+        if single_mode:
+            st.warning("Keine Ergebnisse gefunden. Versuche mehr Länder, größeren Zeitraum oder mehr Datumsfenster.")
+        else:
+            st.warning("Keine gemeinsamen Ergebnisse gefunden. Versuche mehr Länder, größeren Zeitraum oder mehr Datumsfenster.")
+        return
+
+    # Vollständige Rangfolge nur für den CSV-Export; angezeigt werden die Top-N
+    ranked = rank_table(table, params)
+    if ranked.empty:
+        st.warning("Ergebnisse gefunden, aber nach Filtern (Budget/Nonstop/Nächte) bleibt nichts übrig.")
+        return
+
+    if single_mode:
+        st.subheader("Günstigste Flüge (Single-Origin, echte API-Daten)")
+        file_name = "meetmecheap_results_single_origin.csv"
+    elif len(table.origins) == 2:
+        st.subheader("Top gemeinsame Reiseideen (Two-Origin, echte API-Daten)")
+        file_name = "meetmecheap_results_two_origin.csv"
+    else:
+        st.subheader(f"Top gemeinsame Reiseideen (Gruppe, {len(table.origins)} Startorte, echte API-Daten)")
+        file_name = "meetmecheap_results_group.csv"
+    st.dataframe(ranked.head(RESULTS_TOP_N), use_container_width=True)
+    if len(ranked) > RESULTS_TOP_N:
+        st.caption(f"Top {RESULTS_TOP_N} von {len(ranked)} Kombinationen angezeigt; die CSV enthält alle.")
+
+    render_top3(ranked, table.origin_labels())
+    show_price_history(table, params)
+
+    csv = ranked.to_csv(index=False).encode("utf-8")
+    st.download_button(
+        "Ergebnisse als CSV herunterladen",
+        data=csv,
+        file_name=file_name,
+        mime="text/csv"
+    )
+
+def _cancel_search():
+    st.session_state["search_cancelled"] = True
+
+def store_results(tensor, params: SearchParams, complete: bool):
+    # Pro Session: Rohdaten + Parameter der letzten Suche (Filteränderungen ranken nur neu)
+    st.session_state["search_results"] = {"tensor": tensor, "params": params, "complete": complete, "source": data_source}
+
+stored = st.session_state.get("search_results")
+# Preise aus API und Datensatz nie in einem Tensor mischen
+reusable = stored if stored is not None and stored.get("source", DATA_SOURCE_API) == data_source and search_params.reuses(stored["params"]) else None
+
 if not find_btn:
-    st.info("Links Eingaben setzen und auf den Such-Button klicken.")
+    # Jeder Widget-Klick ist ein Rerun: gespeicherte Ergebnisse mit den aktuellen Filtern neu ranken
+    cancelled = st.session_state.pop("search_cancelled", False)
+    if reusable is not None:
+        if cancelled or not reusable["complete"]:
+            st.warning("Suche abgebrochen – Teilergebnisse bis zum Abbruch:")
+        elif search_params.start_date and search_params.end_date:
+            pending = new_combo_count(reusable["tensor"], search_params)
+            if pending:
+                st.info(f"Geänderte Suche: {pending} neue Kombinationen – der Such-Button lädt nur diese nach, der Rest ist schon da.")
+        show_final_results(reusable["tensor"].to_table(), search_params)
+    elif stored is not None:
+        st.info("Startorte geändert oder Budget/Direktflug gelockert – bitte neu suchen.")
+    else:
+        st.info("Links Eingaben setzen und auf den Such-Button klicken.")
 else:
-    if not origin_a_iata or len(origin_a_iata) != 3:
-        st.error("Startstadt A bitte als gültigen IATA-Code (z. B. BER) oder unterstützten Städtenamen eingeben.")
+    if not origin_a_iata:
+        st.error("Startstadt A bitte als IATA-Code (z. B. BER) oder Städtenamen eingeben.")
         st.stop()
 
-    if (not single_mode) and (not origin_b_iata or len(origin_b_iata) != 3):
-        st.error("Startstadt B bitte als gültigen IATA-Code (z. B. VIE) oder leer lassen.")
+    unknown = [v for v, code in [(origin_a, origin_a_iata), (origin_b, origin_b_iata)] + list(zip(group_inputs, group_iatas))
+               if v.strip() and not is_known_location(code)]
+    if unknown:
+        st.error("\n\n".join(unknown_origin_message(v.strip()) for v in unknown))
         st.stop()
 
     if not start_date or not end_date:
         st.error("Bitte einen gültigen Suchzeitraum auswählen.")
         st.stop()
 
+    st.session_state.pop("search_cancelled", None)
+    base = reusable["tensor"] if reusable is not None else None
+
+    cancel_slot = st.empty()
+    live_slot = st.empty()
+    on_update = None
+
+    if stream_results:
+        cancel_slot.button("Suche abbrechen (Teilergebnisse behalten)", on_click=_cancel_search)
+        last_render = [0.0]
+
+        def show_live_results(tensor, complete_combos):
+            store_results(tensor, search_params, complete=False)
+            now = time.monotonic()
+            if now - last_render[0] < STREAM_RENDER_INTERVAL_S:
+                return
+            last_render[0] = now
+
+            # Nur die Top-N werden sortiert und als Anzeige-Zeilen gebaut
+            with stage("Zwischenstand"):
+                table = tensor.to_table()
+                out = rank_table(table, search_params, k=STREAM_TOP_N)
+                if out.empty:
+                    return
+                with live_slot.container():
+                    st.subheader(f"Zwischenstand: Top {STREAM_TOP_N} ({len(table)} Kombinationen bisher)")
+                    st.dataframe(out, use_container_width=True)
+                    render_top3(out, table.origin_labels())
+
+        on_update = show_live_results
+
+    # Trace schon vor der Suche speichern: bei Abbruch zeigt das Panel den Teil bis dahin
+    trace = SearchTrace()
+    st.session_state["search_trace"] = trace
     try:
-        df = build_real_results(origin_a_iata, origin_b_iata, start_date, end_date, single_mode=single_mode)
+        with trace_scope(trace):
+            tensor = build_real_results(search_params, on_update=on_update, base=base, source=data_source)
     except Exception as e:
         st.error(f"Fehler bei der Flugsuche: {e}")
         st.stop()
+    finally:
+        cancel_slot.empty()
 
-    if df.empty:
-        if single_mode:
-            st.warning("Keine Ergebnisse gefunden. Versuche mehr Länder, größeren Zeitraum oder mehr Datumsfenster.")
-        else:
-            st.warning("Keine gemeinsamen Ergebnisse gefunden. Versuche mehr Länder, größeren Zeitraum oder mehr Datumsfenster.")
-        st.stop()
-
-    df = apply_post_filters(df, single_mode=single_mode)
-    if df.empty:
-        st.warning("Ergebnisse gefunden, aber nach Filtern (Budget/Nonstop/Nächte) bleibt nichts übrig.")
-        st.stop()
-
-    if single_mode:
-        ranked = score_single_results(df)
-
-        out = ranked.copy()
-        out["Ziel"] = out["destination"]
-        out["Land"] = out["country"]
-        out["Abflug"] = out["depart_date"]
-        out["Rückflug"] = out["return_date"]
-        out["Nächte"] = out["nights"]
-        out["Preis (€)"] = out["price_a"].round(0).astype(int)
-        out["Stops (hin+zurück)"] = out["stops_a"].astype(int)
-
-        display_cols = [
-            "Ziel", "Land", "Abflug", "Rückflug", "Nächte",
-            "Preis (€)", "Stops (hin+zurück)"
-        ]
-
-        st.subheader("Günstigste Flüge (Single-Origin, echte API-Daten)")
-        st.dataframe(out[display_cols].reset_index(drop=True), use_container_width=True)
-
-        st.subheader("Top 3 (kompakt)")
-        top3 = out[display_cols].head(3).to_dict(orient="records")
-        for i, row in enumerate(top3, start=1):
-            st.markdown(
-                f"**{i}. {row['Ziel']} ({row['Land']})** — {row['Nächte']} Nächte "
-                f"({row['Abflug']} bis {row['Rückflug']}) • "
-                f"**Preis: {row['Preis (€)']}€** "
-                f"(Stops: {row['Stops (hin+zurück)']})"
-            )
-
-        csv = out[display_cols].to_csv(index=False).encode("utf-8")
-        st.download_button(
-            "Ergebnisse als CSV herunterladen",
-            data=csv,
-            file_name="meetmecheap_results_single_origin.csv",
-            mime="text/csv"
-        )
+    live_slot.empty()
+    store_results(tensor, search_params, complete=True)
 
+    if data_source == DATA_SOURCE_DATASET:
+        st.caption(f"Offline-Datensatz: {len(get_dataset_fetcher().provider)} Preise, keine API-Requests.")
     else:
-        ranked = score_joint_results(df)
-
-        out = ranked.copy()
-        out["Ziel"] = out["destination"]
-        out["Land"] = out["country"]
-        out["Abflug"] = out["depart_date"]
-        out["Rückflug"] = out["return_date"]
-        out["Nächte"] = out["nights"]
-        out["Preis A (€)"] = out["price_a"].round(0).astype(int)
-        out["Preis B (€)"] = out["price_b"].round(0).astype(int)
-        out["Gesamtpreis (€)"] = out["total_price"].round(0).astype(int)
-        out["Fairness-Diff (€)"] = out["fairness_gap"].round(0).astype(int)
-        out["Stops A (hin+zurück)"] = out["stops_a"].astype(int)
-        out["Stops B (hin+zurück)"] = out["stops_b"].astype(int)
-
-        display_cols = [
-            "Ziel", "Land", "Abflug", "Rückflug", "Nächte",
-            "Preis A (€)", "Preis B (€)", "Gesamtpreis (€)", "Fairness-Diff (€)",
-            "Stops A (hin+zurück)", "Stops B (hin+zurück)"
-        ]
+        api_stats = get_client().stats()
+        flight_stats = get_leg_single_flight().stats()
+        st.caption(
+            f"API: {api_stats['api_requests']} Requests • {api_stats['token_refreshes']} Token-Refreshes • "
+            f"{api_stats['connections_reused']} wiederverwendete / {api_stats['connections_opened']} neue Verbindungen • "
+            f"{api_stats['retries']} Wiederholungen ({api_stats['throttled']}× 429) • "
+            f"{api_stats['hedges_won']}/{api_stats['hedges_sent']} Hedge-Requests schneller • "
+            f"{flight_stats['coalesced']} identische Abfragen zusammengelegt (seit Prozessstart)"
+        )
 
-        st.subheader("Top gemeinsame Reiseideen (Two-Origin, echte API-Daten)")
-        st.dataframe(out[display_cols].reset_index(drop=True), use_container_width=True)
+    with trace_scope(trace), stage("Anzeige"):
+        show_final_results(tensor.to_table(), search_params)
+    METRICS.inc("searches_total")
 
-        st.subheader("Top 3 (kompakt)")
-        top3 = out[display_cols].head(3).to_dict(orient="records")
-        for i, row in enumerate(top3, start=1):
-            st.markdown(
-                f"**{i}. {row['Ziel']} ({row['Land']})** — {row['Nächte']} Nächte "
-                f"({row['Abflug']} bis {row['Rückflug']}) • "
-                f"A: {row['Preis A (€)']}€ • B: {row['Preis B (€)']}€ • "
-                f"**Gesamt: {row['Gesamtpreis (€)']}€** "
-                f"(Stops A: {row['Stops A (hin+zurück)']}, Stops B: {row['Stops B (hin+zurück)']})"
-            )
-
-        csv = out[display_cols].to_csv(index=False).encode("utf-8")
-        st.download_button(
-            "Ergebnisse als CSV herunterladen",
-            data=csv,
-            file_name="meetmecheap_results_two_origin.csv",
-            mime="text/csv"
-        )
+if show_perf_panel and st.session_state.get("search_trace") is not None:
+    show_performance_panel(st.session_state["search_trace"])
 
 st.markdown("---")
-st.caption("Nächster Schritt: Zielliste erweitern, echte Stadt→IATA-Suche, bessere Datumsfenster-Strategie, Links zur Buchung.")
\ No newline at end of file
+st.caption("Nächster Schritt: Zielliste erweitern, bessere Datumsfenster-Strategie, Links zur Buchung.")
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+End-to-End-Benchmark der Flugsuche gegen den lokalen Amadeus-Mock.
+
+Treibt dieselbe Fan-out-Engine wie die App (`run_leg_grid` + `LegFetcher`)
+und den echten `AmadeusClient` über mehrere Gittergrößen
+(Ziele × Fenster × Startorte) und berichtet Wall-Time, p50/p99-Latenz
+pro Call sowie die Anzahl Upstream-Calls. Kostet kein API-Quota.
+
+    python -m bench.bench_search --grids 3x2x1,6x4x2,12x10x2 --latency-ms 300 --workers 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from amadeus_client import AmadeusClient, configure_client
+from bench.mock_amadeus import MockAmadeusServer, MockConfig
+from quote_cache import QuoteCache
+from search_engine import DEFAULT_MAX_WORKERS, run_leg_grid
+from trip_search import LegFetcher
+
+BENCH_DESTINATION_CODES = [
+    "FCO", "MXP", "NAP", "BCN", "VLC", "PMI", "LIS", "OPO", "ATH", "PRG", "BUD", "CPH",
+    "AMS", "CDG", "DUB", "EDI", "OSL", "ARN", "HEL", "WAW", "KRK", "SPU", "DBV", "NCE",
+]
+BENCH_ORIGIN_CODES = ["BER", "VIE", "MUC", "HAM", "FRA"]
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(int(round(p / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[idx]
+
+
+def bench_windows(count: int, start: date, nights: int = 3) -> list:
+    return [
+        {
+            "depart_date": (start + timedelta(days=7 * i)).isoformat(),
+            "return_date": (start + timedelta(days=7 * i + nights)).isoformat(),
+            "nights": nights,
+        }
+        for i in range(count)
+    ]
+
+
+def bench_candidates(count: int) -> list:
+    # Über die echten Codes hinaus eindeutige Kunstcodes (Q + zwei Buchstaben),
+    # sonst fallen doppelte Ziele im PriceTensor zusammen und das Gitter schrumpft
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    synthetic = (f"Q{a}{b}" for a in letters for b in letters)
+    codes = BENCH_DESTINATION_CODES[:count]
+    codes += [next(synthetic) for _ in range(count - len(codes))]
+    return [{"destination": code, "country": "Bench", "iata": code} for code in codes]
+
+
+class TimedFetch:
+    """
+    Leg-Fetch wie in der App (`LegFetcher`, optional mit persistentem Cache), misst jede Abfrage.
+    """
+
+    def __init__(self, quote_cache: QuoteCache = None):
+        self.fetcher = LegFetcher(quote_cache)
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    @property
+    def cache_hits(self) -> int:
+        return self.fetcher.stats()["cache_hits"]
+
+    def __call__(self, origin_iata, destination_iata, departure_date, return_date, non_stop=False, max_price=None):
+        t0 = time.perf_counter()
+        try:
+            return self.fetcher(origin_iata, destination_iata, departure_date, return_date, non_stop, max_price)
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - t0)
+
+
+def run_grid(server: MockAmadeusServer, n_dest: int, n_windows: int, n_origins: int, workers: int, quote_cache=None, deadline_s: float = 0) -> dict:
+    fetch = TimedFetch(quote_cache)
+    before = server.stats.snapshot()
+
+    t0 = time.perf_counter()
+    result = run_leg_grid(
+        origins=BENCH_ORIGIN_CODES[:n_origins],
+        candidates=bench_candidates(n_dest),
+        windows=bench_windows(n_windows, start=date(2026, 5, 1)),
+        fetch=fetch,
+        max_workers=workers,
+        deadline=time.monotonic() + deadline_s if deadline_s > 0 else None,
+    )
+    wall_s = time.perf_counter() - t0
+
+    after = server.stats.snapshot()
+    return {
+        "grid": f"{n_dest}x{n_windows}x{n_origins}",
+        "wall_s": round(wall_s, 3),
+        "legs": result["calls"],
+        "rows": len(result["tensor"].to_table()),
+        "p50_ms": round(percentile(fetch.latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(fetch.latencies, 99) * 1000, 1),
+        "upstream_calls": after["flight_offers"] - before["flight_offers"],
+        "token_calls": after["token"] - before["token"],
+        "throttled": after["throttled"] - before["throttled"],
+        "errors": after["errors"] - before["errors"],
+        "cache_hits": fetch.cache_hits,
+        "missing": len(result["missing"]),
+        "failed": len(result["failed"]),
+    }
+
+
+def parse_grids(value: str) -> list:
+    grids = []
+    for part in value.split(","):
+        d, w, o = (int(x) for x in part.lower().split("x"))
+        grids.append((d, w, min(o, len(BENCH_ORIGIN_CODES))))
+    return grids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline-Benchmark der Flugsuche (Mock Amadeus)")
+    parser.add_argument("--grids", default="3x2x1,6x4x2,12x10x2", help="Ziele x Fenster x Startorte, kommagetrennt")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--max-tps", type=float, default=0, help="Client-Ratelimit (0 = aus)")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--deadline-s", type=float, default=0, help="Gesamt-Deadline pro Gitter (0 = keine)")
+    parser.add_argument("--cache", action="store_true", help="Jedes Gitter kalt + warm mit persistentem Quote-Cache")
+    parser.add_argument("--json", action="store_true", help="Ergebnisse als JSON Lines ausgeben")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+    )
+
+    results = []
+    with MockAmadeusServer(config) as server, tempfile.TemporaryDirectory() as tmp:
+        configure_client(AmadeusClient(server.base_url, "bench", "bench", max_tps=args.max_tps))
+
+        for n_dest, n_windows, n_origins in parse_grids(args.grids):
+            if args.cache:
+                quote_cache = QuoteCache(os.path.join(tmp, f"bench_{n_dest}_{n_windows}_{n_origins}.sqlite"))
+                for phase in ("cold", "warm"):
+                    stats = run_grid(server, n_dest, n_windows, n_origins, args.workers, quote_cache, args.deadline_s)
+                    stats["phase"] = phase
+                    results.append(stats)
+            else:
+                results.append(run_grid(server, n_dest, n_windows, n_origins, args.workers, deadline_s=args.deadline_s))
+
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+        return
+
+    header = ["grid", "phase", "wall_s", "legs", "rows", "p50_ms", "p99_ms", "upstream_calls", "token_calls", "throttled", "errors", "cache_hits", "missing", "failed"]
+    print("  ".join(f"{h:>14}" for h in header))
+    for r in results:
+        print("  ".join(f"{str(r.get(h, '-')):>14}" for h in header))
+
+
+if __name__ == "__main__":
+    main()
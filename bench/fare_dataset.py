@@ -0,0 +1,96 @@
+"""
+Synthetischer Offline-Preisdatensatz für `quote_providers.FareDataset`.
+
+Erzeugt für Startorte × Ziele × Abflugtage × Reisedauern je einen Preis
+(Entfernung + Wochentag + Rauschen, ein Teil mit Umstieg) und schreibt ihn
+als CSV oder Parquet. Danach wird die Datei einmal umgewandelt und eine
+Rasterabfrage wie in der Suche gemessen. Kostet kein API-Quota.
+
+    python -m bench.fare_dataset --out data/fares.parquet --days 365 --nights 1-14
+    python -m search_cli --origins BER,VIE --from 2026-05-01 --to 2026-09-30 --dataset data/fares.parquet
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from airports import distance_matrix_km
+from quote_providers import FareDataset
+from trip_search import DESTINATIONS
+
+FARE_ORIGIN_CODES = ["BER", "VIE", "MUC", "HAM", "FRA", "ZRH", "CPH", "AMS", "PRG", "WAW"]
+
+
+def synthetic_fares(origins: list, destinations: list, start: date, days: int, min_nights: int, max_nights: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Eine Zeile je (Startort, Ziel, Abflug, Dauer); Startort == Ziel fällt weg.
+    """
+    rng = np.random.default_rng(seed)
+    distances = np.nan_to_num(distance_matrix_km(origins, destinations), nan=1500.0)
+    nights = np.arange(min_nights, max_nights + 1)
+    o, d, day, n = np.meshgrid(np.arange(len(origins)), np.arange(len(destinations)), np.arange(days), nights, indexing="ij")
+    o, d, day, n = o.ravel(), d.ravel(), day.ravel(), n.ravel()
+    keep = np.array(origins)[o] != np.array(destinations)[d]
+    o, d, day, n = o[keep], d[keep], day[keep], n[keep]
+
+    depart = np.datetime64(start.isoformat()) + day
+    weekday = (depart.astype("datetime64[D]").view("int64") + 3) % 7  # 0 = Montag
+    weekend = np.isin(weekday, (4, 6)) * 0.25 + np.isin((weekday + n) % 7, (4, 6)) * 0.15
+    stops = (rng.random(len(o)) < 0.4).astype(np.int8)
+    price = (35 + 0.06 * distances[o, d]) * (1 + weekend) * (1 - 0.15 * stops) * rng.lognormal(0, 0.25, len(o))
+    return pd.DataFrame({
+        "origin": np.array(origins)[o],
+        "destination": np.array(destinations)[d],
+        "depart_date": depart.astype(str),
+        "return_date": (depart + n).astype(str),
+        "price": price.round(2),
+        "stops_outbound": stops,
+        "stops_inbound": stops,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetischen Preisdatensatz erzeugen und Abfragen messen")
+    parser.add_argument("--out", default="data/fares.parquet", help="Ziel-Datei (.csv oder .parquet)")
+    parser.add_argument("--start", default=(date.today() + timedelta(days=30)).isoformat())
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--nights", default="1-14")
+    parser.add_argument("--origins", default=",".join(FARE_ORIGIN_CODES))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    origins = [c.strip().upper() for c in args.origins.split(",") if c.strip()]
+    destinations = [d["iata"] for d in DESTINATIONS]
+    min_nights, _, max_nights = args.nights.partition("-")
+
+    t0 = time.monotonic()
+    frame = synthetic_fares(origins, destinations, date.fromisoformat(args.start), args.days,
+                            int(min_nights), int(max_nights or min_nights), args.seed)
+    if args.out.endswith(".parquet"):
+        frame.to_parquet(args.out, index=False)
+    else:
+        frame.to_csv(args.out, index=False)
+    t1 = time.monotonic()
+
+    dataset = FareDataset(args.out)
+    dataset.convert(force=True)
+    dataset.load()
+    t2 = time.monotonic()
+
+    start = date.fromisoformat(args.start)
+    windows = [
+        {"depart_date": (start + timedelta(days=i)).isoformat(), "return_date": (start + timedelta(days=i + n)).isoformat()}
+        for i in range(args.days) for n in range(int(min_nights), int(max_nights or min_nights) + 1)
+    ]
+    price, _ = dataset.price_grid(origins[:2], destinations, windows)
+    t3 = time.monotonic()
+
+    print(f"{len(frame)} Zeilen in {t1 - t0:.1f} s geschrieben, in {t2 - t1:.1f} s umgewandelt ({dataset.store_dir})")
+    print(f"Raster {price.shape[0]}×{price.shape[1]}×{price.shape[2]} ({price.size} Legs) in {(t3 - t2) * 1000:.0f} ms, "
+          f"{int(np.isfinite(price).sum())} mit Preis")
+
+
+if __name__ == "__main__":
+    main()
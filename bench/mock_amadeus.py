@@ -0,0 +1,422 @@
+"""
+Lokaler Ersatz für die Amadeus-Endpunkte, die meetcheap nutzt:
+
+- POST /v1/security/oauth2/token
+- GET  /v2/shopping/flight-offers (mit returnDate Hin- und Rückflug, sonst Einzelflug)
+- GET  /v1/shopping/flight-dates (Preis-Kalender, passend zu den Angeboten)
+- GET  /v1/shopping/flight-destinations (Inspiration: günstigster Preis je Ziel)
+
+Liefert aufgezeichnete (JSON-Datei) oder synthetische Angebote mit
+konfigurierbarer Latenz, Fehlerrate und 429-Rate. Zähler unter GET /__stats.
+
+Start:  python -m bench.mock_amadeus --port 8765 --latency-ms 300 --rate-429 0.05
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TOKEN_EXPIRES_IN_S = 1799
+
+# Ziele, die die Inspiration-Suche kennt (Auszug des meetcheap-Katalogs)
+INSPIRATION_DESTINATIONS = (
+    "FCO", "MXP", "NAP", "BCN", "VLC", "PMI", "LIS", "OPO", "ATH", "PRG", "BUD", "CPH",
+    "VCE", "FLR", "CTA", "MAD", "AGP", "FAO", "HER", "SPU", "DBV", "NCE", "LON", "PAR",
+    "DUB", "AMS", "KRK", "RIX", "SOF", "MLA", "IST", "RAK",
+)
+# Inspiration: Abflugtage in diesem Abstand werden für den günstigsten Preis geprüft
+INSPIRATION_STEP_DAYS = 7
+
+
+class MockConfig:
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        latency_jitter: float = 0.5,
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after_s: int = 1,
+        offers_per_response: int = 5,
+        recorded: dict = None,
+        seed: int = 42,
+        dates_coverage: float = 1.0,
+        inspiration_destinations: tuple = INSPIRATION_DESTINATIONS,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after_s = retry_after_s
+        self.offers_per_response = offers_per_response
+        self.recorded = recorded or {}
+        # Anteil der Routen mit Kalenderdaten (die echte API kennt nicht jede Route -> 404)
+        self.dates_coverage = dates_coverage
+        self.inspiration_destinations = tuple(inspiration_destinations)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def random(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def latency_s(self) -> float:
+        # Log-Normal um den Mittelwert -> realistischer langer Schwanz
+        with self.rng_lock:
+            factor = self.rng.lognormvariate(0.0, self.latency_jitter) if self.latency_jitter > 0 else 1.0
+        return max(self.latency_ms, 0.0) * factor / 1000.0
+
+
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {
+            "token": 0, "flight_offers": 0, "flight_dates": 0, "flight_destinations": 0,
+            "errors": 0, "throttled": 0, "unauthorized": 0,
+        }
+
+    def inc(self, name: str):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            for k in self.counts:
+                self.counts[k] = 0
+
+
+def _segment(origin: str, destination: str, day: str, hour: int, duration_h: int) -> dict:
+    return {
+        "departure": {"iataCode": origin, "at": f"{day}T{hour:02d}:00:00"},
+        "arrival": {"iataCode": destination, "at": f"{day}T{min(hour + duration_h, 23):02d}:30:00"},
+        "carrierCode": "MC",
+        "number": str(100 + hour),
+        "duration": f"PT{duration_h}H30M",
+    }
+
+
+def _itinerary(origin: str, destination: str, day: str, stops: int, hour: int) -> dict:
+    if stops == 0:
+        segments = [_segment(origin, destination, day, hour, 2)]
+    else:
+        segments = [_segment(origin, "HUB", day, hour, 1)] + [_segment("HUB", destination, day, hour + 2, 1)]
+    return {"duration": f"PT{2 + 2 * stops}H30M", "segments": segments}
+
+
+def _oneway_base(origin: str, destination: str, day: str) -> float:
+    seed = int(hashlib.sha1(f"{origin}|{destination}|{day}".encode()).hexdigest()[:8], 16)
+    return 30 + random.Random(seed).random() * 140
+
+
+def synthetic_offers(params: dict, count: int) -> list:
+    """
+    Deterministische Angebote pro Anfrage (gleiche Parameter -> gleiche Preise).
+    """
+    origin = params.get("originLocationCode", "XXX")
+    destination = params.get("destinationLocationCode", "YYY")
+    depart = params.get("departureDate", date.today().isoformat())
+    ret = params.get("returnDate")
+    seed = int(hashlib.sha1(f"{origin}|{destination}|{depart}|{ret}".encode()).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+
+    # Hin- und Rückflug etwas günstiger als zwei Einzelflüge an denselben Tagen
+    base = _oneway_base(origin, destination, depart)
+    if ret:
+        base = 0.9 * (base + _oneway_base(destination, origin, ret))
+    offers = []
+    for i in range(count):
+        stops = 0 if rng.random() < 0.5 else 1
+        price = round(base * (1 + 0.15 * i) * (0.85 if stops else 1.0), 2)
+        itineraries = [_itinerary(origin, destination, depart, stops, 6 + i)]
+        if ret:
+            itineraries.append(_itinerary(destination, origin, ret, stops, 12 + i))
+        offers.append({
+            "type": "flight-offer",
+            "id": str(i + 1),
+            "itineraries": itineraries,
+            "price": {"currency": params.get("currencyCode", "EUR"), "total": f"{price:.2f}", "grandTotal": f"{price:.2f}"},
+            "validatingAirlineCodes": ["MC"],
+        })
+
+    if params.get("nonStop") == "true":
+        offers = [o for o in offers if all(len(it["segments"]) == 1 for it in o["itineraries"])]
+    if params.get("maxPrice"):
+        max_price = float(params["maxPrice"])
+        offers = [o for o in offers if float(o["price"]["grandTotal"]) <= max_price]
+    return offers
+
+
+def _route_seed(origin: str, destination: str) -> float:
+    return int(hashlib.sha1(f"{origin}|{destination}".encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+def synthetic_flight_dates(params: dict, count: int) -> list:
+    """
+    Preis-Kalender einer Route: je Abflugtag × Dauer der günstigste Preis von
+    `synthetic_offers` (Bestätigungs-Suchen liefern also denselben Preis).
+    """
+    origin, destination = params.get("origin", "XXX"), params.get("destination", "YYY")
+    first, _, last = params.get("departureDate", date.today().isoformat()).partition(",")
+    min_nights, _, max_nights = params.get("duration", "1,15").partition(",")
+    first = date.fromisoformat(first)
+    last = date.fromisoformat(last or first.isoformat())
+    min_nights, max_nights = int(min_nights), int(max_nights or min_nights)
+
+    items = []
+    day = first
+    while day <= last:
+        for nights in range(min_nights, max_nights + 1):
+            ret = (day + timedelta(days=nights)).isoformat()
+            offers = synthetic_offers({
+                "originLocationCode": origin,
+                "destinationLocationCode": destination,
+                "departureDate": day.isoformat(),
+                "returnDate": ret,
+                "nonStop": params.get("nonStop"),
+                "maxPrice": params.get("maxPrice"),
+            }, count)
+            if offers:
+                price = min(float(o["price"]["grandTotal"]) for o in offers)
+                items.append({
+                    "type": "flight-date",
+                    "origin": origin,
+                    "destination": destination,
+                    "departureDate": day.isoformat(),
+                    "returnDate": ret,
+                    "price": {"total": f"{price:.2f}"},
+                })
+        day += timedelta(days=1)
+    return items
+
+
+def synthetic_flight_destinations(params: dict, destinations: tuple, coverage: float, count: int) -> list:
+    """
+    Günstigster Preis je Ziel ab `origin` über jeden `INSPIRATION_STEP_DAYS`-ten
+    Abflugtag und die kürzeste/längste Dauer (Stichprobe des Preis-Kalenders).
+    """
+    origin = params.get("origin", "XXX")
+    first, _, last = params.get("departureDate", date.today().isoformat()).partition(",")
+    min_nights, _, max_nights = params.get("duration", "1,15").partition(",")
+    first = date.fromisoformat(first)
+    last = date.fromisoformat(last or first.isoformat())
+    durations = sorted({int(min_nights), int(max_nights or min_nights)})
+
+    items = []
+    for destination in destinations:
+        if destination == origin or _route_seed(origin, destination) >= coverage:
+            continue
+        best = None
+        day = first
+        while day <= last:
+            for nights in durations:
+                ret = (day + timedelta(days=nights)).isoformat()
+                for offer in synthetic_offers({
+                    "originLocationCode": origin,
+                    "destinationLocationCode": destination,
+                    "departureDate": day.isoformat(),
+                    "returnDate": ret,
+                    "nonStop": params.get("nonStop"),
+                    "maxPrice": params.get("maxPrice"),
+                }, count):
+                    price = float(offer["price"]["grandTotal"])
+                    if best is None or price < best[0]:
+                        best = (price, day.isoformat(), ret)
+            day += timedelta(days=INSPIRATION_STEP_DAYS)
+        if best is not None:
+            items.append({
+                "type": "flight-destination",
+                "origin": origin,
+                "destination": destination,
+                "departureDate": best[1],
+                "returnDate": best[2],
+                "price": {"total": f"{best[0]:.2f}"},
+            })
+    return items
+
+
+def _recorded_offers(recorded: dict, params: dict):
+    origin = params.get("originLocationCode")
+    destination = params.get("destinationLocationCode")
+    specific = f"{origin}-{destination}-{params.get('departureDate')}-{params.get('returnDate')}"
+    if specific in recorded:
+        return recorded[specific]
+    return recorded.get(f"{origin}-{destination}")
+
+
+def make_handler(config: MockConfig, stats: MockStats, tokens: set):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            if urlparse(self.path).path != "/v1/security/oauth2/token":
+                self._send_json(404, {"errors": [{"status": 404, "title": "NOT FOUND"}]})
+                return
+
+            stats.inc("token")
+            token = uuid.uuid4().hex
+            tokens.add(token)
+            self._send_json(200, {
+                "type": "amadeusOAuth2Token",
+                "access_token": token,
+                "token_type": "Bearer",
+                "expires_in": TOKEN_EXPIRES_IN_S,
+                "state": "approved",
+            })
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/__stats":
+                self._send_json(200, stats.snapshot())
+                return
+            endpoint = {
+                "/v2/shopping/flight-offers": "flight_offers",
+                "/v1/shopping/flight-dates": "flight_dates",
+                "/v1/shopping/flight-destinations": "flight_destinations",
+            }.get(url.path)
+            if endpoint is None:
+                self._send_json(404, {"errors": [{"status": 404, "title": "NOT FOUND"}]})
+                return
+
+            auth = self.headers.get("Authorization", "")
+            if not auth.startswith("Bearer ") or auth[len("Bearer "):] not in tokens:
+                stats.inc("unauthorized")
+                self._send_json(401, {"errors": [{"status": 401, "code": 38191, "title": "Invalid access token"}]})
+                return
+
+            stats.inc(endpoint)
+            time.sleep(config.latency_s())
+
+            roll = config.random()
+            if roll < config.rate_429:
+                stats.inc("throttled")
+                self._send_json(
+                    429,
+                    {"errors": [{"status": 429, "code": 38194, "title": "Too many requests"}]},
+                    headers={"Retry-After": str(config.retry_after_s)},
+                )
+                return
+            if roll < config.rate_429 + config.error_rate:
+                stats.inc("errors")
+                self._send_json(500, {"errors": [{"status": 500, "code": 141, "title": "SYSTEM ERROR HAS OCCURRED"}]})
+                return
+
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if endpoint == "flight_destinations":
+                items = synthetic_flight_destinations(params, config.inspiration_destinations, config.dates_coverage, config.offers_per_response)
+                self._send_json(200, {"meta": {"count": len(items)}, "data": items})
+                return
+            if endpoint == "flight_dates":
+                if _route_seed(params.get("origin"), params.get("destination")) >= config.dates_coverage:
+                    self._send_json(404, {"errors": [{"status": 404, "code": 6003, "title": "ITEM/DATA NOT FOUND OR DATA NOT EXISTING"}]})
+                    return
+                items = synthetic_flight_dates(params, config.offers_per_response)
+                self._send_json(200, {"meta": {"count": len(items)}, "data": items})
+                return
+
+            count = min(int(params.get("max", config.offers_per_response)), config.offers_per_response)
+            offers = _recorded_offers(config.recorded, params)
+            if offers is None:
+                offers = synthetic_offers(params, count)
+            self._send_json(200, {"meta": {"count": len(offers)}, "data": offers[:count]})
+
+    return Handler
+
+
+class MockAmadeusServer:
+    """
+    Startet den Mock-Server in einem Hintergrund-Thread (für Benchmarks/Tests).
+    """
+
+    def __init__(self, config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self._tokens = set()
+        self._server = ThreadingHTTPServer((host, port), make_handler(self.config, self.stats, self._tokens))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-amadeus", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler Amadeus-Mock (Token, Flight Offers, Cheapest Date und Inspiration Search)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.5, help="Sigma der Log-Normal-Verteilung (0 = konstant)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--dates-coverage", type=float, default=1.0, help="Anteil der Routen mit Preis-Kalender / Inspiration-Preis (Rest: 404 bzw. fehlt)")
+    parser.add_argument("--recorded", help="JSON-Datei: {\"BER-FCO\": [offers...], \"BER-FCO-2026-05-15-2026-05-18\": [...]}")
+    args = parser.parse_args()
+
+    recorded = None
+    if args.recorded:
+        with open(args.recorded, encoding="utf-8") as f:
+            recorded = json.load(f)
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        retry_after_s=args.retry_after,
+        recorded=recorded,
+        dates_coverage=args.dates_coverage,
+    )
+    server = MockAmadeusServer(config, host=args.host, port=args.port)
+    print(f"Mock Amadeus läuft auf {server.base_url} (AMADEUS_BASE_URL)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
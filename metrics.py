@@ -0,0 +1,320 @@
+"""
+Messpunkte für den Such-Hot-Path.
+
+- `METRICS`: prozessweite Zähler und Latenz-Histogramme (API-Requests,
+  Token-Abrufe, Ratelimit-Wartezeit, Leg-Quelle Cache/API, Ranking, ...).
+  Export als Prometheus-Textformat (`to_prometheus`, `GET /metrics` im
+  Batch-Service) oder JSON Lines (`to_json_lines`).
+- `SearchTrace`: Spans einer einzelnen Suche (Start relativ zum Suchbeginn,
+  Dauer, Thread) für die Wasserfall-Ansicht; pro Thread über `trace_scope`
+  aktiv, `span()` / `annotate()` sind ohne aktive Suche No-ops.
+
+    trace = SearchTrace()
+    with trace_scope(trace):
+        with span("leg", origin="BER") as s:
+            ...
+            annotate(source="cache")
+    METRICS.inc("leg_fetch_total", source="cache")
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Obergrenzen der Histogramm-Buckets (Sekunden)
+LATENCY_BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prometheus HELP-Texte; Namen ohne Eintrag werden ohne HELP exportiert
+METRIC_HELP = {
+    "amadeus_requests_total": "HTTP-Requests an die Amadeus-API (= verbrauchtes Quota) nach Pfad und Status",
+    "amadeus_request_seconds": "Dauer einzelner Amadeus-Requests",
+    "amadeus_token_seconds": "Dauer eines OAuth-Token-Abrufs",
+    "amadeus_ratelimit_wait_seconds": "Wartezeit im clientseitigen TPS-Limit",
+    "amadeus_retries_total": "Wiederholte Requests (Fehler, 429, 5xx)",
+    "amadeus_throttled_total": "Antworten mit Status 429",
+    "amadeus_hedges_total": "Hedge-Requests nach Ausgang (sent / won)",
+    "leg_fetch_total": "Leg-Abfragen nach Quelle (cache / api / coalesced)",
+    "leg_fetch_seconds": "Dauer einer Leg-Abfrage nach Quelle",
+    "calendar_fetch_total": "Preis-Kalender-Abfragen je Route nach Quelle (cache / api)",
+    "inspiration_fetch_total": "Inspiration-Abfragen je Startort nach Quelle (cache / api)",
+    "search_stage_seconds": "Dauer der Such-Phasen (Grobsuche, Verfeinerung, Tabelle, Ranking, Anzeige)",
+    "searches_total": "Abgeschlossene Suchen",
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    Thread-sichere Zähler (`inc`) und Histogramme (`observe`, `timer`) mit Labels.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_S):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            hist["counts"][slot] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - t0, **labels)
+
+    def total(self, name: str, **labels) -> float:
+        # Summe aller Zähler `name`, deren Labels die angegebenen enthalten
+        want = set(_label_key(labels))
+        with self._lock:
+            return sum(v for (n, key), v in self._counters.items() if n == name and want <= set(key))
+
+    def histogram(self, name: str, **labels) -> dict:
+        # Zusammengefasstes Histogramm (count, sum, p50/p95 aus den Buckets)
+        want = set(_label_key(labels))
+        counts = [0] * (len(self.buckets) + 1)
+        total_sum = 0.0
+        with self._lock:
+            for (n, key), hist in self._histograms.items():
+                if n == name and want <= set(key):
+                    counts = [a + b for a, b in zip(counts, hist["counts"])]
+                    total_sum += hist["sum"]
+        count = sum(counts)
+        return {
+            "count": count,
+            "sum": total_sum,
+            "p50": self._bucket_quantile(counts, 0.5),
+            "p95": self._bucket_quantile(counts, 0.95),
+        }
+
+    def _bucket_quantile(self, counts: list, q: float):
+        # Obergrenze des Buckets, in dem das Quantil liegt (None = keine Daten / über dem größten Bucket)
+        count = sum(counts)
+        if not count:
+            return None
+        seen = 0
+        for bound, c in zip(self.buckets, counts):
+            seen += c
+            if seen >= q * count:
+                return bound
+        return None
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # -----------------------------
+    # Export
+    # -----------------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for (name, key), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(key),
+                    "count": hist["count"],
+                    "sum": round(hist["sum"], 6),
+                    "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], hist["counts"])),
+                }
+                for (name, key), hist in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json_lines(self) -> str:
+        # Eine Zeile pro Zeitreihe, mit Zeitstempel (zum Anhängen an eine Log-Datei)
+        now = round(time.time(), 3)
+        snap = self.snapshot()
+        lines = [json.dumps({"ts": now, "type": "counter", **c}) for c in snap["counters"]]
+        lines += [json.dumps({"ts": now, "type": "histogram", **h}) for h in snap["histograms"]]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, dict(v, counts=list(v["counts"]))) for k, v in self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, key), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+        for (name, key), hist in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], hist["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(key, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {hist['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(key)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+# -----------------------------
+# Traces pro Suche
+# -----------------------------
+class SearchTrace:
+    """
+    Spans einer Suche: {"name", "start_s", "duration_s", "thread", ...Attribute}.
+    `start_s` zählt ab Erzeugung des Traces. Thread-sicher, damit die
+    Leg-Worker ihre Spans direkt eintragen können.
+    """
+
+    def __init__(self, name: str = "search"):
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self.spans = []
+
+    def now(self) -> float:
+        return time.monotonic() - self._t0
+
+    def add(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """
+        Pro Span-Name: Anzahl, Summe und Maximum der Dauer; bei Legs
+        zusätzlich die Anzahl je Quelle. `wall_s` = Zeit bis zum Ende des
+        letzten Spans.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        out = {"wall_s": round(max((s["start_s"] + s["duration_s"] for s in spans), default=0.0), 3), "stages": {}}
+        for s in spans:
+            stage = out["stages"].setdefault(s["name"], {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            stage["count"] += 1
+            stage["total_s"] += s["duration_s"]
+            stage["max_s"] = max(stage["max_s"], s["duration_s"])
+            if s.get("source"):
+                sources = stage.setdefault("sources", {})
+                sources[s["source"]] = sources.get(s["source"], 0) + 1
+        for stage in out["stages"].values():
+            stage["total_s"] = round(stage["total_s"], 4)
+            stage["max_s"] = round(stage["max_s"], 4)
+        return out
+
+    def to_json_lines(self) -> str:
+        with self._lock:
+            spans = list(self.spans)
+        header = {"trace": self.name, "started_at": round(self.started_at, 3)}
+        return "".join(json.dumps({**header, **s}) + "\n" for s in spans)
+
+
+_trace_context = threading.local()
+
+
+@contextmanager
+def trace_scope(trace: SearchTrace):
+    """
+    Setzt den Trace für den aktuellen Thread (Worker-Threads übernehmen ihn
+    explizit, siehe `LegFanOut`).
+    """
+    previous = getattr(_trace_context, "trace", None)
+    previous_stack = getattr(_trace_context, "stack", None)
+    _trace_context.trace = trace
+    _trace_context.stack = []
+    try:
+        yield trace
+    finally:
+        _trace_context.trace = previous
+        _trace_context.stack = previous_stack
+
+
+def current_trace():
+    return getattr(_trace_context, "trace", None)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Misst einen Abschnitt im aktiven Trace; das gelieferte Dict kann (wie
+    mit `annotate`) noch Attribute bekommen. Ohne aktiven Trace ein No-op.
+    """
+    trace = current_trace()
+    if trace is None:
+        yield {}
+        return
+    record = {"name": name, **attrs}
+    stack = _trace_context.stack
+    stack.append(record)
+    start = trace.now()
+    try:
+        yield record
+    finally:
+        stack.pop()
+        record["start_s"] = round(start, 4)
+        record["duration_s"] = round(trace.now() - start, 4)
+        record["thread"] = threading.current_thread().name
+        trace.add(record)
+
+
+@contextmanager
+def stage(name: str, **attrs):
+    """
+    Such-Phase: Span im aktiven Trace plus Histogramm `search_stage_seconds`.
+    """
+    with span(name, **attrs) as record, METRICS.timer("search_stage_seconds", stage=name):
+        yield record
+
+
+def current_span():
+    # Innerster offener Span dieses Threads (None ohne Trace)
+    stack = getattr(_trace_context, "stack", None)
+    return stack[-1] if stack else None
+
+
+def annotate(**attrs):
+    # Attribute am innersten offenen Span dieses Threads ergänzen (ohne Trace: nichts)
+    stack = getattr(_trace_context, "stack", None)
+    if stack:
+        stack[-1].update(attrs)
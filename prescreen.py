@@ -0,0 +1,93 @@
+"""
+Vorauswahl der Ziele vor den teuren Leg-Abfragen.
+
+Jedes Ziel des Katalogs bekommt je Startort einen geschätzten Preis:
+
+- bekannt aus Amadeus Flight Inspiration Search (ein Call je Startort für
+  alle Ziele, siehe `LegFetcher.inspiration`), sonst
+- aus der Großkreis-Entfernung über eine Gerade Preis ~ km, die je Startort
+  an dessen bekannte Inspiration-Preise angepasst wird (ohne genug Daten:
+  Standardwerte).
+
+Rang wie im Ranking: Summe über die Startorte + `FAIRNESS_WEIGHT` × Abstand
+zwischen teuerstem und günstigstem Startort. Ziele ohne Koordinaten und
+Preis landen am Ende (in Katalog-Reihenfolge), Ziele am Startort fallen weg.
+
+    rank_destinations(["BER", "VIE"], DESTINATIONS, inspiration={"BER": {"PRG": 89.0}})
+"""
+import numpy as np
+
+from airports import distance_matrix_km, get_airport_index
+from ranking import FAIRNESS_WEIGHT
+
+# Preis-Schätzung ohne Inspiration-Daten: Grundpreis + Preis pro km (Hin- und Rückflug)
+FARE_BASE_EUR = 40.0
+FARE_PER_KM_EUR = 0.05
+# Ab so vielen bekannten Preisen wird die Gerade je Startort angepasst
+MIN_FIT_POINTS = 4
+# Ziele näher als das am Startort (z. B. BER -> BER, LON -> LHR) werden nicht gesucht
+SAME_PLACE_KM = 60.0
+
+
+def known_fares(origins: list, codes: list, inspiration: dict = None) -> np.ndarray:
+    """
+    Inspiration-Preise als Matrix Startort × Ziel (NaN = unbekannt). Preise
+    für Flughäfen gelten auch für ihren Metropolcode und umgekehrt.
+    """
+    fares = np.full((len(origins), len(codes)), np.nan)
+    if not inspiration:
+        return fares
+    index = get_airport_index()
+
+    def metro(code):
+        entry = index.get(code)
+        return entry["metro"] if entry is not None else ""
+
+    for i, origin in enumerate(origins):
+        prices = dict(inspiration.get(origin) or {})
+        for code, price in list(prices.items()):
+            parent = metro(code)
+            if parent:
+                prices[parent] = min(price, prices.get(parent, price))
+        for j, code in enumerate(codes):
+            price = prices.get(code, prices.get(metro(code)))
+            if price is not None:
+                fares[i, j] = price
+    return fares
+
+
+def estimate_fares(origins: list, codes: list, inspiration: dict = None) -> np.ndarray:
+    """
+    Geschätzter Preis je Startort × Ziel: bekannte Inspiration-Preise, sonst
+    aus der Entfernung (NaN, wenn auch die Koordinaten fehlen).
+    """
+    distances = distance_matrix_km(origins, codes)
+    known = known_fares(origins, codes, inspiration)
+    fares = FARE_BASE_EUR + FARE_PER_KM_EUR * distances
+    for i in range(len(origins)):
+        fit = np.isfinite(known[i]) & np.isfinite(distances[i])
+        if fit.sum() >= MIN_FIT_POINTS and np.ptp(distances[i, fit]) > 0:
+            slope, intercept = np.polyfit(distances[i, fit], known[i, fit], 1)
+            if slope > 0:
+                fares[i] = intercept + slope * distances[i]
+    return np.where(np.isfinite(known), known, fares)
+
+
+def rank_destinations(origins: list, candidates: list, inspiration: dict = None, budget_per_person: float = 0) -> list:
+    """
+    Ziele (`{"iata", ...}`-Dicts) nach geschätztem Preis sortiert. Mit
+    Budget fallen Ziele weg, deren bekannter günstigster Preis schon darüber liegt.
+    """
+    if not candidates or not origins:
+        return list(candidates)
+    codes = [d["iata"] for d in candidates]
+    fares = estimate_fares(origins, codes, inspiration)
+    score = fares.sum(axis=0) + FAIRNESS_WEIGHT * (fares.max(axis=0) - fares.min(axis=0))
+    score = np.where(np.isfinite(score), score, np.inf)
+
+    keep = ~(distance_matrix_km(origins, codes) < SAME_PLACE_KM).any(axis=0)
+    if budget_per_person > 0:
+        known = known_fares(origins, codes, inspiration)
+        keep &= ~(np.nan_to_num(known, nan=0.0) > budget_per_person).any(axis=0)
+    order = np.argsort(score, kind="stable")
+    return [candidates[i] for i in order if keep[i]]
@@ -0,0 +1,190 @@
+"""
+Pre-Warmer für den Quote-Cache.
+
+Lädt die meistgefragten Legs (Startort × Ziel × Fenster aus dem
+Nachfrage-Log des Caches) neu, bevor sie ablaufen, damit interaktive
+Suchen aus dem warmen Cache bedient werden. Nutzt nur freies Quota: eigenes,
+niedriges TPS-Limit, und im App-Prozess pausiert er, solange eine Suche läuft.
+
+Eigenständig (z. B. per Cron/Systemd neben der App, gleiche SQLite-Datei):
+
+    python -m prewarm --interval 300 --max-calls 100 --tps 2
+    python -m prewarm --once --base-url http://127.0.0.1:8765   # gegen den Mock
+
+Im App-Prozess: Secret `CACHE_PREWARM = true` (siehe `get_prewarmer` in app.py).
+"""
+import argparse
+import threading
+import time
+
+from amadeus_client import (
+    AmadeusClient,
+    TokenBucket,
+    configure_client,
+    extract_cheapest_offer_summary,
+    get_client,
+    get_setting,
+    search_roundtrip_flights,
+)
+from price_history import DEFAULT_HISTORY_PATH, PriceHistory
+from quote_cache import DEFAULT_CACHE_PATH, QuoteCache, parse_quote_cache_key
+from trip_search import LEG_MAX_OFFERS
+
+PREWARM_INTERVAL_S = 300
+PREWARM_MAX_CALLS = 100
+PREWARM_TPS = 2.0
+# Einträge, die in den nächsten 10 Minuten ablaufen, werden schon neu geladen
+PREWARM_REFRESH_AHEAD_S = 600
+BUSY_POLL_S = 1.0
+
+
+class CachePrewarmer:
+    """
+    Lädt Legs aus `QuoteCache.hot_keys` nacheinander neu und schreibt sie in den Cache.
+
+    - `tps`: eigenes Ratelimit zusätzlich zum Client-Limit (lässt Quota für
+      interaktive Suchen übrig).
+    - `is_busy()`: solange True, wird pausiert (z. B. laufende Suche im selben Prozess).
+    - `single_flight`: teilt In-flight-Abfragen mit der App, damit ein Leg nie
+      doppelt geladen wird.
+    - `price_history`: neu geladene Preise zusätzlich im Preisverlauf ablegen.
+    """
+
+    def __init__(
+        self,
+        quote_cache: QuoteCache,
+        max_calls: int = PREWARM_MAX_CALLS,
+        tps: float = PREWARM_TPS,
+        refresh_ahead_s: float = PREWARM_REFRESH_AHEAD_S,
+        is_busy=None,
+        single_flight=None,
+        price_history=None,
+    ):
+        self.quote_cache = quote_cache
+        self.max_calls = int(max_calls)
+        self.refresh_ahead_s = float(refresh_ahead_s)
+        self.rate_limiter = TokenBucket(tps)
+        self.is_busy = is_busy or (lambda: False)
+        self.single_flight = single_flight
+        self.price_history = price_history
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._runs = 0
+        self._warmed = 0
+        self._failed = 0
+        self._last_run_at = None
+
+    def warm_key(self, key: str):
+        leg = parse_quote_cache_key(key)
+        raw = search_roundtrip_flights(max_results=LEG_MAX_OFFERS, **leg)
+        quote = extract_cheapest_offer_summary(raw)
+        self.quote_cache.put(key, quote.to_record() if quote else None)
+        if self.price_history is not None:
+            self.price_history.record(key, quote)
+        return quote
+
+    def run_once(self) -> int:
+        """
+        Ein Durchlauf über die dringendsten Keys; Rückgabe = neu geladene Legs.
+        """
+        warmed = 0
+        for key, _ in self.quote_cache.hot_keys(self.max_calls, self.refresh_ahead_s):
+            while self.is_busy() and not self._stop.is_set():
+                self._stop.wait(BUSY_POLL_S)
+            if self._stop.is_set():
+                break
+
+            self.rate_limiter.acquire()
+            try:
+                if self.single_flight is not None:
+                    self.single_flight.do(key, lambda key=key: self.warm_key(key))
+                else:
+                    self.warm_key(key)
+                warmed += 1
+            except Exception:
+                with self._stats_lock:
+                    self._failed += 1
+
+        if self.price_history is not None:
+            self.price_history.flush()
+        with self._stats_lock:
+            self._runs += 1
+            self._warmed += warmed
+            self._last_run_at = time.time()
+        return warmed
+
+    def _loop(self, interval_s: float):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                with self._stats_lock:
+                    self._failed += 1
+            self._stop.wait(interval_s)
+
+    def start(self, interval_s: float = PREWARM_INTERVAL_S) -> "CachePrewarmer":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(interval_s,), name="cache-prewarm", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "runs": self._runs,
+                "warmed": self._warmed,
+                "failed": self._failed,
+                "last_run_at": self._last_run_at,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quote-Cache für häufig gesuchte Legs vorwärmen")
+    parser.add_argument("--cache-path", default=get_setting("QUOTE_CACHE_PATH", DEFAULT_CACHE_PATH))
+    parser.add_argument("--history-path", default=get_setting("PRICE_HISTORY_PATH", DEFAULT_HISTORY_PATH), help="Preisverlauf (Parquet)")
+    parser.add_argument("--interval", type=float, default=PREWARM_INTERVAL_S, help="Sekunden zwischen zwei Durchläufen")
+    parser.add_argument("--max-calls", type=int, default=PREWARM_MAX_CALLS, help="Max. API-Calls pro Durchlauf")
+    parser.add_argument("--tps", type=float, default=PREWARM_TPS, help="Eigenes Ratelimit (Requests/Sekunde)")
+    parser.add_argument("--refresh-ahead", type=float, default=PREWARM_REFRESH_AHEAD_S)
+    parser.add_argument("--once", action="store_true", help="Nur ein Durchlauf, dann beenden")
+    parser.add_argument("--base-url", help="Statt AMADEUS_BASE_URL (z. B. lokaler Mock)")
+    args = parser.parse_args()
+
+    if args.base_url:
+        # Zugangsdaten sonst wie die App: Umgebungsvariablen oder .streamlit/secrets.toml
+        configure_client(AmadeusClient(
+            base_url=args.base_url,
+            client_id=get_setting("AMADEUS_CLIENT_ID", ""),
+            client_secret=get_setting("AMADEUS_CLIENT_SECRET", ""),
+        ))
+    get_client()
+
+    prewarmer = CachePrewarmer(
+        QuoteCache(args.cache_path),
+        max_calls=args.max_calls,
+        tps=args.tps,
+        refresh_ahead_s=args.refresh_ahead,
+        price_history=PriceHistory(args.history_path),
+    )
+    while True:
+        t0 = time.monotonic()
+        warmed = prewarmer.run_once()
+        print(f"{time.strftime('%H:%M:%S')} {warmed} Legs vorgewärmt in {time.monotonic() - t0:.1f} s ({prewarmer.stats()['failed']} Fehler gesamt)")
+        if args.once:
+            return
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Preisverlauf: jedes von der API geladene Leg wird spaltenweise (Parquet) mitgeschrieben.
+
+Layout: `<root>/destination=FCO/origin=BER/month=2026-10/part-….parquet`
+(Hive-Partitionen). Abfragen pro Route oder pro Ziel lesen damit nur die
+passenden Verzeichnisse; Monats-Filter (`since`) schneiden zusätzlich ganze
+Partitionen weg, Aggregation läuft vektorisiert in pyarrow.
+
+    history = PriceHistory()
+    history.record(cache_key, quote)          # gepuffert, Flush alle 500 Zeilen / 30 s
+    history.trend("FCO", origin="BER")        # DataFrame: bucket, min/median/mean, count
+    history.leg_stability("BER", "FCO", "2026-05-15", "2026-05-18")
+
+    python -m price_history trend FCO --origin BER --bucket week
+    python -m price_history compact
+
+pyarrow ist optional (kommt mit Streamlit); ohne pyarrow ist `enabled`
+False, `record` tut nichts und Abfragen liefern leere Ergebnisse.
+"""
+import argparse
+import atexit
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime, timezone
+
+import pandas as pd
+
+from quote_cache import parse_quote_cache_key
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: ohne pyarrow kein Preisverlauf
+    pa = None
+
+DEFAULT_HISTORY_PATH = os.path.join("data", "price_history")
+
+# Puffer wird spätestens nach so vielen Zeilen bzw. Sekunden als Datei geschrieben
+FLUSH_ROWS = 500
+FLUSH_INTERVAL_S = 30
+
+# `compact` fasst Partitionen ab so vielen Dateien zu einer zusammen
+COMPACT_MIN_FILES = 8
+
+TREND_BUCKETS = ("hour", "day", "week", "month")
+
+_COLUMNS = (
+    "observed_at", "destination", "origin", "depart_date", "return_date", "nights",
+    "non_stop", "max_price", "price", "stops", "carriers",
+)
+
+
+def _schemas():
+    # Datei-Schema (ohne Partitionsspalten) und Partitionsschema
+    file_schema = pa.schema([
+        ("observed_at", pa.timestamp("s", tz="UTC")),
+        ("depart_date", pa.date32()),
+        ("return_date", pa.date32()),
+        ("nights", pa.int16()),
+        ("non_stop", pa.bool_()),
+        ("max_price", pa.int32()),
+        ("price", pa.float64()),
+        ("stops", pa.int16()),
+        ("carriers", pa.string()),
+    ])
+    partition_schema = pa.schema([
+        ("destination", pa.string()),
+        ("origin", pa.string()),
+        ("month", pa.string()),
+    ])
+    return file_schema, partition_schema
+
+
+def _to_date(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class PriceHistory:
+    """
+    Append-only-Preisverlauf (thread-sicher). Mehrere Prozesse dürfen in
+    dasselbe Verzeichnis schreiben: jeder Flush erzeugt eigene Dateien.
+    """
+
+    def __init__(self, root: str = DEFAULT_HISTORY_PATH, flush_rows: int = FLUSH_ROWS, flush_interval_s: float = FLUSH_INTERVAL_S):
+        self.root = root
+        self.flush_rows = int(flush_rows)
+        self.flush_interval_s = float(flush_interval_s)
+        self.enabled = pa is not None
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._written = 0
+        if self.enabled:
+            self._file_schema, self._partition_schema = _schemas()
+            self._partitioning = ds.partitioning(self._partition_schema, flavor="hive")
+            atexit.register(self.flush)
+
+    # -----------------------------
+    # Schreiben
+    # -----------------------------
+    def record(self, cache_key: str, quote, observed_at: float = None):
+        """
+        Ein Leg-Ergebnis mitschreiben (`quote` None = kein Angebot gefunden).
+        """
+        if not self.enabled:
+            return
+        leg = parse_quote_cache_key(cache_key)
+        depart, ret = _to_date(leg["departure_date"]), _to_date(leg["return_date"])
+        row = (
+            int(observed_at if observed_at is not None else time.time()),
+            leg["destination_iata"],
+            leg["origin_iata"],
+            depart,
+            ret,
+            (ret - depart).days if depart and ret else None,
+            leg["non_stop"],
+            leg["max_price"],
+            float(quote["price_total"]) if quote else None,
+            int(quote["stops_outbound"]) + int(quote["stops_inbound"]) if quote else None,
+            ",".join(quote["carriers"]) if quote else None,
+        )
+        with self._lock:
+            self._buffer.append(row)
+            due = len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval_s
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Gepufferte Zeilen als Parquet schreiben (eine Datei pro Partition);
+        Rückgabe = geschriebene Zeilen.
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not rows or not self.enabled:
+            return 0
+
+        partitions = {}
+        for row in rows:
+            month = datetime.fromtimestamp(row[0], tz=timezone.utc).strftime("%Y-%m")
+            partitions.setdefault((row[1], row[2], month), []).append(row)
+
+        for (destination, origin, month), part_rows in partitions.items():
+            columns = dict(zip(_COLUMNS, zip(*part_rows)))
+            table = pa.table(
+                {name: columns[name] for name in self._file_schema.names},
+                schema=self._file_schema,
+            )
+            directory = os.path.join(self.root, f"destination={destination}", f"origin={origin}", f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            pq.write_table(table, os.path.join(directory, f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet"))
+
+        with self._lock:
+            self._written += len(rows)
+        return len(rows)
+
+    def compact(self, min_files: int = COMPACT_MIN_FILES) -> int:
+        """
+        Viele kleine Dateien einer Partition zu einer zusammenfassen (schnellere
+        Scans). Rückgabe = Anzahl zusammengefasster Partitionen.
+        """
+        if not self.enabled or not os.path.isdir(self.root):
+            return 0
+        compacted = 0
+        for directory, _, files in os.walk(self.root):
+            parts = sorted(f for f in files if f.startswith("part-") and f.endswith(".parquet"))
+            if len(parts) < min_files:
+                continue
+            paths = [os.path.join(directory, f) for f in parts]
+            table = pa.concat_tables([pq.read_table(p, schema=self._file_schema) for p in paths])
+            table = table.sort_by([("observed_at", "ascending")])
+            tmp = os.path.join(directory, f".compact-{uuid.uuid4().hex[:8]}.tmp")
+            pq.write_table(table, tmp)
+            os.replace(tmp, os.path.join(directory, f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet"))
+            for p in paths:
+                os.remove(p)
+            compacted += 1
+        return compacted
+
+    # -----------------------------
+    # Lesen
+    # -----------------------------
+    def _scan(self, columns: list, destination: str = None, origin: str = None, since: datetime = None, extra=None):
+        if not self.enabled or not os.path.isdir(self.root):
+            return None
+        self.flush()
+
+        # Nur Partitionsverzeichnisse des Ziels (bzw. der Route) öffnen
+        base = self.root
+        if destination:
+            base = os.path.join(base, f"destination={destination}")
+            if origin:
+                base = os.path.join(base, f"origin={origin}")
+            if not os.path.isdir(base):
+                return None
+        dataset = ds.dataset(base, format="parquet", partitioning=self._partitioning, partition_base_dir=self.root)
+
+        condition = pc.is_valid(ds.field("price"))
+        if origin and not destination:
+            condition &= ds.field("origin") == origin
+        if since is not None:
+            condition &= ds.field("observed_at") >= pa.scalar(since, type=pa.timestamp("s", tz="UTC"))
+            if "month" in dataset.schema.names:
+                condition &= ds.field("month") >= since.strftime("%Y-%m")
+        if extra is not None:
+            condition &= extra
+        return dataset.to_table(columns=columns, filter=condition)
+
+    def trend(
+        self,
+        destination: str,
+        origin: str = None,
+        bucket: str = "day",
+        since: datetime = None,
+        depart_range: tuple = None,
+        by_origin: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Preis über Zeit für ein Ziel (alle Startorte) oder eine Route:
+        pro Zeit-Bucket (Beobachtungszeitpunkt) min / median / mean / count.
+        `depart_range` = (erstes, letztes Abflugdatum) schränkt die Legs ein;
+        `by_origin` gruppiert zusätzlich nach Startort.
+        """
+        if bucket not in TREND_BUCKETS:
+            raise ValueError(f"bucket muss einer von {TREND_BUCKETS} sein")
+        extra = None
+        if depart_range:
+            first, last = (_to_date(d) for d in depart_range)
+            extra = (ds.field("depart_date") >= first) & (ds.field("depart_date") <= last)
+
+        table = self._scan(["observed_at", "price", "origin"], destination, origin, since, extra)
+        if table is None or table.num_rows == 0:
+            return pd.DataFrame(columns=["bucket"] + (["origin"] if by_origin else []) + ["min", "median", "mean", "count"])
+
+        table = table.append_column("bucket", pc.floor_temporal(table["observed_at"], 1, bucket))
+        keys = ["bucket", "origin"] if by_origin else ["bucket"]
+        grouped = table.group_by(keys).aggregate([
+            ("price", "min"),
+            ("price", "approximate_median"),
+            ("price", "mean"),
+            ("price", "count"),
+        ])
+        frame = grouped.to_pandas().rename(columns={
+            "price_min": "min",
+            "price_approximate_median": "median",
+            "price_mean": "mean",
+            "price_count": "count",
+        })
+        return frame[keys + ["min", "median", "mean", "count"]].sort_values(keys).reset_index(drop=True)
+
+    def leg_stability(self, origin: str, destination: str, departure_date: str, return_date: str) -> dict:
+        """
+        Wie verlässlich ist ein (gecachter) Preis dieses Legs? Aus allen
+        bisherigen Beobachtungen: letzte Sichtung, mittlere Preisänderung pro
+        Stunde zwischen zwei Beobachtungen und die daraus erwartete Abweichung
+        seit der letzten Sichtung (`expected_change_pct`, in %).
+        """
+        depart, ret = _to_date(departure_date), _to_date(return_date)
+        extra = ds.field("depart_date") == depart
+        if ret is not None:
+            extra &= ds.field("return_date") == ret
+        table = self._scan(["observed_at", "price"], destination, origin, extra=extra) if self.enabled else None
+        out = {"observations": 0, "last_seen": None, "last_price": None, "change_pct_per_h": None, "expected_change_pct": None}
+        if table is None or table.num_rows == 0:
+            return out
+
+        table = table.sort_by([("observed_at", "ascending")])
+        # Parquet speichert Zeitstempel in ms; hier in Sekunden rechnen
+        seen = table["observed_at"].cast(pa.timestamp("s", tz="UTC")).cast(pa.int64()).to_numpy()
+        price = table["price"].to_numpy()
+        out.update(
+            observations=len(price),
+            last_seen=datetime.fromtimestamp(int(seen[-1]), tz=timezone.utc),
+            last_price=float(price[-1]),
+        )
+        if len(price) < 2:
+            return out
+
+        hours = (seen[1:] - seen[:-1]) / 3600.0
+        valid = hours > 0
+        if not valid.any():
+            return out
+        change = abs(price[1:] - price[:-1]) / price[:-1] * 100.0
+        rate = float((change[valid] / hours[valid]).mean())
+        age_h = (time.time() - seen[-1]) / 3600.0
+        # Lineare Hochrechnung, gedeckelt durch die größte bisher gesehene Abweichung
+        largest = float(abs(price - price[-1]).max() / price[-1] * 100.0)
+        out.update(change_pct_per_h=round(rate, 3), expected_change_pct=round(min(rate * age_h, largest), 1))
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered, written = len(self._buffer), self._written
+        files = 0
+        if os.path.isdir(self.root):
+            files = sum(sum(f.endswith(".parquet") for f in fs) for _, _, fs in os.walk(self.root))
+        return {"enabled": self.enabled, "buffered": buffered, "written": written, "files": files}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preisverlauf abfragen / verdichten")
+    parser.add_argument("--path", default=None, help="Verzeichnis (Standard: Setting PRICE_HISTORY_PATH)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    trend = sub.add_parser("trend", help="Preis über Zeit für ein Ziel oder eine Route")
+    trend.add_argument("destination")
+    trend.add_argument("--origin")
+    trend.add_argument("--bucket", choices=TREND_BUCKETS, default="day")
+    trend.add_argument("--days", type=int, default=90, help="Nur Beobachtungen der letzten N Tage")
+    sub.add_parser("compact", help="Kleine Dateien je Partition zusammenfassen")
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    from amadeus_client import get_setting
+
+    history = PriceHistory(args.path or get_setting("PRICE_HISTORY_PATH", DEFAULT_HISTORY_PATH))
+    if not history.enabled:
+        parser.exit(1, "pyarrow ist nicht installiert – kein Preisverlauf verfügbar.\n")
+    if args.command == "trend":
+        since = datetime.fromtimestamp(time.time() - args.days * 86400, tz=timezone.utc)
+        frame = history.trend(args.destination.upper(), origin=args.origin.upper() if args.origin else None, bucket=args.bucket, since=since)
+        print(frame.to_string(index=False) if not frame.empty else "Keine Daten.")
+    elif args.command == "compact":
+        print(f"{history.compact()} Partitionen zusammengefasst")
+    else:
+        print(history.stats())
+
+
+if __name__ == "__main__":
+    main()
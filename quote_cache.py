@@ -0,0 +1,351 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from amadeus_client import DeadlineExceeded, current_deadline
+
+DEFAULT_CACHE_PATH = os.path.join("data", "quote_cache.sqlite")
+DEFAULT_TTL_S = 1800
+DEFAULT_MAX_ENTRIES = 50_000
+
+# last_access wird höchstens so oft aktualisiert (spart Schreibzugriffe bei heißen Routen)
+TOUCH_INTERVAL_S = 60
+
+# Nach so vielen `put`-Aufrufen werden abgelaufene / überzählige Einträge entfernt
+EVICT_EVERY_N_PUTS = 200
+
+# Nachfrage-Statistik pro Leg: Zähler halbiert sich pro Tag, nach 14 Tagen ohne Anfrage fliegt der Eintrag raus
+HIT_HALF_LIFE_S = 24 * 3600
+HIT_RETENTION_S = 14 * 24 * 3600
+
+# Sentinel für "nicht im Cache" (None ist ein gültiger Wert: "keine Angebote")
+MISSING = object()
+
+
+def quote_cache_key(
+    origin_iata: str,
+    destination_iata: str,
+    departure_date: str,
+    return_date: str,
+    adults: int = 1,
+    currency: str = "EUR",
+    non_stop: bool = False,
+    max_price: int = None,
+) -> str:
+    return "|".join([
+        origin_iata.upper(),
+        destination_iata.upper(),
+        departure_date,
+        return_date or "",
+        str(int(adults)),
+        currency.upper(),
+        "nonstop" if non_stop else "any",
+        str(int(max_price)) if max_price else "",
+    ])
+
+
+def flight_dates_cache_key(
+    origin_iata: str,
+    destination_iata: str,
+    first_departure: str,
+    last_departure: str,
+    min_nights: int,
+    max_nights: int,
+    non_stop: bool = False,
+    max_price: int = None,
+) -> str:
+    # Eigener Präfix (auch bei Inspiration-Preisen): landen nie im Nachfrage-Log des Pre-Warmers
+    return "|".join([
+        "dates",
+        origin_iata.upper(),
+        destination_iata.upper(),
+        first_departure,
+        last_departure,
+        f"{int(min_nights)}-{int(max_nights)}",
+        "nonstop" if non_stop else "any",
+        str(int(max_price)) if max_price else "",
+    ])
+
+
+def flight_destinations_cache_key(
+    origin_iata: str,
+    first_departure: str,
+    last_departure: str,
+    min_nights: int,
+    max_nights: int,
+    non_stop: bool = False,
+    max_price: int = None,
+) -> str:
+    return "|".join([
+        "destinations",
+        origin_iata.upper(),
+        first_departure,
+        last_departure,
+        f"{int(min_nights)}-{int(max_nights)}",
+        "nonstop" if non_stop else "any",
+        str(int(max_price)) if max_price else "",
+    ])
+
+
+def parse_quote_cache_key(key: str) -> dict:
+    """
+    Umkehrung von `quote_cache_key` (z. B. damit der Pre-Warmer ein Leg neu laden kann).
+    """
+    origin, destination, depart, ret, adults, currency, stops, max_price = key.split("|")
+    return {
+        "origin_iata": origin,
+        "destination_iata": destination,
+        "departure_date": depart,
+        "return_date": ret or None,
+        "adults": int(adults),
+        "currency": currency,
+        "non_stop": stops == "nonstop",
+        "max_price": int(max_price) if max_price else None,
+    }
+
+
+def _decayed_hits(hits: float, last_hit: float, now: float) -> float:
+    return hits * math.pow(0.5, max(now - last_hit, 0.0) / HIT_HALF_LIFE_S)
+
+
+class QuoteCache:
+    """
+    Persistenter Quote-Store auf SQLite-Basis.
+
+    - TTL pro Eintrag (`expires_at`), abgelaufene Einträge zählen als Miss.
+    - Größenbegrenzt: über `max_entries` werden die am längsten nicht
+      gelesenen Einträge verworfen (LRU über `last_access`).
+    - WAL-Modus + busy_timeout: mehrere Threads und Prozesse (z. B. mehrere
+      Streamlit-Server auf demselben Volume) können gleichzeitig lesen/schreiben.
+    - Nachfrage-Log (`route_hits`): wie oft ein Leg angefragt wurde, mit
+      Halbwertszeit; daraus wählt `hot_keys` die Legs für den Pre-Warmer.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES, default_ttl_s: float = DEFAULT_TTL_S):
+        self.path = path
+        self.max_entries = int(max_entries)
+        self.default_ttl_s = float(default_ttl_s)
+        self._local = threading.local()
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS quotes ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_last_access ON quotes(last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_expires_at ON quotes(expires_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS route_hits ("
+            " key TEXT PRIMARY KEY,"
+            " hits REAL NOT NULL,"
+            " last_hit REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3-Verbindungen sind nicht thread-sicher -> eine pro Thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, last_access FROM quotes WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return MISSING
+
+        value, expires_at, last_access = row
+        if expires_at <= now:
+            conn.execute("DELETE FROM quotes WHERE key = ? AND expires_at <= ?", (key, now))
+            return MISSING
+
+        if now - last_access > TOUCH_INTERVAL_S:
+            conn.execute("UPDATE quotes SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def put(self, key: str, value, ttl_s: float = None):
+        now = time.time()
+        ttl = self.default_ttl_s if ttl_s is None else float(ttl_s)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO quotes (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now),
+        )
+
+        with self._puts_lock:
+            self._puts += 1
+            run_eviction = self._puts % EVICT_EVERY_N_PUTS == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            conn.execute("DELETE FROM quotes WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM route_hits WHERE last_hit <= ?", (now - HIT_RETENTION_S,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM quotes").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM quotes WHERE key IN ("
+                    " SELECT key FROM quotes ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # -----------------------------
+    # Nachfrage-Log (Pre-Warming)
+    # -----------------------------
+    def record_requests(self, keys):
+        """
+        Zählt eine Anfrage pro Key (gebündelt in einer Transaktion, z. B.
+        einmal pro Suche). Ältere Treffer verlieren mit `HIT_HALF_LIFE_S` an Gewicht.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = {}
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                existing.update(
+                    (key, (hits, last_hit))
+                    for key, hits, last_hit in conn.execute(
+                        f"SELECT key, hits, last_hit FROM route_hits WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+            rows = []
+            for key in keys:
+                hits, last_hit = existing.get(key, (0.0, now))
+                rows.append((key, _decayed_hits(hits, last_hit, now) + 1.0, now))
+            conn.executemany("INSERT OR REPLACE INTO route_hits (key, hits, last_hit) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def hot_keys(self, limit: int, refresh_ahead_s: float, today: str = None) -> list:
+        """
+        Keys, die fehlen oder in den nächsten `refresh_ahead_s` Sekunden
+        ablaufen, absteigend nach Priorität = Nachfrage / (1 + Restlaufzeit in Minuten).
+        Legs mit Abflug in der Vergangenheit werden übersprungen.
+
+        Rückgabe: Liste (key, priorität)
+        """
+        now = time.time()
+        today = today or time.strftime("%Y-%m-%d")
+        rows = self._conn().execute(
+            "SELECT h.key, h.hits, h.last_hit, q.expires_at FROM route_hits h"
+            " LEFT JOIN quotes q ON q.key = h.key"
+            " WHERE q.expires_at IS NULL OR q.expires_at < ?",
+            (now + refresh_ahead_s,),
+        ).fetchall()
+
+        ranked = []
+        for key, hits, last_hit, expires_at in rows:
+            if key.split("|")[2] < today:
+                continue
+            remaining_min = max((expires_at or now) - now, 0.0) / 60.0
+            ranked.append((key, _decayed_hits(hits, last_hit, now) / (1.0 + remaining_min)))
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def __len__(self) -> int:
+        (count,) = self._conn().execute("SELECT COUNT(*) FROM quotes").fetchone()
+        return count
+
+
+class _InFlightCall:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Request-Coalescing: gleichzeitige Aufrufe mit demselben Key warten auf
+    genau einen Upstream-Call und bekommen alle dessen Ergebnis (oder Fehler).
+    Wirkt prozessweit, also auch über mehrere Streamlit-Sessions hinweg.
+
+    Deadlines (`deadline_scope`) gelten je Aufrufer: Wartende warten höchstens
+    bis zur eigenen Deadline, und ein `DeadlineExceeded` des ausführenden
+    Aufrufers (dessen Suche ist vorbei) wird nicht weitergereicht – der
+    Wartende versucht es selbst, ggf. als neuer Ausführender.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key, fn):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _InFlightCall()
+                    self._calls[key] = call
+                    self._executed += 1
+                else:
+                    self._coalesced += 1
+            if leader:
+                break
+
+            deadline = current_deadline()
+            if not call.done.wait(None if deadline is None else max(deadline - time.monotonic(), 0.0)):
+                raise DeadlineExceeded("Deadline erreicht beim Warten auf gleiche Abfrage")
+            if isinstance(call.error, DeadlineExceeded):
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._calls),
+            }
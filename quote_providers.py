@@ -0,0 +1,405 @@
+"""
+Preisquellen (Provider) für den Suchkern.
+
+Jeder Provider beantwortet dieselben drei Fragen, `LegFetcher` und die
+Suche kennen nur diese Schnittstelle:
+
+- `quote(origin_iata, destination_iata, departure_date, return_date, non_stop, max_price, max_offers)`
+  -> günstigstes Angebot (`Quote`) oder None; `return_date` None = Einzelflug
+- `date_grid(origin_iata, destination_iata, first_departure, last_departure, min_nights, max_nights, non_stop, max_price)`
+  -> [[abflug, rückflug, preis], ...]
+- `inspiration(origin_iata, first_departure, last_departure, min_nights, max_nights, non_stop, max_price)`
+  -> {iata: günstigster preis}
+
+`live` sagt, ob Ergebnisse in Quote-Cache und Preisverlauf gehören (nur
+echte API-Preise), `oneway`, ob `quote` auch Einzelflüge kennt. Offline-Provider können zusätzlich `price_grid` für ein
+ganzes Raster Startort × Ziel × Fenster in einem Schritt.
+
+- `AmadeusProvider`: die Amadeus-API (Standard).
+- `FareDataset`: große lokale Preisdateien (CSV oder Parquet), einmalig in
+  Spalten-Dateien (`.npy`, sortiert nach Route/Abflug/Rückflug) umgewandelt
+  und per Memory-Map gelesen; Abfragen sind Binärsuchen auf dem
+  Schlüssel-Array, auch für ganze Raster vektorisiert. Für Demos,
+  Lasttests und Offline-Analysen ohne Quota.
+
+    dataset = FareDataset("data/fares.parquet")   # wandelt beim ersten Zugriff um
+    fetch = LegFetcher(provider=dataset)          # ohne Cache / Preisverlauf
+    price, stops = dataset.price_grid(["BER", "VIE"], ["FCO", "BCN"], windows)
+
+    python -m quote_providers convert data/fares.csv
+    python -m quote_providers stats data/fares.csv
+
+Spalten der Quelldatei: origin, destination, depart_date, return_date, price
+(Pflicht; auch origin_iata / destination_iata / departure_date / price_total),
+optional stops oder stops_outbound / stops_inbound und carriers.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from amadeus_client import (
+    Quote,
+    extract_cheapest_offer_summary,
+    extract_flight_dates,
+    extract_flight_destinations,
+    search_flight_dates,
+    search_flight_destinations,
+    search_roundtrip_flights,
+)
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional: ohne pyarrow nur CSV-Quellen
+    pq = None
+
+# Umwandlung großer Quelldateien in Blöcken (Speicherbedarf begrenzen)
+CONVERT_CHUNK_ROWS = 500_000
+
+# Schlüssel je Zeile (int64): Startort (15 Bit) | Ziel (16 Bit) | Abflug | Rückflug
+# (je 16 Bit, Tage seit 1970 -> bis 2149)
+_CODE_BITS = 16
+_DAY_BITS = 16
+_DAY_MASK = (1 << _DAY_BITS) - 1
+_MAX_CODES = 1 << (_CODE_BITS - 1)
+
+_COLUMN_ALIASES = {
+    "origin_iata": "origin",
+    "destination_iata": "destination",
+    "departure_date": "depart_date",
+    "price_total": "price",
+}
+_REQUIRED_COLUMNS = ("origin", "destination", "depart_date", "return_date", "price")
+_OPTIONAL_COLUMNS = ("stops", "stops_outbound", "stops_inbound", "carriers")
+_STORE_COLUMNS = ("key", "price", "stops_outbound", "stops_inbound", "carrier")
+_MANIFEST = "manifest.json"
+
+
+class AmadeusProvider:
+    """
+    Live-Preise aus der Amadeus-API (Flight Offers, Cheapest Date und
+    Inspiration Search). Fehler (auch 404 bei Kalender/Inspiration)
+    gehen als `requests.HTTPError` an den Aufrufer.
+    """
+
+    name = "amadeus"
+    live = True
+    oneway = True
+
+    def quote(self, origin_iata: str, destination_iata: str, departure_date: str, return_date: str,
+              non_stop: bool = False, max_price: int = None, max_offers: int = 3):
+        raw = search_roundtrip_flights(
+            origin_iata=origin_iata,
+            destination_iata=destination_iata,
+            departure_date=departure_date,
+            return_date=return_date,
+            adults=1,
+            currency="EUR",
+            max_results=max_offers,
+            non_stop=non_stop,
+            max_price=max_price,
+        )
+        return extract_cheapest_offer_summary(raw)
+
+    def date_grid(self, *args) -> list:
+        return extract_flight_dates(search_flight_dates(*args))
+
+    def inspiration(self, *args) -> dict:
+        return extract_flight_destinations(search_flight_destinations(*args))
+
+
+# -----------------------------
+# Offline-Datensatz
+# -----------------------------
+def _days(values) -> np.ndarray:
+    # ISO-Daten / date -> Tage seit 1970 (int64)
+    return np.asarray(pd.to_datetime(pd.Series(values)).to_numpy().astype("datetime64[D]"), dtype=np.int64)
+
+
+def _iso(days: np.ndarray) -> list:
+    return np.asarray(days, dtype="datetime64[D]").astype(str).tolist()
+
+
+def _read_chunks(source: str):
+    # Quelldatei blockweise als DataFrames (nur bekannte Spalten)
+    wanted = set(_REQUIRED_COLUMNS) | set(_OPTIONAL_COLUMNS) | set(_COLUMN_ALIASES)
+    if source.endswith(".parquet"):
+        if pq is None:
+            raise ImportError("Parquet-Datensätze brauchen pyarrow")
+        parquet = pq.ParquetFile(source)
+        columns = [c for c in parquet.schema_arrow.names if c in wanted]
+        for batch in parquet.iter_batches(batch_size=CONVERT_CHUNK_ROWS, columns=columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(source, usecols=lambda c: c in wanted, chunksize=CONVERT_CHUNK_ROWS,
+                           dtype={"origin": str, "destination": str, "origin_iata": str, "destination_iata": str, "carriers": str})
+
+
+class FareDataset:
+    """
+    Offline-Preise aus einer großen CSV- oder Parquet-Datei.
+
+    Beim ersten Zugriff wird die Quelle nach `store_dir` (Standard:
+    `<quelle>.columns/`) umgewandelt: eine Zeile je (Startort, Ziel, Abflug,
+    Rückflug) mit dem günstigsten Preis, sortiert nach dem int64-Schlüssel.
+    Danach werden nur noch die `.npy`-Spalten per Memory-Map geöffnet; eine
+    geänderte Quelldatei (Größe / Änderungszeit) wird neu umgewandelt.
+    """
+
+    name = "dataset"
+    live = False
+    # Der Datensatz kennt nur Hin- und Rückflüge
+    oneway = False
+
+    def __init__(self, source: str, store_dir: str = None):
+        self.source = source
+        self.store_dir = store_dir or source + ".columns"
+        self._columns = None
+        self._codes = None
+        self._code_idx = None
+        self._carriers = None
+
+    # -----------------------------
+    # Umwandlung
+    # -----------------------------
+    def _source_stamp(self) -> dict:
+        stat = os.stat(self.source)
+        return {"source": os.path.abspath(self.source), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+    def _manifest(self):
+        try:
+            with open(os.path.join(self.store_dir, _MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def convert(self, force: bool = False) -> dict:
+        """
+        Quelle -> Spalten-Dateien (nur wenn nötig bzw. mit `force`).
+        Rückgabe: Manifest (Zeilen, Codes, Airlines, Quelle).
+        """
+        stamp = self._source_stamp()
+        manifest = self._manifest()
+        if not force and manifest is not None and manifest.get("stamp") == stamp:
+            return manifest
+
+        codes, carriers = {}, {}
+        parts = {c: [] for c in _STORE_COLUMNS}
+        for chunk in _read_chunks(self.source):
+            chunk = chunk.rename(columns=_COLUMN_ALIASES)
+            missing = [c for c in _REQUIRED_COLUMNS if c not in chunk]
+            if missing:
+                raise ValueError(f"{self.source}: Spalten fehlen: {', '.join(missing)}")
+            chunk = chunk.dropna(subset=list(_REQUIRED_COLUMNS))
+            if chunk.empty:
+                continue
+
+            origin = self._encode(chunk["origin"].str.strip().str.upper(), codes)
+            destination = self._encode(chunk["destination"].str.strip().str.upper(), codes)
+            if len(codes) > _MAX_CODES:
+                raise ValueError(f"{self.source}: mehr als {_MAX_CODES} Flughafen-Codes")
+            depart, ret = _days(chunk["depart_date"]), _days(chunk["return_date"])
+            valid = (ret >= depart) & (depart >= 0) & (ret <= _DAY_MASK)
+            parts["key"].append(self._key(origin, destination, depart, ret)[valid])
+            parts["price"].append(chunk["price"].to_numpy(np.float32)[valid])
+
+            if "stops_outbound" in chunk:
+                stops_out = chunk["stops_outbound"].fillna(0).to_numpy(np.int8)
+                stops_in = chunk["stops_inbound"].fillna(0).to_numpy(np.int8) if "stops_inbound" in chunk else np.zeros(len(chunk), np.int8)
+            else:
+                # Nur Summe bekannt: zählt für den Filter wie Stops auf dem Hinflug
+                stops_out = chunk["stops"].fillna(0).to_numpy(np.int8) if "stops" in chunk else np.zeros(len(chunk), np.int8)
+                stops_in = np.zeros(len(chunk), np.int8)
+            parts["stops_outbound"].append(stops_out[valid])
+            parts["stops_inbound"].append(stops_in[valid])
+            carrier = self._encode(chunk["carriers"].fillna(""), carriers) if "carriers" in chunk else np.zeros(len(chunk), np.int32)
+            parts["carrier"].append(carrier.astype(np.int16)[valid])
+
+        columns = {c: np.concatenate(v) if v else np.zeros(0) for c, v in parts.items()}
+        # Je Schlüssel nur das günstigste Angebot, dann sortiert nach Schlüssel
+        order = np.lexsort((columns["price"], columns["key"]))
+        key = columns["key"][order]
+        first = np.ones(len(key), dtype=bool)
+        first[1:] = key[1:] != key[:-1]
+        keep = order[first]
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        dtypes = {"key": np.int64, "price": np.float32, "stops_outbound": np.int8, "stops_inbound": np.int8, "carrier": np.int16}
+        for name, dtype in dtypes.items():
+            np.save(os.path.join(self.store_dir, f"{name}.npy"), columns[name][keep].astype(dtype))
+        manifest = {
+            "stamp": stamp,
+            "rows": int(len(keep)),
+            "codes": sorted(codes, key=codes.get),
+            "carriers": sorted(carriers, key=carriers.get),
+        }
+        with open(os.path.join(self.store_dir, _MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        self._columns = None
+        return manifest
+
+    @staticmethod
+    def _encode(values: pd.Series, vocabulary: dict) -> np.ndarray:
+        # Strings -> fortlaufende Codes; neue Werte erweitern das Vokabular
+        for value in pd.unique(values):
+            vocabulary.setdefault(value, len(vocabulary))
+        return values.map(vocabulary).to_numpy(np.int64)
+
+    @staticmethod
+    def _key(origin, destination, depart, ret) -> np.ndarray:
+        route = (np.asarray(origin, dtype=np.int64) << _CODE_BITS) | np.asarray(destination, dtype=np.int64)
+        return (route << (2 * _DAY_BITS)) | (np.asarray(depart, dtype=np.int64) << _DAY_BITS) | np.asarray(ret, dtype=np.int64)
+
+    def load(self) -> "FareDataset":
+        if self._columns is not None:
+            return self
+        manifest = self.convert()
+        self._columns = {c: np.load(os.path.join(self.store_dir, f"{c}.npy"), mmap_mode="r") for c in _STORE_COLUMNS}
+        self._codes = manifest["codes"]
+        self._code_idx = {code: i for i, code in enumerate(self._codes)}
+        self._carriers = manifest["carriers"]
+        return self
+
+    def __len__(self) -> int:
+        return len(self.load()._columns["key"])
+
+    # -----------------------------
+    # Abfragen
+    # -----------------------------
+    def _code_ids(self, codes: list) -> np.ndarray:
+        # Unbekannte Codes -> -1 (ergeben nie einen Treffer)
+        return np.array([self._code_idx.get(c, -1) for c in codes], dtype=np.int64)
+
+    def _take(self, keys: np.ndarray, non_stop: bool = False, max_price: int = None) -> tuple:
+        """
+        Binärsuche für beliebig geformte Schlüssel; (Position, Treffer-Maske).
+        Filter wie bei der API: zu teuer bzw. mit Umstieg = kein Angebot.
+        """
+        column = self._columns["key"]
+        pos = np.minimum(np.searchsorted(column, keys), len(column) - 1)
+        hit = (column[pos] == keys) & (keys >= 0)
+        if max_price:
+            hit &= self._columns["price"][pos] <= max_price
+        if non_stop:
+            hit &= (self._columns["stops_outbound"][pos] + self._columns["stops_inbound"][pos]) == 0
+        return pos, hit
+
+    def price_grid(self, origins: list, destinations: list, windows: list, non_stop: bool = False, max_price: int = None) -> tuple:
+        """
+        Preise und Stops (je Startort × Ziel × Fenster, NaN = kein Angebot)
+        für ein ganzes Raster mit einer vektorisierten Suche.
+        """
+        self.load()
+        origin = self._code_ids(origins)[:, None, None]
+        destination = self._code_ids(destinations)[None, :, None]
+        depart = _days([w["depart_date"] for w in windows])[None, None, :]
+        ret = _days([w["return_date"] for w in windows])[None, None, :]
+        keys = np.where((origin >= 0) & (destination >= 0), self._key(origin, destination, depart, ret), -1)
+        if not len(self._columns["key"]):
+            empty = np.full(keys.shape, np.nan)
+            return empty, empty.copy()
+        pos, hit = self._take(keys, non_stop, max_price)
+        price = np.where(hit, self._columns["price"][pos], np.nan).astype(np.float64)
+        stops = np.where(hit, self._columns["stops_outbound"][pos].astype(np.float64) + self._columns["stops_inbound"][pos], np.nan)
+        return price, stops
+
+    def quote(self, origin_iata: str, destination_iata: str, departure_date: str, return_date: str,
+              non_stop: bool = False, max_price: int = None, max_offers: int = None):
+        if not return_date:
+            return None
+        price, _ = self.price_grid([origin_iata], [destination_iata], [{"depart_date": departure_date, "return_date": return_date}], non_stop, max_price)
+        if not np.isfinite(price[0, 0, 0]):
+            return None
+        keys = self._key(*self._code_ids([origin_iata, destination_iata]), *_days([departure_date, return_date]))
+        pos = int(np.searchsorted(self._columns["key"], keys))
+        carrier = self._carriers[self._columns["carrier"][pos]] if self._carriers else ""
+        return Quote(
+            float(self._columns["price"][pos]),
+            stops_outbound=int(self._columns["stops_outbound"][pos]),
+            stops_inbound=int(self._columns["stops_inbound"][pos]),
+            carriers=tuple(c for c in carrier.split(",") if c),
+        )
+
+    def _route_slice(self, first_key: int, last_key: int) -> slice:
+        column = self._columns["key"]
+        return slice(int(np.searchsorted(column, first_key, side="left")), int(np.searchsorted(column, last_key, side="right")))
+
+    def _window_rows(self, rows: slice, first_departure: str, last_departure: str, min_nights: int, max_nights: int,
+                     non_stop: bool, max_price: int) -> tuple:
+        # Zeilen eines Schlüsselbereichs im Zeitraum / mit passender Reisedauer: (Schlüssel, Preise)
+        key = np.asarray(self._columns["key"][rows])
+        price = np.asarray(self._columns["price"][rows], dtype=np.float64)
+        depart, ret = (key >> _DAY_BITS) & _DAY_MASK, key & _DAY_MASK
+        first, last = _days([first_departure, last_departure])
+        keep = (depart >= first) & (depart <= last) & (ret - depart >= int(min_nights)) & (ret - depart <= int(max_nights))
+        if max_price:
+            keep &= price <= max_price
+        if non_stop:
+            stops = np.asarray(self._columns["stops_outbound"][rows]) + np.asarray(self._columns["stops_inbound"][rows])
+            keep &= stops == 0
+        return key[keep], price[keep]
+
+    def date_grid(self, origin_iata: str, destination_iata: str, first_departure: str, last_departure: str,
+                  min_nights: int, max_nights: int, non_stop: bool = False, max_price: int = None) -> list:
+        self.load()
+        origin, destination = self._code_ids([origin_iata, destination_iata])
+        if origin < 0 or destination < 0:
+            return []
+        route = self._key(origin, destination, 0, 0)
+        rows = self._route_slice(route, route | ((1 << (2 * _DAY_BITS)) - 1))
+        key, price = self._window_rows(rows, first_departure, last_departure, min_nights, max_nights, non_stop, max_price)
+        departs, returns = _iso((key >> _DAY_BITS) & _DAY_MASK), _iso(key & _DAY_MASK)
+        return [[d, r, round(float(p), 2)] for d, r, p in zip(departs, returns, price)]
+
+    def inspiration(self, origin_iata: str, first_departure: str, last_departure: str,
+                    min_nights: int, max_nights: int, non_stop: bool = False, max_price: int = None) -> dict:
+        self.load()
+        origin = self._code_ids([origin_iata])[0]
+        if origin < 0:
+            return {}
+        low = self._key(origin, 0, 0, 0)
+        rows = self._route_slice(low, low | ((1 << (_CODE_BITS + 2 * _DAY_BITS)) - 1))
+        key, price = self._window_rows(rows, first_departure, last_departure, min_nights, max_nights, non_stop, max_price)
+        best = np.full(len(self._codes), np.inf)
+        np.minimum.at(best, (key >> (2 * _DAY_BITS)) & ((1 << _CODE_BITS) - 1), price)
+        return {self._codes[i]: round(float(best[i]), 2) for i in np.nonzero(np.isfinite(best))[0]}
+
+    def stats(self) -> dict:
+        manifest = self.convert()
+        key = self.load()._columns["key"]
+        days = (np.asarray(key) >> _DAY_BITS) & _DAY_MASK
+        routes = np.unique(np.asarray(key) >> (2 * _DAY_BITS))
+        return {
+            "rows": manifest["rows"],
+            "routes": int(len(routes)),
+            "airports": len(self._codes),
+            "first_departure": _iso(days.min(keepdims=True))[0] if len(days) else None,
+            "last_departure": _iso(days.max(keepdims=True))[0] if len(days) else None,
+            "store_dir": self.store_dir,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline-Preisdatensatz umwandeln / ansehen")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="CSV/Parquet in Spalten-Dateien (Memory-Map) umwandeln")
+    convert.add_argument("source")
+    convert.add_argument("--store-dir")
+    convert.add_argument("--force", action="store_true", help="auch umwandeln, wenn die Quelle unverändert ist")
+    stats = sub.add_parser("stats", help="Zeilen, Routen und Zeitraum des Datensatzes")
+    stats.add_argument("source")
+    stats.add_argument("--store-dir")
+    args = parser.parse_args()
+
+    dataset = FareDataset(args.source, store_dir=args.store_dir)
+    if args.command == "convert":
+        manifest = dataset.convert(force=args.force)
+        print(f"{manifest['rows']} Zeilen, {len(manifest['codes'])} Flughäfen -> {dataset.store_dir}")
+    else:
+        print(json.dumps(dataset.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import numpy as np
+import pandas as pd
+
+# Gewichte des Rankings (wie bisher in score_joint_results / score_single_results)
+STOP_PENALTY_EUR = 15
+FAIRNESS_WEIGHT = 0.35
+
+_TEXT_COLUMNS = ("destination", "country", "destination_iata", "depart_date", "return_date")
+
+
+class PriceTensor:
+    """
+    Preise/Stops aller Startorte als Tensor Startort × Ziel × Fenster.
+
+    Jeder Startort wird genau einmal pro (Ziel, Fenster) abgefragt; gemeinsame
+    Kandidaten entstehen danach per vektorisierter Reduktion über die
+    Startort-Achse (`to_table`). Fehlende Angebote sind NaN; `queried`
+    merkt sich, welche Legs beantwortet wurden (auch ohne Angebot), damit
+    eine erweiterte Suche nur neue Legs abfragt.
+    """
+
+    def __init__(self, origins: list, candidates: list, windows: list):
+        self.origins = list(origins)
+        self.candidates = list(candidates)
+        self.windows = list(windows)
+        shape = (len(self.origins), len(self.candidates), len(self.windows))
+        self.price = np.full(shape, np.nan, dtype=np.float64)
+        self.stops = np.full(shape, np.nan, dtype=np.float64)
+        self.queried = np.zeros(shape, dtype=bool)
+
+        self._origin_idx = {o: i for i, o in enumerate(self.origins)}
+        self._dest_idx = {d["iata"]: i for i, d in enumerate(self.candidates)}
+        self._window_idx = {(w["depart_date"], w["return_date"]): i for i, w in enumerate(self.windows)}
+
+    def add_windows(self, windows: list):
+        # Fenster-Achse erweitern (z. B. für die Verfeinerungsrunde des Planers)
+        new = [w for w in windows if (w["depart_date"], w["return_date"]) not in self._window_idx]
+        if not new:
+            return
+        self._grow(axis=2, count=len(new))
+        for w in new:
+            self._window_idx[(w["depart_date"], w["return_date"])] = len(self.windows)
+            self.windows.append(w)
+
+    def add_candidates(self, candidates: list):
+        # Ziel-Achse erweitern (z. B. mehr Ziele / Länder bei einer erweiterten Suche)
+        new = [d for d in candidates if d["iata"] not in self._dest_idx]
+        if not new:
+            return
+        self._grow(axis=1, count=len(new))
+        for d in new:
+            self._dest_idx[d["iata"]] = len(self.candidates)
+            self.candidates.append(d)
+
+    def _grow(self, axis: int, count: int):
+        shape = list(self.price.shape)
+        shape[axis] = count
+        pad = np.full(shape, np.nan, dtype=np.float64)
+        self.price = np.concatenate([self.price, pad], axis=axis)
+        self.stops = np.concatenate([self.stops, pad], axis=axis)
+        self.queried = np.concatenate([self.queried, np.zeros(shape, dtype=bool)], axis=axis)
+
+    def dest_index(self, destination_iata: str) -> int:
+        return self._dest_idx[destination_iata]
+
+    def lookup(self, destination_iata: str, window: dict):
+        # (Ziel-Index, Fenster-Index) oder None, wenn die Kombination nicht im Tensor ist
+        d_idx = self._dest_idx.get(destination_iata)
+        w_idx = self._window_idx.get((window["depart_date"], window["return_date"]))
+        if d_idx is None or w_idx is None:
+            return None
+        return d_idx, w_idx
+
+    def combo_signal(self, dest_idx: int) -> list:
+        """
+        (window, mittlerer Preis über die vorhandenen Startorte) für alle
+        bereits abgefragten Fenster eines Ziels; None = kein Angebot.
+        """
+        out = []
+        prices = self.price[:, dest_idx, :]
+        have_any = np.isfinite(prices).any(axis=0)
+        asked = self.queried[:, dest_idx, :].any(axis=0)
+        for w_idx, w in enumerate(self.windows):
+            if not asked[w_idx]:
+                continue
+            out.append((w, float(np.nanmean(prices[:, w_idx])) if have_any[w_idx] else None))
+        return out
+
+    def index_of(self, origin_iata: str, destination_iata: str, departure_date: str, return_date: str) -> tuple:
+        return (
+            self._origin_idx[origin_iata],
+            self._dest_idx[destination_iata],
+            self._window_idx[(departure_date, return_date)],
+        )
+
+    def set_quote(self, index: tuple, quote: dict):
+        self.queried[index] = True
+        if not quote:
+            return
+        self.price[index] = float(quote["price_total"])
+        self.stops[index] = int(quote["stops_outbound"]) + int(quote["stops_inbound"])
+
+    def set_block(self, dest_idx: np.ndarray, window_idx: np.ndarray, price: np.ndarray, stops: np.ndarray):
+        # Alle Startorte für (Ziel, Fenster)-Paare auf einmal; price/stops: (Startorte × Paare), NaN = kein Angebot
+        self.queried[:, dest_idx, window_idx] = True
+        self.price[:, dest_idx, window_idx] = price
+        self.stops[:, dest_idx, window_idx] = stops
+
+    def combo_complete(self, dest_idx: int, window_idx: int) -> bool:
+        return bool(np.isfinite(self.price[:, dest_idx, window_idx]).all())
+
+    def to_table(self) -> "ResultTable":
+        # Nur (Ziel, Fenster)-Kombinationen, für die alle Startorte ein Angebot haben
+        complete = np.isfinite(self.price).all(axis=0)
+        d_idx, w_idx = np.nonzero(complete)
+
+        columns = {
+            "destination": np.array([d["destination"] for d in self.candidates], dtype=object)[d_idx],
+            "country": np.array([d["country"] for d in self.candidates], dtype=object)[d_idx],
+            "destination_iata": np.array([d["iata"] for d in self.candidates], dtype=object)[d_idx],
+            "depart_date": np.array([w["depart_date"] for w in self.windows], dtype=object)[w_idx],
+            "return_date": np.array([w["return_date"] for w in self.windows], dtype=object)[w_idx],
+            "nights": np.array([w["nights"] for w in self.windows], dtype=np.int16)[w_idx],
+            # (Zeilen × Startorte)
+            "price": self.price[:, d_idx, w_idx].T.copy(),
+            "stops": self.stops[:, d_idx, w_idx].T.astype(np.int16),
+        }
+        return ResultTable(columns, self.origins)
+
+
+class ResultTable:
+    """
+    Kompakte, spaltenweise Ergebnistabelle (NumPy-Arrays statt DataFrame).
+
+    `price` / `stops` sind Matrizen Zeilen × Startorte (1 = Single-Origin,
+    2 = Two-Origin, mehr = Gruppe). Filter sind boolesche Masken (keine
+    Kopien der Tabelle), Gesamtpreis, Fairness-Spanne (max − min) und Score
+    werden in einem vektorisierten Durchlauf berechnet, und `top_k` sortiert
+    nur die besten k Zeilen (argpartition + lexsort). Anzeige-Spalten werden
+    erst in `to_display_frame` und nur für die gezeigten Zeilen gebaut.
+    """
+
+    def __init__(self, columns: dict, origins: list):
+        self.columns = columns
+        self.origins = list(origins)
+
+    @classmethod
+    def empty(cls, origins: list) -> "ResultTable":
+        columns = {name: np.array([], dtype=object) for name in _TEXT_COLUMNS}
+        columns["nights"] = np.array([], dtype=np.int16)
+        columns["price"] = np.zeros((0, len(origins)), dtype=np.float64)
+        columns["stops"] = np.zeros((0, len(origins)), dtype=np.int16)
+        return cls(columns, origins)
+
+    def __len__(self) -> int:
+        return self.columns["price"].shape[0]
+
+    # -----------------------------
+    # Filter
+    # -----------------------------
+    def filter_mask(self, countries=None, nights_range=None, budget_per_person=0, nonstop_only=False, depart_range=None) -> np.ndarray:
+        c = self.columns
+        mask = np.ones(len(self), dtype=bool)
+
+        if depart_range:
+            # ISO-Daten lassen sich als Strings vergleichen
+            first, last = (d.isoformat() if hasattr(d, "isoformat") else d for d in depart_range)
+            depart = c["depart_date"].astype(str)
+            mask &= (depart >= first) & (depart <= last)
+
+        if countries:
+            mask &= np.isin(c["country"], list(countries))
+
+        if nights_range:
+            min_nights, max_nights = nights_range
+            mask &= (c["nights"] >= min_nights) & (c["nights"] <= max_nights)
+
+        if budget_per_person and budget_per_person > 0:
+            mask &= (c["price"] <= budget_per_person).all(axis=1)
+
+        if nonstop_only:
+            mask &= (c["stops"] == 0).all(axis=1)
+
+        return mask
+
+    # -----------------------------
+    # Scoring / Ranking
+    # -----------------------------
+    def score(self) -> dict:
+        price = self.columns["price"]
+        total = price.sum(axis=1)
+        spread = price.max(axis=1) - price.min(axis=1)
+        penalty = self.columns["stops"].sum(axis=1) * STOP_PENALTY_EUR
+        # Single-Origin: Spanne = 0 -> Score = Preis + Stop-Strafe
+        return {
+            "score": total + FAIRNESS_WEIGHT * spread + penalty,
+            "total_price": total,
+            "fairness_gap": spread,
+        }
+
+    def top_k(self, k: int = None, mask: np.ndarray = None):
+        """
+        Indizes der besten k Zeilen (nach Score, dann Gesamtpreis, dann
+        Fairness) und die berechneten Score-Spalten. `k=None` = alle Zeilen.
+        """
+        scores = self.score()
+        idx = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+
+        score = scores["score"][idx]
+        if k is not None and 0 < k < len(idx):
+            # Nur die k kleinsten Scores (plus Gleichstände an der Grenze) vollständig sortieren
+            kth = np.partition(score, k - 1)[k - 1]
+            keep = score <= kth
+            idx, score = idx[keep], score[keep]
+
+        order = np.lexsort((scores["fairness_gap"][idx], scores["total_price"][idx], score))
+        ranked = idx[order]
+        if k is not None:
+            ranked = ranked[:k]
+        return ranked, scores
+
+    # -----------------------------
+    # Anzeige
+    # -----------------------------
+    def origin_labels(self) -> list:
+        if len(self.origins) == 2:
+            return ["A", "B"]
+        return list(self.origins)
+
+    def to_display_frame(self, idx: np.ndarray, scores: dict) -> pd.DataFrame:
+        c = self.columns
+        out = {
+            "Ziel": c["destination"][idx],
+            "Land": c["country"][idx],
+            "Abflug": c["depart_date"][idx],
+            "Rückflug": c["return_date"][idx],
+            "Nächte": c["nights"][idx],
+        }
+        price = np.round(c["price"][idx]).astype(int)
+        stops = c["stops"][idx].astype(int)
+
+        if len(self.origins) == 1:
+            out["Preis (€)"] = price[:, 0]
+            out["Stops (hin+zurück)"] = stops[:, 0]
+            return pd.DataFrame(out)
+
+        labels = self.origin_labels()
+        for i, label in enumerate(labels):
+            out[f"Preis {label} (€)"] = price[:, i]
+        out["Gesamtpreis (€)"] = np.round(scores["total_price"][idx]).astype(int)
+        out["Fairness-Diff (€)"] = np.round(scores["fairness_gap"][idx]).astype(int)
+        for i, label in enumerate(labels):
+            out[f"Stops {label} (hin+zurück)"] = stops[:, i]
+        return pd.DataFrame(out)
+
+    def to_records(self, idx: np.ndarray, scores: dict) -> list:
+        # Maschinenlesbare Zeilen (CLI / Batch-Service), Preise je Startort
+        c = self.columns
+        records = []
+        for i in idx:
+            records.append({
+                "destination": c["destination"][i],
+                "country": c["country"][i],
+                "destination_iata": c["destination_iata"][i],
+                "depart_date": c["depart_date"][i],
+                "return_date": c["return_date"][i],
+                "nights": int(c["nights"][i]),
+                "prices": {o: round(float(p), 2) for o, p in zip(self.origins, c["price"][i])},
+                "stops": {o: int(s) for o, s in zip(self.origins, c["stops"][i])},
+                "total_price": round(float(scores["total_price"][i]), 2),
+                "fairness_gap": round(float(scores["fairness_gap"][i]), 2),
+                "score": round(float(scores["score"][i]), 2),
+            })
+        return records
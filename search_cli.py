@@ -0,0 +1,185 @@
+"""
+Kommandozeile für den headless Suchkern (ohne Streamlit).
+
+Zugangsdaten aus Umgebungsvariablen (AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET,
+optional AMADEUS_BASE_URL, QUOTE_CACHE_PATH) oder `.streamlit/secrets.toml`;
+mit `--dataset` (bzw. FARE_DATASET_PATH) offline aus einer Preisdatei, ohne API.
+
+    python -m search_cli --origins BER,VIE --from 2026-04-01 --to 2026-06-30 --nights 3-5
+    python -m search_cli --origins BER --from 2026-05-01 --to 2026-05-31 --countries Italien,Spanien --json
+    python -m search_cli --batch searches.jsonl > results.jsonl   # eine Suche (JSON) pro Zeile
+    python -m search_cli --origins BER --from 2026-05-01 --to 2026-05-31 --trace trace.jsonl --metrics metrics.prom
+    python -m search_cli --origins BER,VIE --from 2026-04-01 --to 2026-09-30 --nights 2-10 --strategy calendar
+    python -m search_cli --origins BER,VIE --from 2026-05-01 --to 2026-05-28 --nights 2-10 --strategy oneway
+    python -m search_cli --origins BER,VIE --from 2026-04-01 --to 2026-09-30 --dataset data/fares.parquet --max-windows 60
+"""
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from metrics import METRICS, SearchTrace
+from quote_providers import FareDataset
+from search_engine import DEFAULT_MAX_WORKERS
+from trip_search import (
+    DEFAULT_RESULT_TOP_N,
+    DEFAULT_SEARCH_DEADLINE_S,
+    WINDOW_STRATEGIES,
+    WINDOW_STRATEGY_ADAPTIVE,
+    LegFetcher,
+    configure_fetcher,
+    search_job,
+)
+
+
+def parse_nights(value: str) -> list:
+    parts = value.split("-")
+    return [int(parts[0]), int(parts[-1])]
+
+
+def params_from_args(args) -> dict:
+    return {
+        "origins": args.origins,
+        "start_date": args.date_from,
+        "end_date": args.date_to,
+        "nights_range": parse_nights(args.nights),
+        "countries": [c.strip() for c in args.countries.split(",") if c.strip()] if args.countries else [],
+        "budget_per_person": args.budget,
+        "nonstop_only": args.nonstop,
+        "max_destinations": args.max_destinations,
+        "max_date_windows": args.max_windows,
+        "window_strategy": args.strategy,
+        "max_workers": args.workers,
+        "deadline_s": args.deadline,
+    }
+
+
+def print_result(result: dict):
+    if result.get("errors"):
+        for error in result["errors"]:
+            print(f"Fehler: {error}", file=sys.stderr)
+        return
+
+    rows = result["rows"]
+    origins = result["params"]["origins"]
+    print(f"{' / '.join(origins)}: {result['combinations']} Kombinationen, "
+          f"{result['calls']} Leg-Abfragen ({result['calls_saved']} eingespart) in {result['elapsed_s']} s")
+    timings = result.get("timings", {}).get("stages", {})
+    phases = [f"{name} {stage['total_s']:.2f} s" for name, stage in timings.items() if name not in ("leg", "grid", "calendar", "oneway", "inspiration", "api", "token")]
+    sources = [f"{count}× {source}" for source, count in timings.get("leg", {}).get("sources", {}).items()]
+    if phases:
+        print(f"Zeit: {' • '.join(phases)} | Legs: {', '.join(sources) or '-'}")
+    prescreen = result.get("prescreen")
+    if prescreen:
+        print(f"Vorauswahl: {prescreen['selected']} von {prescreen['catalogue']} Zielen"
+              f" ({prescreen['priced']} mit Inspiration-Preis)")
+    calendar = result.get("calendar")
+    if calendar:
+        print(f"Preiskalender: {calendar['calls']}/{calendar['routes']} Routen, {calendar['confirmed']} Termine bestätigt"
+              + (f", ohne Kalender: {', '.join(calendar['fallback'])}" if calendar["fallback"] else ""))
+    oneway = result.get("oneway")
+    if oneway and not oneway["supported"]:
+        print("Einzelflüge: Datenquelle kennt nur Hin- und Rückflüge, grobe Fenster geprüft")
+    elif oneway and not oneway["screened"]:
+        print(f"Einzelflüge lohnen sich nicht ({oneway['plan_calls']} Abfragen je Route für {oneway['pairs']} Termin-Paare), "
+              "grobe Fenster geprüft")
+    elif oneway:
+        print(f"Einzelflüge: {oneway['calls']} Abfragen für {oneway['pairs']} Termin-Paare je Route "
+              f"(Abflug {oneway['first_departure']} bis {oneway['last_departure']}, als Hin-/Rückflug {oneway['roundtrip_calls']}), "
+              f"{oneway['confirmed']} Termine bestätigt"
+              + (f", ohne Einzelflüge: {', '.join(oneway['fallback'])}" if oneway["fallback"] else ""))
+    if result["missing"] or result["failed"]:
+        print(f"Unvollständig: {len(result['missing'])} Legs nicht rechtzeitig, {len(result['failed'])} fehlgeschlagen")
+    if not rows:
+        print("Keine Ergebnisse.")
+        return
+
+    frame = pd.DataFrame([
+        {
+            "Ziel": r["destination"],
+            "Abflug": r["depart_date"],
+            "Rückflug": r["return_date"],
+            "Nächte": r["nights"],
+            **{f"Preis {o} (€)": round(r["prices"][o]) for o in origins},
+            "Gesamt (€)": round(r["total_price"]),
+            "Score": round(r["score"]),
+        }
+        for r in rows
+    ])
+    print(frame.to_string(index=False))
+
+
+def run_job(params: dict, args) -> dict:
+    trace = SearchTrace() if args.trace else None
+    result = search_job(params, top_n=args.top, trace=trace)
+    if trace is not None:
+        with open(args.trace, "a", encoding="utf-8") as f:
+            f.write(trace.to_json_lines())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="meetcheap-Suche ohne Streamlit")
+    parser.add_argument("--origins", help="Startorte, kommagetrennt (IATA oder unterstützte Städtenamen)")
+    parser.add_argument("--from", dest="date_from", help="Erstes Abflugdatum (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Letztes Abflugdatum (YYYY-MM-DD)")
+    parser.add_argument("--nights", default="3-5", help="Reisedauer, z. B. 3-5")
+    parser.add_argument("--countries", help="Zielländer, kommagetrennt")
+    parser.add_argument("--budget", type=float, default=0, help="Budget pro Person in € (0 = ohne)")
+    parser.add_argument("--nonstop", action="store_true")
+    parser.add_argument("--max-destinations", type=int, default=6)
+    parser.add_argument("--max-windows", type=int, default=4)
+    parser.add_argument("--strategy", choices=WINDOW_STRATEGIES, default=WINDOW_STRATEGY_ADAPTIVE,
+                        help="calendar = Preis-Kalender je Route, oneway = Einzelflüge je Tag kombinieren; "
+                             "danach jeweils nur die günstigsten Termine bestätigen")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--deadline", type=float, default=DEFAULT_SEARCH_DEADLINE_S, help="Max. Suchdauer in Sekunden")
+    parser.add_argument("--top", type=int, default=DEFAULT_RESULT_TOP_N)
+    parser.add_argument("--dataset", help="Preise offline aus dieser CSV-/Parquet-Datei statt von der API")
+    parser.add_argument("--batch", help="JSON-Lines-Datei mit Suchparametern (- = stdin); Ausgabe als JSON Lines")
+    parser.add_argument("--json", action="store_true", help="Ergebnis als JSON ausgeben")
+    parser.add_argument("--trace", help="Spans jeder Suche (Wasserfall) als JSON Lines an diese Datei anhängen")
+    parser.add_argument("--metrics", help="Zähler/Latenzen am Ende im Prometheus-Textformat in diese Datei schreiben")
+    args = parser.parse_args()
+    if args.dataset:
+        configure_fetcher(LegFetcher(provider=FareDataset(args.dataset).load()))
+
+    try:
+        if args.batch:
+            source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+            with source:
+                for line in source:
+                    if not line.strip():
+                        continue
+                    try:
+                        result = run_job(json.loads(line), args)
+                    except (KeyError, ValueError) as e:
+                        # z. B. kaputte Zeile oder fehlende Zugangsdaten: als Fehler-Zeile melden, weiter mit der nächsten
+                        result = {"errors": [f"{type(e).__name__}: {e}"]}
+                    print(json.dumps(result), flush=True)
+            return
+
+        if not args.origins or not args.date_from or not args.date_to:
+            parser.error("--origins, --from und --to sind nötig (oder --batch)")
+        try:
+            result = run_job(params_from_args(args), args)
+        except (KeyError, ValueError) as e:
+            # z. B. fehlende Zugangsdaten
+            print(f"Fehler: {e}", file=sys.stderr)
+            sys.exit(2)
+    finally:
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(METRICS.to_prometheus())
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_result(result)
+    if result.get("errors"):
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
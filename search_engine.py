@@ -0,0 +1,233 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from amadeus_client import deadline_scope
+from metrics import current_trace, span, trace_scope
+from ranking import PriceTensor
+
+# Standard-Parallelität für Leg-Abfragen (das TPS-Limit setzt der Client)
+DEFAULT_MAX_WORKERS = 4
+
+
+def leg_key(origin_iata: str, destination_iata: str, departure_date: str, return_date: str) -> tuple:
+    return (origin_iata, destination_iata, departure_date, return_date)
+
+
+class LegFanOut:
+    """
+    Führt Leg-Abfragen parallel in einem Thread-Pool aus.
+
+    - `submit(leg)` plant eine Abfrage ein (auch während `results()` läuft).
+    - `results()` liefert `(leg, quote)` in Abschlussreihenfolge, im Thread
+      des Aufrufers (damit Streamlit-Elemente wie `st.progress` dort
+      aktualisiert werden können).
+    - Fehler bleiben pro Leg isoliert: eine Exception ergibt `quote = None`
+      und wird in `failed` als (leg, Fehlertext) festgehalten.
+    - `deadline` (`time.monotonic()`-Zeitpunkt): gilt für jeden Request
+      (siehe `deadline_scope`); danach liefert `results()` nichts mehr, noch
+      offene Legs landen in `timed_out`.
+    - Der Trace des erzeugenden Threads (`metrics.trace_scope`) gilt auch in
+      den Workern: jedes Leg wird ein Span `span_name` (Standard `leg`).
+    - Statt Legs gehen auch Preis-Kalender je Route bzw. Inspiration je
+      Startort (`first_departure` / `last_departure` statt `departure_date` /
+      `return_date`, bei Inspiration ohne `destination_iata`).
+    """
+
+    def __init__(self, fetch, max_workers: int = DEFAULT_MAX_WORKERS, deadline: float = None, span_name: str = "leg"):
+        self._fetch = fetch
+        self._span_name = span_name
+        self._executor = ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix="leg")
+        self._pending = set()
+        self._futures_leg = {}
+        self.deadline = deadline
+        self.failed = []
+        self.timed_out = []
+        self._failed_lock = threading.Lock()
+        self._trace = current_trace()
+
+    def _safe_fetch(self, leg: dict):
+        try:
+            with deadline_scope(self.deadline), trace_scope(self._trace):
+                with span(self._span_name, origin=leg["origin_iata"], destination=leg.get("destination_iata"),
+                          depart=leg.get("departure_date", leg.get("first_departure")),
+                          ret=leg.get("return_date", leg.get("last_departure"))) as record:
+                    try:
+                        return self._fetch(**leg)
+                    except Exception as e:
+                        record["error"] = type(e).__name__
+                        raise
+        except Exception as e:
+            with self._failed_lock:
+                self.failed.append((leg, f"{type(e).__name__}: {e}"))
+            return None
+
+    def submit(self, leg: dict):
+        future = self._executor.submit(self._safe_fetch, leg)
+        self._futures_leg[future] = leg
+        self._pending.add(future)
+
+    def results(self):
+        while self._pending:
+            timeout = None if self.deadline is None else max(self.deadline - time.monotonic(), 0.0)
+            done, self._pending = wait(self._pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Deadline erreicht: Ranking läuft mit den fertigen Legs weiter
+                self.timed_out.extend(self._futures_leg.pop(f) for f in self._pending)
+                self._pending = set()
+                return
+            for future in done:
+                yield self._futures_leg.pop(future), future.result()
+
+    def close(self):
+        # Noch nicht gestartete Legs verwerfen (z. B. wenn Streamlit den Lauf abbricht)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def run_leg_grid(
+    origins: list,
+    candidates: list,
+    windows: list,
+    fetch,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    leg_filters: dict = None,
+    passes_filters=None,
+    on_leg=None,
+    on_update=None,
+    combos: list = None,
+    tensor: PriceTensor = None,
+    deadline: float = None,
+) -> dict:
+    """
+    Fragt alle Kombinationen Startort × Ziel × Fenster parallel ab und
+    schreibt die Angebote in einen `PriceTensor` (beliebig viele Startorte).
+
+    - Die übrigen Startorte werden erst angefragt, wenn das Angebot des
+      ersten Startorts `passes_filters(quote)` erfüllt (Standard: es gibt ein Angebot).
+    - `on_leg(leg, quote, done_calls, total_calls_est)` nach jedem Call,
+      `on_update(tensor, complete_combos)` nach jeder fertigen (Ziel, Fenster)-Kombination.
+    - Callbacks laufen im Thread des Aufrufers.
+    - `combos`: explizite Liste (dest, window) statt Ziele × Fenster;
+      `tensor`: bestehenden Tensor weiterfüllen (mehrstufige Suche).
+    - `deadline`: nach diesem `time.monotonic()`-Zeitpunkt wird nicht mehr
+      gewartet; fehlende Legs stehen in `missing`, fehlgeschlagene in `failed`.
+
+    Rückgabe: {"tensor", "calls", "calls_saved", "missing": [leg], "failed": [(leg, fehler)]}
+    """
+    passes_filters = passes_filters or bool
+    lead_origin, other_origins = origins[0], origins[1:]
+    if tensor is None:
+        tensor = PriceTensor(origins, candidates, windows)
+    else:
+        tensor.add_candidates(candidates)
+        tensor.add_windows(windows)
+    if combos is None:
+        combos = [(dest, w) for dest in candidates for w in windows]
+
+    total_calls_est = len(combos) * len(origins)
+    done_calls = 0
+    calls_saved = 0
+    complete_combos = 0
+
+    with LegFanOut(fetch, max_workers=max_workers, deadline=deadline) as fan_out:
+        # Zuerst nur der erste Startort; die anderen folgen, wenn er Budget/Filter erfüllt
+        for dest, w in combos:
+            fan_out.submit({
+                "origin_iata": lead_origin,
+                "destination_iata": dest["iata"],
+                "departure_date": w["depart_date"],
+                "return_date": w["return_date"],
+                **(leg_filters or {}),
+            })
+
+        for leg, quote in fan_out.results():
+            index = tensor.index_of(leg["origin_iata"], leg["destination_iata"], leg["departure_date"], leg["return_date"])
+            tensor.set_quote(index, quote)
+            done_calls += 1
+
+            if leg["origin_iata"] == lead_origin and other_origins:
+                if passes_filters(quote):
+                    for origin_iata in other_origins:
+                        fan_out.submit({**leg, "origin_iata": origin_iata})
+                else:
+                    calls_saved += len(other_origins)
+                    total_calls_est -= len(other_origins)
+
+            if on_leg is not None:
+                on_leg(leg, quote, done_calls, total_calls_est)
+
+            if quote and tensor.combo_complete(index[1], index[2]):
+                complete_combos += 1
+                if on_update is not None:
+                    on_update(tensor, complete_combos)
+
+    # Fehlgeschlagene Legs gelten nicht als abgefragt (nächste Suche versucht sie erneut)
+    for leg, _ in fan_out.failed:
+        tensor.queried[tensor.index_of(leg["origin_iata"], leg["destination_iata"], leg["departure_date"], leg["return_date"])] = False
+
+    return {
+        "tensor": tensor,
+        "calls": done_calls,
+        "calls_saved": calls_saved,
+        "missing": fan_out.timed_out,
+        "failed": fan_out.failed,
+    }
+
+
+def fill_leg_grid(
+    origins: list,
+    candidates: list,
+    windows: list,
+    fetch_grid,
+    leg_filters: dict = None,
+    on_update=None,
+    combos: list = None,
+    tensor: PriceTensor = None,
+) -> dict:
+    """
+    Wie `run_leg_grid`, aber für Provider mit `price_grid` (z. B. Offline-
+    Datensatz): das ganze Raster Startort × Ziel × Fenster kommt aus einer
+    vektorisierten Abfrage, ohne Thread-Pool und ohne Leg-Callbacks;
+    `on_update` wird einmal am Ende aufgerufen.
+
+    `fetch_grid(origins, destinations, windows, non_stop, max_price)` -> (price, stops),
+    je Startort × Ziel × Fenster.
+    """
+    if tensor is None:
+        tensor = PriceTensor(origins, candidates, windows)
+    else:
+        tensor.add_candidates(candidates)
+        tensor.add_windows(windows)
+    if combos is None:
+        combos = [(dest, w) for dest in candidates for w in windows]
+    if not combos:
+        return {"tensor": tensor, "calls": 0, "calls_saved": 0, "missing": [], "failed": []}
+
+    dests = list({dest["iata"]: dest for dest, _ in combos})
+    grid_windows = list({(w["depart_date"], w["return_date"]): w for _, w in combos}.values())
+    with span("grid", origin=",".join(origins), rows=len(combos) * len(origins)):
+        price, stops = fetch_grid(origins, dests, grid_windows, **(leg_filters or {}))
+
+    dest_pos = {iata: i for i, iata in enumerate(dests)}
+    window_pos = {(w["depart_date"], w["return_date"]): i for i, w in enumerate(grid_windows)}
+    grid_d = np.array([dest_pos[dest["iata"]] for dest, _ in combos])
+    grid_w = np.array([window_pos[(w["depart_date"], w["return_date"])] for _, w in combos])
+    index = [tensor.lookup(dest["iata"], w) for dest, w in combos]
+    tensor.set_block(
+        np.array([i[0] for i in index]), np.array([i[1] for i in index]),
+        price[:, grid_d, grid_w], stops[:, grid_d, grid_w],
+    )
+
+    complete_combos = int(np.isfinite(price[:, grid_d, grid_w]).all(axis=0).sum())
+    if complete_combos and on_update is not None:
+        on_update(tensor, complete_combos)
+    return {"tensor": tensor, "calls": len(combos) * len(origins), "calls_saved": 0, "missing": [], "failed": []}
@@ -0,0 +1,175 @@
+"""
+Kleiner lokaler HTTP-Service für Batch-Suchen auf dem headless Suchkern.
+
+- POST /jobs         Body: {"searches": [params, ...], "top_n": 20} (oder ein einzelnes params-Objekt)
+                     -> 202 {"job_id": ..., "status": "queued", "searches": n}
+- GET  /jobs/<id>    -> {"status": "queued|running|done", "done": k, "searches": n, "results": [...]}
+- GET  /health       -> {"status": "ok", "jobs": ...}
+- GET  /metrics      -> Zähler/Latenzen im Prometheus-Textformat (`?format=jsonl`: JSON Lines)
+
+`params` wie `trip_search.SearchParams.to_dict()`. Mit `--processes` laufen
+die Suchen in Worker-Prozessen (jeder mit eigenem Client; der Quote-Cache
+wird über die SQLite-Datei geteilt), sonst in Threads. `/metrics` zeigt
+nur die Messwerte dieses Prozesses, mit `--processes` also ohne die Suchen.
+
+    python -m search_service --port 8780 --workers 2
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from metrics import METRICS
+
+from trip_search import DEFAULT_RESULT_TOP_N, search_job
+
+# Fertige Jobs werden nach einer Stunde vergessen
+JOB_RETENTION_S = 3600
+
+
+class JobStore:
+    """
+    Batch-Jobs im Speicher: jede Suche eines Jobs ist ein eigener Future.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, searches: list, top_n: int) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        futures = [self.executor.submit(search_job, params, top_n) for params in searches]
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {"created_at": time.time(), "futures": futures}
+        return job_id
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_S
+        for job_id in [j for j, job in self._jobs.items() if job["created_at"] < cutoff and all(f.done() for f in job["futures"])]:
+            del self._jobs[job_id]
+
+    def status(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        futures = job["futures"]
+        done = sum(f.done() for f in futures)
+        results = []
+        for f in futures:
+            if not f.done():
+                results.append(None)
+            elif f.exception() is not None:
+                results.append({"errors": [f"{type(f.exception()).__name__}: {f.exception()}"]})
+            else:
+                results.append(f.result())
+
+        if done == len(futures):
+            state = "done"
+        elif done or any(f.running() for f in futures):
+            state = "running"
+        else:
+            state = "queued"
+        return {"job_id": job_id, "status": state, "done": done, "searches": len(futures), "results": results}
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "jobs": len(jobs),
+            "pending_searches": sum(not f.done() for job in jobs for f in job["futures"]),
+        }
+
+
+def make_handler(store: JobStore):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            self._send_body(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+        def _send_body(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if urlparse(self.path).path != "/jobs":
+                self.rfile.read(length)
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "Body ist kein gültiges JSON"})
+                return
+
+            searches = payload.get("searches") if isinstance(payload, dict) and "searches" in payload else [payload]
+            if not isinstance(searches, list) or not all(isinstance(s, dict) for s in searches) or not searches:
+                self._send_json(400, {"error": "'searches' muss eine nicht-leere Liste von Objekten sein"})
+                return
+
+            top_n = int(payload.get("top_n", DEFAULT_RESULT_TOP_N)) if isinstance(payload, dict) else DEFAULT_RESULT_TOP_N
+            job_id = store.submit(searches, top_n)
+            self._send_json(202, {"job_id": job_id, "status": "queued", "searches": len(searches)})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = url.path
+            if path == "/metrics":
+                if parse_qs(url.query).get("format") == ["jsonl"]:
+                    self._send_body(200, METRICS.to_json_lines().encode("utf-8"), "application/x-ndjson")
+                else:
+                    self._send_body(200, METRICS.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+                return
+            if path == "/health":
+                self._send_json(200, {"status": "ok", **store.stats()})
+                return
+            if path.startswith("/jobs/"):
+                status = store.status(path[len("/jobs/"):])
+                if status is None:
+                    self._send_json(404, {"error": "unbekannter Job"})
+                else:
+                    self._send_json(200, status)
+                return
+            self._send_json(404, {"error": "not found"})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler Batch-Service für meetcheap-Suchen")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--workers", type=int, default=2, help="Gleichzeitige Suchen")
+    parser.add_argument("--processes", action="store_true", help="Suchen in Worker-Prozessen statt Threads")
+    args = parser.parse_args()
+
+    pool = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    with pool(max_workers=max(args.workers, 1)) as executor:
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(JobStore(executor)))
+        server.daemon_threads = True
+        print(f"meetcheap Batch-Service auf http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
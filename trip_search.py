@@ -0,0 +1,1174 @@
+"""
+Headless Suchkern von meetcheap – ohne Streamlit.
+
+Ziele, Datumsfenster, Leg-Abfragen (Cache → Single-Flight → API), Filter
+und Ranking mit expliziten Parametern (`SearchParams`). Genutzt von der
+Streamlit-App, dem CLI (`search_cli.py`) und dem Batch-Service
+(`search_service.py`).
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import requests
+
+from airports import describe_location, is_known_location, resolve_location, suggest_locations
+from metrics import METRICS, SearchTrace, annotate, stage, trace_scope
+from amadeus_client import Quote, get_client, get_setting
+from prescreen import known_fares, rank_destinations
+from price_history import DEFAULT_HISTORY_PATH, PriceHistory
+from quote_providers import AmadeusProvider, FareDataset
+from quote_cache import (
+    DEFAULT_CACHE_PATH,
+    MISSING,
+    QuoteCache,
+    SingleFlight,
+    flight_dates_cache_key,
+    flight_destinations_cache_key,
+    quote_cache_key,
+)
+from ranking import FAIRNESS_WEIGHT, PriceTensor, ResultTable
+from search_engine import DEFAULT_MAX_WORKERS, LegFanOut, fill_leg_grid, run_leg_grid
+from window_planner import coarse_windows, refine_radius, refine_windows, split_budget, window_key
+
+# -----------------------------
+# Config (klein halten = gratis-freundlich)
+# -----------------------------
+# Ziel-Katalog; vor jeder Suche sortiert `prescreen.rank_destinations` nach
+# geschätztem Preis, nur die besten `max_destinations` werden abgefragt
+DESTINATIONS = [
+    {"destination": "Rom", "country": "Italien", "iata": "FCO"},
+    {"destination": "Mailand", "country": "Italien", "iata": "MXP"},
+    {"destination": "Neapel", "country": "Italien", "iata": "NAP"},
+    {"destination": "Barcelona", "country": "Spanien", "iata": "BCN"},
+    {"destination": "Valencia", "country": "Spanien", "iata": "VLC"},
+    {"destination": "Palma", "country": "Spanien", "iata": "PMI"},
+    {"destination": "Lissabon", "country": "Portugal", "iata": "LIS"},
+    {"destination": "Porto", "country": "Portugal", "iata": "OPO"},
+    {"destination": "Athen", "country": "Griechenland", "iata": "ATH"},
+    {"destination": "Prag", "country": "Tschechien", "iata": "PRG"},
+    {"destination": "Budapest", "country": "Ungarn", "iata": "BUD"},
+    {"destination": "Kopenhagen", "country": "Dänemark", "iata": "CPH"},
+    {"destination": "Venedig", "country": "Italien", "iata": "VCE"},
+    {"destination": "Florenz", "country": "Italien", "iata": "FLR"},
+    {"destination": "Bologna", "country": "Italien", "iata": "BLQ"},
+    {"destination": "Bari", "country": "Italien", "iata": "BRI"},
+    {"destination": "Catania", "country": "Italien", "iata": "CTA"},
+    {"destination": "Palermo", "country": "Italien", "iata": "PMO"},
+    {"destination": "Cagliari", "country": "Italien", "iata": "CAG"},
+    {"destination": "Madrid", "country": "Spanien", "iata": "MAD"},
+    {"destination": "Málaga", "country": "Spanien", "iata": "AGP"},
+    {"destination": "Alicante", "country": "Spanien", "iata": "ALC"},
+    {"destination": "Sevilla", "country": "Spanien", "iata": "SVQ"},
+    {"destination": "Bilbao", "country": "Spanien", "iata": "BIO"},
+    {"destination": "Ibiza", "country": "Spanien", "iata": "IBZ"},
+    {"destination": "Teneriffa", "country": "Spanien", "iata": "TFS"},
+    {"destination": "Gran Canaria", "country": "Spanien", "iata": "LPA"},
+    {"destination": "Faro", "country": "Portugal", "iata": "FAO"},
+    {"destination": "Funchal", "country": "Portugal", "iata": "FNC"},
+    {"destination": "Thessaloniki", "country": "Griechenland", "iata": "SKG"},
+    {"destination": "Heraklion", "country": "Griechenland", "iata": "HER"},
+    {"destination": "Rhodos", "country": "Griechenland", "iata": "RHO"},
+    {"destination": "Korfu", "country": "Griechenland", "iata": "CFU"},
+    {"destination": "Santorini", "country": "Griechenland", "iata": "JTR"},
+    {"destination": "Split", "country": "Kroatien", "iata": "SPU"},
+    {"destination": "Dubrovnik", "country": "Kroatien", "iata": "DBV"},
+    {"destination": "Zadar", "country": "Kroatien", "iata": "ZAD"},
+    {"destination": "Nizza", "country": "Frankreich", "iata": "NCE"},
+    {"destination": "Paris", "country": "Frankreich", "iata": "PAR"},
+    {"destination": "Marseille", "country": "Frankreich", "iata": "MRS"},
+    {"destination": "Bordeaux", "country": "Frankreich", "iata": "BOD"},
+    {"destination": "London", "country": "Vereinigtes Königreich", "iata": "LON"},
+    {"destination": "Edinburgh", "country": "Vereinigtes Königreich", "iata": "EDI"},
+    {"destination": "Dublin", "country": "Irland", "iata": "DUB"},
+    {"destination": "Amsterdam", "country": "Niederlande", "iata": "AMS"},
+    {"destination": "Brüssel", "country": "Belgien", "iata": "BRU"},
+    {"destination": "Wien", "country": "Österreich", "iata": "VIE"},
+    {"destination": "Zürich", "country": "Schweiz", "iata": "ZRH"},
+    {"destination": "Berlin", "country": "Deutschland", "iata": "BER"},
+    {"destination": "München", "country": "Deutschland", "iata": "MUC"},
+    {"destination": "Hamburg", "country": "Deutschland", "iata": "HAM"},
+    {"destination": "Krakau", "country": "Polen", "iata": "KRK"},
+    {"destination": "Danzig", "country": "Polen", "iata": "GDN"},
+    {"destination": "Warschau", "country": "Polen", "iata": "WAW"},
+    {"destination": "Stockholm", "country": "Schweden", "iata": "STO"},
+    {"destination": "Oslo", "country": "Norwegen", "iata": "OSL"},
+    {"destination": "Helsinki", "country": "Finnland", "iata": "HEL"},
+    {"destination": "Reykjavík", "country": "Island", "iata": "KEF"},
+    {"destination": "Riga", "country": "Lettland", "iata": "RIX"},
+    {"destination": "Tallinn", "country": "Estland", "iata": "TLL"},
+    {"destination": "Vilnius", "country": "Litauen", "iata": "VNO"},
+    {"destination": "Ljubljana", "country": "Slowenien", "iata": "LJU"},
+    {"destination": "Sofia", "country": "Bulgarien", "iata": "SOF"},
+    {"destination": "Bukarest", "country": "Rumänien", "iata": "OTP"},
+    {"destination": "Belgrad", "country": "Serbien", "iata": "BEG"},
+    {"destination": "Tivat", "country": "Montenegro", "iata": "TIV"},
+    {"destination": "Tirana", "country": "Albanien", "iata": "TIA"},
+    {"destination": "Valletta", "country": "Malta", "iata": "MLA"},
+    {"destination": "Larnaka", "country": "Zypern", "iata": "LCA"},
+    {"destination": "Istanbul", "country": "Türkei", "iata": "IST"},
+    {"destination": "Antalya", "country": "Türkei", "iata": "AYT"},
+    {"destination": "Marrakesch", "country": "Marokko", "iata": "RAK"},
+]
+
+SUPPORTED_COUNTRIES = sorted(list({d["country"] for d in DESTINATIONS}))
+
+# Amadeus sortiert Angebote nach Preis -> für das günstigste Angebot reichen wenige
+# (kleinere Antworten, schnelleres Parsen); 3 als Reserve für unvollständige Angebote
+LEG_MAX_OFFERS = 3
+
+DEFAULT_SEARCH_DEADLINE_S = 60
+
+# CLI / Batch-Service: so viele Zeilen pro Suche im Ergebnis
+DEFAULT_RESULT_TOP_N = 20
+
+WINDOW_STRATEGY_ADAPTIVE = "adaptive"
+WINDOW_STRATEGY_WEEKLY = "weekly"
+# Preis-Kalender je Route (1 Call), danach nur die Shortlist per Angebotssuche bestätigen
+WINDOW_STRATEGY_CALENDAR = "calendar"
+# Einzelflüge je Abflug- bzw. Rückflugtag, kombiniert zu allen Reisedauern; Shortlist bestätigen
+WINDOW_STRATEGY_ONEWAY = "oneway"
+WINDOW_STRATEGIES = (WINDOW_STRATEGY_ADAPTIVE, WINDOW_STRATEGY_WEEKLY, WINDOW_STRATEGY_CALENDAR, WINDOW_STRATEGY_ONEWAY)
+
+# Kalenderdaten kommen aus dem Amadeus-Cache und ändern sich langsamer als Angebote
+CALENDAR_TTL_S = 6 * 3600
+# Längere Zeiträume werden in mehrere Kalender-Abfragen geteilt
+CALENDAR_MAX_RANGE_DAYS = 180
+# Der Preis-Kalender prüft so viel mal `max_destinations` Ziele der Vorauswahl
+CALENDAR_SCREEN_FACTOR = 3
+# Einzelflug-Kombination: so viele Einzelflug-Calls je Route und Datumsfenster (`max_date_windows`)
+ONEWAY_CALLS_PER_WINDOW = 6
+# ... und höchstens dieser Anteil der Rest-Deadline, der Rest bleibt für die Bestätigung
+ONEWAY_SCREEN_DEADLINE_SHARE = 0.6
+
+PHASE_PRESCREEN = "Vorauswahl"
+PHASE_SEARCH = "Suche"
+PHASE_COARSE = "Grobsuche"
+PHASE_REFINE = "Verfeinerung"
+PHASE_CALENDAR = "Preiskalender"
+PHASE_CONFIRM = "Bestätigung"
+PHASE_ONEWAY = "Einzelflüge"
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def normalize_origin_to_iata(value: str) -> str:
+    if not value:
+        return ""
+    cleaned = value.strip()
+    # Unbekannte Eingaben bleiben (in Großbuchstaben) stehen; validate() meldet sie
+    return resolve_location(cleaned) or cleaned.upper()
+
+
+def unknown_origin_message(value: str) -> str:
+    suggestions = suggest_locations(value, limit=3)
+    if not suggestions:
+        return f"Unbekannter Startort: {value}"
+    return f"Unbekannter Startort: {value} – meintest du {' / '.join(describe_location(s['code']) for s in suggestions)}?"
+
+
+def generate_trip_windows(start_date: date, end_date: date, min_nights: int, max_nights: int, max_windows: int = 4):
+    windows = []
+    if not start_date or not end_date:
+        return windows
+
+    current = start_date
+    preferred_nights = sorted(set([min_nights, max_nights, (min_nights + max_nights) // 2]))
+
+    while current <= end_date and len(windows) < max_windows:
+        added = False
+        for nights in preferred_nights:
+            ret = current + timedelta(days=int(nights))
+            if ret <= (end_date + timedelta(days=max_nights)):
+                windows.append({
+                    "depart_date": current.isoformat(),
+                    "return_date": ret.isoformat(),
+                    "nights": nights,
+                })
+                added = True
+                if len(windows) >= max_windows:
+                    break
+        current += timedelta(days=7)
+        if not added and current > end_date:
+            break
+
+    unique = []
+    seen = set()
+    for w in windows:
+        key = (w["depart_date"], w["return_date"], w["nights"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(w)
+    return unique[:max_windows]
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+class SearchParams:
+    """
+    Alle Eingaben einer Suche (früher Sidebar-Globals in app.py).
+
+    `origins`: IATA-Codes oder unterstützte Städtenamen; 1 = Single-Origin,
+    2 = Two-Origin, mehr = Gruppe. Doppelte Startorte zählen einmal.
+    """
+
+    def __init__(
+        self,
+        origins: list,
+        start_date: date,
+        end_date: date,
+        nights_range: tuple = (3, 5),
+        countries: list = None,
+        budget_per_person: float = 0,
+        nonstop_only: bool = False,
+        max_destinations: int = 6,
+        max_date_windows: int = 4,
+        window_strategy: str = WINDOW_STRATEGY_ADAPTIVE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        deadline_s: float = DEFAULT_SEARCH_DEADLINE_S,
+    ):
+        # Reihenfolge bleibt erhalten, doppelte Startorte werden nur einmal abgefragt
+        self.origins = list(dict.fromkeys(normalize_origin_to_iata(o) for o in origins if o and o.strip()))
+        # Ungültige Datumsangaben meldet validate() statt einer Exception (Batch-Jobs laufen weiter)
+        self.invalid_dates = []
+        start_date, end_date = self._parse_date(start_date), self._parse_date(end_date)
+        if start_date and end_date and start_date > end_date:
+            start_date, end_date = end_date, start_date
+        self.start_date = start_date
+        self.end_date = end_date
+        self.nights_range = (int(nights_range[0]), int(nights_range[1]))
+        self.countries = list(countries or [])
+        self.budget_per_person = float(budget_per_person or 0)
+        self.nonstop_only = bool(nonstop_only)
+        self.max_destinations = int(max_destinations)
+        self.max_date_windows = int(max_date_windows)
+        self.window_strategy = window_strategy
+        self.max_workers = int(max_workers)
+        self.deadline_s = float(deadline_s)
+
+    def _parse_date(self, value):
+        try:
+            return _as_date(value)
+        except (TypeError, ValueError):
+            self.invalid_dates.append(str(value))
+            return None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SearchParams":
+        origins = data.get("origins") or []
+        if isinstance(origins, str):
+            origins = origins.split(",")
+        kwargs = {k: data[k] for k in (
+            "budget_per_person", "nonstop_only", "max_destinations", "max_date_windows",
+            "window_strategy", "max_workers", "deadline_s",
+        ) if data.get(k) is not None}
+        return cls(
+            origins=origins,
+            start_date=data.get("start_date"),
+            end_date=data.get("end_date"),
+            nights_range=tuple(data.get("nights_range") or (3, 5)),
+            countries=data.get("countries"),
+            **kwargs,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "origins": self.origins,
+            "start_date": self.start_date.isoformat() if self.start_date else None,
+            "end_date": self.end_date.isoformat() if self.end_date else None,
+            "nights_range": list(self.nights_range),
+            "countries": self.countries,
+            "budget_per_person": self.budget_per_person,
+            "nonstop_only": self.nonstop_only,
+            "max_destinations": self.max_destinations,
+            "max_date_windows": self.max_date_windows,
+            "window_strategy": self.window_strategy,
+            "max_workers": self.max_workers,
+            "deadline_s": self.deadline_s,
+        }
+
+    def validate(self) -> list:
+        errors = []
+        if not self.origins:
+            errors.append("Mindestens ein Startort (IATA-Code) ist nötig.")
+        # Eingaben, die der Resolver nicht kennt, bleiben als Text stehen – auch dreibuchstabige
+        errors += [unknown_origin_message(o) for o in self.origins if not is_known_location(o)]
+        errors += [f"Ungültiges Datum: {value} (erwartet JJJJ-MM-TT)." for value in self.invalid_dates]
+        if (not self.start_date or not self.end_date) and not self.invalid_dates:
+            errors.append("Bitte einen gültigen Suchzeitraum angeben.")
+        if self.nights_range[0] > self.nights_range[1]:
+            errors.append("Reisedauer: Minimum ist größer als Maximum.")
+        if self.window_strategy not in WINDOW_STRATEGIES:
+            errors.append(f"Unbekannte Datumsfenster-Strategie: {self.window_strategy}")
+        return errors
+
+    def reuses(self, previous: "SearchParams") -> bool:
+        """
+        Können Daten einer früheren Suche (`previous`) weiterverwendet werden?
+        Gleiche Startorte und deren API-Filter (Direktflug / maxPrice) dürfen
+        höchstens gleich streng gewesen sein; alles andere (Länder, Nächte,
+        Zeitraum, strengere Filter) wird per Maske bzw. Nachladen erledigt.
+        """
+        if previous is None or previous.origins != self.origins:
+            return False
+        if previous.nonstop_only and not self.nonstop_only:
+            return False
+        if previous.budget_per_person > 0 and not (0 < self.budget_per_person <= previous.budget_per_person):
+            return False
+        return True
+
+    def leg_filters(self) -> dict:
+        # Filter direkt an die API geben: nonStop / maxPrice (pro Person)
+        return {
+            "non_stop": self.nonstop_only,
+            "max_price": int(self.budget_per_person) if self.budget_per_person > 0 else None,
+        }
+
+    def passes_filters(self, quote) -> bool:
+        if not quote:
+            return False
+        if self.budget_per_person > 0 and float(quote["price_total"]) > self.budget_per_person:
+            return False
+        if self.nonstop_only and (int(quote["stops_outbound"]) + int(quote["stops_inbound"])) > 0:
+            return False
+        return True
+
+
+# -----------------------------
+# Leg-Abfragen
+# -----------------------------
+class LegFetcher:
+    """
+    Günstigstes Angebot pro Leg: persistenter Quote-Cache → Single-Flight → Provider.
+
+    Prozessweit teilbar (thread-sicher); ohne `quote_cache` / `single_flight`
+    wird direkt abgefragt. Mit `price_history` landet jedes API-Ergebnis
+    zusätzlich im Preisverlauf. `provider`: Preisquelle (siehe
+    `quote_providers`, Standard Amadeus); Offline-Provider ohne Cache und
+    Preisverlauf verwenden, damit ihre Preise nicht als API-Preise gelten.
+    """
+
+    def __init__(self, quote_cache=None, single_flight=None, max_offers: int = LEG_MAX_OFFERS, price_history=None, provider=None):
+        self.quote_cache = quote_cache
+        self.single_flight = single_flight
+        self.price_history = price_history
+        self.provider = provider or AmadeusProvider()
+        self.max_offers = int(max_offers)
+        self._stats_lock = threading.Lock()
+        self._cache_hits = 0
+        self._api_loads = 0
+
+    def __call__(self, origin_iata: str, destination_iata: str, departure_date: str, return_date: str, non_stop: bool = False, max_price: int = None):
+        cache_key = quote_cache_key(
+            origin_iata, destination_iata, departure_date, return_date,
+            adults=1, currency="EUR", non_stop=non_stop, max_price=max_price,
+        )
+        t0 = time.monotonic()
+        cached = self._cached(cache_key)
+        if cached is not MISSING:
+            self._record("cache", t0)
+            return cached
+
+        # Wer nur auf die Abfrage eines anderen Threads wartet, bleibt "coalesced"
+        source = ["coalesced"]
+        load = lambda: self._load(cache_key, origin_iata, destination_iata, departure_date, return_date, non_stop, max_price, source)
+        try:
+            if self.single_flight is not None:
+                return self.single_flight.do(cache_key, load)
+            return load()
+        finally:
+            self._record(source[0], t0)
+
+    def _record(self, source: str, t0: float):
+        METRICS.inc("leg_fetch_total", source=source)
+        METRICS.observe("leg_fetch_seconds", time.monotonic() - t0, source=source)
+        annotate(source=source)
+
+    def _cached(self, cache_key: str):
+        if self.quote_cache is None:
+            return MISSING
+        cached = self.quote_cache.get(cache_key)
+        if cached is MISSING:
+            return MISSING
+        with self._stats_lock:
+            self._cache_hits += 1
+        return Quote.from_record(cached)
+
+    def _load(self, cache_key, origin_iata, destination_iata, departure_date, return_date, non_stop, max_price, source):
+        # Ein anderer Prozess kann das Leg inzwischen geladen haben
+        cached = self._cached(cache_key)
+        if cached is not MISSING:
+            source[0] = "cache"
+            return cached
+        source[0] = "api" if self.provider.live else self.provider.name
+
+        quote = self.provider.quote(
+            origin_iata, destination_iata, departure_date, return_date,
+            non_stop=non_stop, max_price=max_price, max_offers=self.max_offers,
+        )
+        with self._stats_lock:
+            self._api_loads += 1
+        if self.quote_cache is not None:
+            self.quote_cache.put(cache_key, quote.to_record() if quote else None)
+        # Preisverlauf nur für Hin- und Rückflug (Einzelflüge sind nicht vergleichbar)
+        if return_date:
+            self._record_history(cache_key, quote)
+        return quote
+
+    def _record_history(self, cache_key: str, quote):
+        # Preisverlauf ist Beiwerk; Schreibfehler dürfen die Suche nicht stören
+        if self.price_history is None:
+            return
+        try:
+            self.price_history.record(cache_key, quote)
+        except Exception:
+            pass
+
+    def flush_history(self):
+        if self.price_history is None:
+            return
+        try:
+            self.price_history.flush()
+        except Exception:
+            pass
+
+    def date_grid(
+        self,
+        origin_iata: str,
+        destination_iata: str,
+        first_departure: str,
+        last_departure: str,
+        min_nights: int,
+        max_nights: int,
+        non_stop: bool = False,
+        max_price: int = None,
+    ) -> list:
+        """
+        Preis-Kalender einer Route: [[abflug, rückflug, preis], ...] für alle
+        Abflugtage × Reisedauern (Flight Cheapest Date Search), im Quote-Cache
+        `CALENDAR_TTL_S` lang. Zeiträume über `CALENDAR_MAX_RANGE_DAYS` werden
+        aufgeteilt. Routen ohne Kalenderdaten (API: 404) ergeben [].
+        """
+        grid = []
+        chunk_start, last = _as_date(first_departure), _as_date(last_departure)
+        while chunk_start <= last:
+            chunk_end = min(chunk_start + timedelta(days=CALENDAR_MAX_RANGE_DAYS - 1), last)
+            args = (origin_iata, destination_iata, chunk_start.isoformat(), chunk_end.isoformat(), min_nights, max_nights, non_stop, max_price)
+            grid += self._date_grid_chunk(*args)
+            chunk_start = chunk_end + timedelta(days=1)
+        return grid
+
+    def _date_grid_chunk(self, *args) -> list:
+        return self._cached_screen("calendar", flight_dates_cache_key(*args), lambda: self.provider.date_grid(*args), [])
+
+    def inspiration(
+        self,
+        origin_iata: str,
+        first_departure: str,
+        last_departure: str,
+        min_nights: int,
+        max_nights: int,
+        non_stop: bool = False,
+        max_price: int = None,
+    ) -> dict:
+        """
+        Günstigster bekannter Preis je Ziel ab `origin_iata` ({iata: preis},
+        Flight Inspiration Search), im Quote-Cache `CALENDAR_TTL_S` lang.
+        Startorte ohne Daten (API: 404) ergeben {}.
+        """
+        args = (origin_iata, first_departure, last_departure, min_nights, max_nights, non_stop, max_price)
+        return self._cached_screen(
+            "inspiration", flight_destinations_cache_key(*args), lambda: self.provider.inspiration(*args), {},
+        )
+
+    @property
+    def oneway(self):
+        # Einzelflug-Abfrage, falls der Provider Einzelflüge kennt (`provider.oneway`), sonst None
+        return self._oneway if getattr(self.provider, "oneway", False) else None
+
+    def _oneway(self, origin_iata: str, destination_iata: str, departure_date: str, non_stop: bool = False, max_price: int = None):
+        # Günstigster Einzelflug (ohne Rückflug), gleicher Weg über Cache und Single-Flight wie ein Leg
+        return self(origin_iata, destination_iata, departure_date, None, non_stop, max_price)
+
+    @property
+    def price_grid(self):
+        # Ganzes Raster Startort × Ziel × Fenster in einem Schritt (nur Offline-Provider), sonst None
+        return getattr(self.provider, "price_grid", None)
+
+    def _cached_screen(self, kind: str, cache_key: str, fetch, empty):
+        # Vorab-Daten (Kalender, Inspiration): Cache -> Single-Flight -> API; 404 = keine Daten
+        if self.quote_cache is not None:
+            cached = self.quote_cache.get(cache_key)
+            if cached is not MISSING:
+                METRICS.inc(f"{kind}_fetch_total", source="cache")
+                annotate(source="cache")
+                return cached
+
+        def load():
+            try:
+                value = fetch()
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                value = empty
+            if self.quote_cache is not None:
+                self.quote_cache.put(cache_key, value, ttl_s=CALENDAR_TTL_S)
+            return value
+
+        source = "api" if self.provider.live else self.provider.name
+        METRICS.inc(f"{kind}_fetch_total", source=source)
+        annotate(source=source)
+        if self.single_flight is not None:
+            return self.single_flight.do(cache_key, load)
+        return load()
+
+    def record_demand(self, keys: list):
+        # Nachfrage-Log für den Pre-Warmer; darf eine Suche nie scheitern lassen
+        if self.quote_cache is None:
+            return
+        try:
+            self.quote_cache.record_requests(keys)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"cache_hits": self._cache_hits, "api_loads": self._api_loads}
+
+
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+
+def default_fetcher() -> LegFetcher:
+    """
+    Prozessweiter Fetcher für CLI, Batch-Service und Worker-Prozesse
+    (Cache-Pfad aus `QUOTE_CACHE_PATH`, Preisverlauf aus `PRICE_HISTORY_PATH`,
+    sonst wie die App). Mit `FARE_DATASET_PATH` kommen die Preise offline
+    aus diesem Datensatz (ohne Cache und Preisverlauf).
+    """
+    global _default_fetcher
+    with _default_fetcher_lock:
+        dataset_path = get_setting("FARE_DATASET_PATH")
+        if _default_fetcher is None and dataset_path:
+            _default_fetcher = LegFetcher(provider=FareDataset(dataset_path).load())
+        if _default_fetcher is None:
+            quote_cache = QuoteCache(path=get_setting("QUOTE_CACHE_PATH", DEFAULT_CACHE_PATH))
+            history = PriceHistory(get_setting("PRICE_HISTORY_PATH", DEFAULT_HISTORY_PATH))
+            _default_fetcher = LegFetcher(quote_cache, SingleFlight(), price_history=history)
+        return _default_fetcher
+
+
+def configure_fetcher(fetcher: LegFetcher):
+    """
+    Setzt den prozessweiten Fetcher explizit (z. B. `search_cli --dataset`).
+    """
+    global _default_fetcher
+    with _default_fetcher_lock:
+        _default_fetcher = fetcher
+
+
+# -----------------------------
+# Suche
+# -----------------------------
+def catalogue(params: SearchParams) -> list:
+    # Ziel-Katalog nach Länderfilter
+    if params.countries:
+        return [d for d in DESTINATIONS if d["country"] in params.countries]
+    return list(DESTINATIONS)
+
+
+def select_candidates(params: SearchParams, inspiration: dict = None) -> list:
+    """
+    Die vielversprechendsten Ziele (`prescreen.rank_destinations`: Entfernung,
+    Balance zwischen den Startorten, Inspiration-Preise falls vorhanden).
+    Der Preis-Kalender prüft `CALENDAR_SCREEN_FACTOR`-mal so viele; dort
+    begrenzt `max_destinations` erst die Bestätigung.
+    """
+    ranked = rank_destinations(params.origins, catalogue(params), inspiration, params.budget_per_person)
+    limit = params.max_destinations
+    if params.window_strategy == WINDOW_STRATEGY_CALENDAR:
+        limit *= CALENDAR_SCREEN_FACTOR
+    return ranked[:limit]
+
+
+def screen_inspiration(params: SearchParams, fetch_inspiration, deadline: float = None) -> dict:
+    """
+    Inspiration-Preise je Startort ({origin: {iata: preis}}), ein Call pro
+    Startort, parallel; Fehler ergeben einfach keine Preise.
+    """
+    inspiration = {}
+    with LegFanOut(fetch_inspiration, max_workers=params.max_workers, deadline=deadline, span_name="inspiration") as fan_out:
+        for origin in params.origins:
+            fan_out.submit({
+                "origin_iata": origin,
+                "first_departure": params.start_date.isoformat(),
+                "last_departure": params.end_date.isoformat(),
+                "min_nights": params.nights_range[0],
+                "max_nights": params.nights_range[1],
+                **params.leg_filters(),
+            })
+        for leg, prices in fan_out.results():
+            if prices:
+                inspiration[leg["origin_iata"]] = prices
+    return inspiration
+
+
+def plan_windows(params: SearchParams) -> tuple:
+    """
+    Erste Fenster-Runde und Verfeinerungs-Budget je Ziel: (windows, refine_count).
+    """
+    min_nights, max_nights = params.nights_range
+    if params.window_strategy in (WINDOW_STRATEGY_CALENDAR, WINDOW_STRATEGY_ONEWAY):
+        # Nur für Ziele ohne Kalender-/Einzelflugdaten: gleichmäßig verteilte Fenster, keine Verfeinerung
+        return coarse_windows(params.start_date, params.end_date, min_nights, max_nights, params.max_date_windows), 0
+    if params.window_strategy == WINDOW_STRATEGY_ADAPTIVE:
+        coarse_count, refine_count = split_budget(params.max_date_windows)
+        return coarse_windows(params.start_date, params.end_date, min_nights, max_nights, coarse_count), refine_count
+
+    windows = generate_trip_windows(
+        start_date=params.start_date,
+        end_date=params.end_date,
+        min_nights=min_nights,
+        max_nights=max_nights,
+        max_windows=params.max_date_windows,
+    )
+    return windows, 0
+
+
+def combo_known(tensor: PriceTensor, params: SearchParams, dest: dict, window: dict) -> bool:
+    """
+    Ist (Ziel, Fenster) im Tensor schon vollständig beantwortet? Auch dann,
+    wenn der erste Startort kein passendes Angebot hatte und die anderen
+    deshalb gar nicht gefragt wurden.
+    """
+    index = tensor.lookup(dest["iata"], window)
+    if index is None:
+        return False
+    d_idx, w_idx = index
+    queried = tensor.queried[:, d_idx, w_idx]
+    if queried.all():
+        return True
+    if not queried[0]:
+        return False
+    price, stops = tensor.price[0, d_idx, w_idx], tensor.stops[0, d_idx, w_idx]
+    if not np.isfinite(price):
+        return True
+    if params.budget_per_person > 0 and price > params.budget_per_person:
+        return True
+    return bool(params.nonstop_only and stops > 0)
+
+
+def new_combo_count(tensor: PriceTensor, params: SearchParams) -> int:
+    """
+    Wie viele (Ziel, Fenster)-Kombinationen der ersten Runde noch nicht im
+    Tensor sind (ohne API-Calls, Vorauswahl nur nach Entfernung; die
+    Verfeinerung kann weitere ergeben). Beim Preis-Kalender und bei
+    Einzelflügen steht die Shortlist erst nach der Suche fest -> 0.
+    """
+    if params.window_strategy in (WINDOW_STRATEGY_CALENDAR, WINDOW_STRATEGY_ONEWAY):
+        return 0
+    windows, _ = plan_windows(params)
+    return sum(
+        not combo_known(tensor, params, dest, w)
+        for dest in select_candidates(params)
+        for w in windows
+    )
+
+
+def screen_calendar(params: SearchParams, candidates: list, fetch_dates, deadline: float = None, on_leg=None) -> dict:
+    """
+    Preis-Kalender je Startort × Ziel (ein Call pro Route) und daraus die
+    Shortlist für die Bestätigung per Angebotssuche: die `max_destinations`
+    günstigsten Ziele mit je bis zu `max_date_windows` (Abflug, Rückflug)-Paaren,
+    sortiert nach der Summe über alle Startorte. Ziele, für die ein Startort
+    keinen Kalender bekommt (keine Daten, Fehler, Deadline), füllen die
+    restlichen Plätze mit gleichmäßig verteilten Fenstern (`plan_windows`).
+    `on_leg(route, grid, done, total)` nach jedem Kalender-Call.
+
+    Rückgabe: {"combos": [(dest, window)], "calls", "routes", "fallback": [iata],
+    "missing": [route], "failed": [(route, fehler)]}
+    """
+    origins = params.origins
+    min_nights, max_nights = params.nights_range
+    first, last = params.start_date.isoformat(), params.end_date.isoformat()
+    budget = params.budget_per_person
+
+    grids = {}
+    calls = 0
+    with LegFanOut(fetch_dates, max_workers=params.max_workers, deadline=deadline, span_name="calendar") as fan_out:
+        for dest in candidates:
+            for origin in origins:
+                fan_out.submit({
+                    "origin_iata": origin,
+                    "destination_iata": dest["iata"],
+                    "first_departure": first,
+                    "last_departure": last,
+                    "min_nights": min_nights,
+                    "max_nights": max_nights,
+                    **params.leg_filters(),
+                })
+        for leg, grid in fan_out.results():
+            calls += 1
+            if grid:
+                grids[(leg["origin_iata"], leg["destination_iata"])] = grid
+            if on_leg is not None:
+                on_leg(leg, grid, calls, len(candidates) * len(origins))
+
+    ranked, fallback = [], []
+    for dest in candidates:
+        per_origin = [grids.get((origin, dest["iata"])) for origin in origins]
+        if not all(per_origin):
+            fallback.append(dest)
+            continue
+        # Nur Termine, die jeder Startort im Kalender hat; Summe der Preise als Rang
+        totals = None
+        for grid in per_origin:
+            prices = {
+                (depart, ret): price for depart, ret, price in grid
+                if first <= depart <= last and not (budget > 0 and price > budget)
+            }
+            totals = prices if totals is None else {k: v + prices[k] for k, v in totals.items() if k in prices}
+        if not totals:
+            continue
+        best = []
+        for (depart, ret), total in sorted(totals.items(), key=lambda item: item[1]):
+            nights = (date.fromisoformat(ret) - date.fromisoformat(depart)).days
+            if min_nights <= nights <= max_nights:
+                best.append((total, {"depart_date": depart, "return_date": ret, "nights": nights}))
+            if len(best) >= params.max_date_windows:
+                break
+        if best:
+            ranked.append((best[0][0], dest, [w for _, w in best]))
+
+    ranked.sort(key=lambda item: item[0])
+    combos = [(dest, w) for _, dest, windows in ranked[:params.max_destinations] for w in windows]
+    fallback_windows, _ = plan_windows(params)
+    open_slots = max(params.max_destinations - len(ranked), 0)
+    combos += [(dest, w) for dest in fallback[:open_slots] for w in fallback_windows]
+    return {
+        "combos": combos,
+        "calls": calls,
+        "routes": len(candidates) * len(origins),
+        "fallback": [d["iata"] for d in fallback],
+        "missing": fan_out.timed_out,
+        "failed": fan_out.failed,
+    }
+
+
+def oneway_plan(params: SearchParams) -> dict:
+    """
+    Einzelflug-Plan je Route: ein zusammenhängender Block von Abflugtagen ab
+    Beginn des Zeitraums und alle Rückflugtage, die mit einer Reisedauer aus
+    `nights_range` dazu passen. Die Paare wachsen so mit Abflugtagen ×
+    Reisedauern, die Calls nur mit Abflug- + Rückflugtagen. Der Block ist so
+    lang, wie `ONEWAY_CALLS_PER_WINDOW` × `max_date_windows` Einzelflüge je
+    Route erlauben.
+
+    `worthwhile`: Einzelflüge plus Bestätigung (`max_date_windows` je Route)
+    kosten weniger Calls als dieselben Paare als Hin-/Rückflug.
+
+    Rückgabe: {"departs", "returns" (`date`-Listen), "calls", "pairs" (je Route), "worthwhile"}
+    """
+    min_nights, max_nights = params.nights_range
+    durations = max_nights - min_nights + 1
+    budget = ONEWAY_CALLS_PER_WINDOW * params.max_date_windows
+    span_days = (params.end_date - params.start_date).days + 1
+    depart_days = max(min((budget - durations + 1) // 2, span_days), 0)
+    departs = [params.start_date + timedelta(days=i) for i in range(depart_days)]
+    returns = [params.start_date + timedelta(days=min_nights + i) for i in range(depart_days + durations - 1)] if departs else []
+    calls, pairs = len(departs) + len(returns), len(departs) * durations
+    return {
+        "departs": departs,
+        "returns": returns,
+        "calls": calls,
+        "pairs": pairs,
+        "worthwhile": calls + params.max_date_windows < pairs,
+    }
+
+
+def screen_oneway(params: SearchParams, candidates: list, fetch_oneway, deadline: float = None, on_leg=None) -> dict:
+    """
+    Einzelflüge Startort -> Ziel je Abflugtag und Ziel -> Startort je
+    Rückflugtag (`oneway_plan`), danach per Broadcasting zu allen
+    (Abflug, Rückflug)-Paaren in `nights_range` kombiniert: Calls wachsen
+    mit Abflug- + Rückflugtagen statt Abflugtagen × Reisedauern.
+    Die Tage werden verschränkt über alle Routen eingeplant, damit bei
+    erreichter `deadline` jede Route ähnlich weit gekommen ist.
+
+    Shortlist wie beim Preis-Kalender: die `max_destinations` besten Ziele mit
+    je bis zu `max_date_windows` Paaren, bewertet wie im Ranking (Summe +
+    `FAIRNESS_WEIGHT` × Abstand); Ziele ohne ein einziges Paar füllen die
+    restlichen Plätze mit `plan_windows`. `on_leg(leg, quote, done, total)`
+    nach jedem Einzelflug.
+
+    Rückgabe: {"combos": [(dest, window)], "calls", "routes", "pairs" (je Route),
+    "roundtrip_calls" (dieselben Paare als Hin-/Rückflug), "first_departure",
+    "last_departure", "fallback": [iata], "missing": [leg], "failed": [(leg, fehler)]}
+    """
+    origins = params.origins
+    min_nights, max_nights = params.nights_range
+    plan = oneway_plan(params)
+    departs, returns = plan["departs"], plan["returns"]
+    shape = (len(origins), len(candidates))
+    outbound = np.full(shape + (len(departs),), np.nan)
+    inbound = np.full(shape + (len(returns),), np.nan)
+
+    # (von, nach, tag) -> (Array, Index); Startorte sind nie zugleich Ziel (siehe prescreen)
+    slots = {}
+    for o_idx, origin in enumerate(origins):
+        for d_idx, dest in enumerate(candidates):
+            for t_idx, day in enumerate(departs):
+                slots[(origin, dest["iata"], day.isoformat())] = (outbound, (o_idx, d_idx, t_idx))
+            for t_idx, day in enumerate(returns):
+                slots[(dest["iata"], origin, day.isoformat())] = (inbound, (o_idx, d_idx, t_idx))
+
+    calls = 0
+    with LegFanOut(fetch_oneway, max_workers=params.max_workers, deadline=deadline, span_name="oneway") as fan_out:
+        for origin_iata, destination_iata, day in sorted(slots, key=lambda slot: slots[slot][1][2]):
+            fan_out.submit({
+                "origin_iata": origin_iata,
+                "destination_iata": destination_iata,
+                "departure_date": day,
+                **params.leg_filters(),
+            })
+        for leg, quote in fan_out.results():
+            calls += 1
+            if quote:
+                target, index = slots[(leg["origin_iata"], leg["destination_iata"], leg["departure_date"])]
+                target[index] = float(quote["price_total"])
+            if on_leg is not None:
+                on_leg(leg, quote, calls, len(slots))
+
+    # Startort × Ziel × Abflug × Rückflug; ungültige Reisedauer bzw. über Budget = NaN
+    nights = np.array([(r - d).days for d in departs for r in returns]).reshape(len(departs), len(returns))
+    valid = (nights >= min_nights) & (nights <= max_nights)
+    prices = np.where(valid, outbound[..., :, None] + inbound[..., None, :], np.nan)
+    if params.budget_per_person > 0:
+        prices = np.where(prices <= params.budget_per_person, prices, np.nan)
+    with np.errstate(invalid="ignore"):
+        score = prices.sum(axis=0) + FAIRNESS_WEIGHT * (prices.max(axis=0) - prices.min(axis=0))
+    score = np.where(np.isfinite(score), score, np.inf)
+
+    ranked, fallback = [], []
+    for d_idx, dest in enumerate(candidates):
+        flat = score[d_idx].ravel()
+        best = [i for i in np.argsort(flat, kind="stable")[:params.max_date_windows] if np.isfinite(flat[i])]
+        if not best:
+            fallback.append(dest)
+            continue
+        windows = []
+        for i in best:
+            t_dep, t_ret = divmod(int(i), len(returns))
+            windows.append({
+                "depart_date": departs[t_dep].isoformat(),
+                "return_date": returns[t_ret].isoformat(),
+                "nights": int(nights[t_dep, t_ret]),
+            })
+        ranked.append((flat[best[0]], dest, windows))
+
+    ranked.sort(key=lambda item: item[0])
+    combos = [(dest, w) for _, dest, windows in ranked[:params.max_destinations] for w in windows]
+    fallback_windows, _ = plan_windows(params)
+    open_slots = max(params.max_destinations - len(ranked), 0)
+    combos += [(dest, w) for dest in fallback[:open_slots] for w in fallback_windows]
+    routes = len(candidates) * len(origins)
+    return {
+        "combos": combos,
+        "calls": calls,
+        "routes": routes,
+        "pairs": plan["pairs"],
+        "roundtrip_calls": plan["pairs"] * routes,
+        "first_departure": departs[0].isoformat(),
+        "last_departure": departs[-1].isoformat(),
+        "fallback": [d["iata"] for d in fallback],
+        "missing": fan_out.timed_out,
+        "failed": fan_out.failed,
+    }
+
+
+def run_search(
+    params: SearchParams,
+    fetch,
+    on_leg=None,
+    on_update=None,
+    on_phase=None,
+    base: PriceTensor = None,
+    fetch_dates=None,
+    fetch_inspiration=None,
+    fetch_grid=None,
+    fetch_oneway=None,
+) -> dict:
+    """
+    Führt eine komplette Suche aus (Grobsuche + Verfeinerung bzw. wöchentliche Fenster).
+
+    - `fetch`: Leg-Abfrage (z. B. `LegFetcher`), Signatur wie `run_leg_grid`.
+    - `on_leg(leg, quote, done, total)`, `on_update(tensor, complete_combos)`:
+      wie bei `run_leg_grid`; `on_phase(name)` bei jedem Phasenwechsel.
+    - Deadline (`params.deadline_s`) gilt für die ganze Suche; danach wird mit
+      den fertigen Legs gerankt.
+    - `base`: Tensor einer früheren Suche (siehe `SearchParams.reuses`); er wird
+      erweitert, abgefragt werden nur Kombinationen, die noch fehlen.
+    - Strategie Preis-Kalender: `fetch_dates` liefert den Kalender je Route
+      (Standard: `fetch.date_grid`, sonst ein `LegFetcher` ohne Cache);
+      `calendar` im Ergebnis fasst die Vorauswahl zusammen. `on_leg` meldet
+      dabei Routen, `missing`/`failed` enthalten auch Kalender-Routen
+      (`first_departure`/`last_departure` statt `departure_date`/`return_date`).
+    - Ziele: `select_candidates` mit Inspiration-Preisen von
+      `fetch_inspiration` (Standard: `fetch.inspiration`, sonst nur Entfernung);
+      `prescreen` im Ergebnis: Katalog, ausgewählt, davon mit Preis.
+    - `fetch_grid` (Standard: `fetch.price_grid`, z. B. Offline-Datensatz):
+      Raster in einem Schritt statt Leg für Leg (`fill_leg_grid`); `on_leg`
+      wird dann nicht aufgerufen.
+    - Strategie Einzelflüge: `fetch_oneway(origin_iata, destination_iata,
+      departure_date, non_stop, max_price)` (Standard: `fetch.oneway`, bei einer
+      Funktion `fetch` ohne Rückflug); `oneway` im Ergebnis fasst die Kombination
+      zusammen, `on_leg`, `missing` und `failed` enthalten auch die Einzelflüge
+      (ohne `return_date`). Kennt die Quelle keine Einzelflüge (`fetch.oneway`
+      None, z. B. Offline-Datensatz) oder wären Hin-/Rückflüge für dieselben
+      Paare billiger (`oneway_plan`), werden die groben Fenster aus
+      `plan_windows` abgefragt und `oneway["screened"]` ist False.
+
+    Rückgabe: {"table", "tensor", "calls", "calls_saved", "reused", "missing", "failed", "requested_keys", "calendar", "oneway", "prescreen"}
+    """
+    deadline = time.monotonic() + params.deadline_s
+    origins = params.origins
+    min_nights, max_nights = params.nights_range
+    adaptive = params.window_strategy == WINDOW_STRATEGY_ADAPTIVE
+    calendar = params.window_strategy == WINDOW_STRATEGY_CALENDAR
+    oneway = params.window_strategy == WINDOW_STRATEGY_ONEWAY
+    windows, refine_count = plan_windows(params)
+    if oneway and fetch_oneway is None:
+        fetch_oneway = fetch.oneway if hasattr(fetch, "oneway") else (lambda **leg: fetch(return_date=None, **leg))
+    oneway_screen = oneway and fetch_oneway is not None and oneway_plan(params)["worthwhile"]
+
+    out = {
+        "table": ResultTable.empty(origins),
+        "tensor": None,
+        "calls": 0,
+        "calls_saved": 0,
+        "reused": 0,
+        "missing": [],
+        "failed": [],
+        "requested_keys": [],
+        "calendar": None,
+        "oneway": None,
+        "prescreen": None,
+    }
+
+    # Vorauswahl der Ziele: ein Inspiration-Call je Startort statt Calls je Ziel
+    inspiration = None
+    if fetch_grid is None:
+        fetch_grid = getattr(fetch, "price_grid", None)
+    if fetch_inspiration is None:
+        fetch_inspiration = getattr(fetch, "inspiration", None)
+    if fetch_inspiration is not None and windows:
+        if on_phase:
+            on_phase(PHASE_PRESCREEN)
+        with stage(PHASE_PRESCREEN):
+            inspiration = screen_inspiration(params, fetch_inspiration, deadline)
+        out["calls"] += len(origins)
+    candidates = select_candidates(params, inspiration)
+    priced = known_fares(origins, [d["iata"] for d in candidates], inspiration)
+    out["prescreen"] = {
+        "catalogue": len(catalogue(params)),
+        "selected": len(candidates),
+        "priced": int(np.isfinite(priced).any(axis=0).sum()),
+    }
+
+    # Der Planer erzeugt nur Fenster innerhalb von `nights_range`
+    if not windows:
+        if base is not None:
+            out["tensor"], out["table"] = base, base.to_table()
+        return out
+
+    def track_leg(leg, quote, done_calls, total_calls_est):
+        out["requested_keys"].append(quote_cache_key(**leg))
+        if on_leg:
+            on_leg(leg, quote, done_calls, total_calls_est)
+
+    grid_args = {
+        "origins": origins,
+        "candidates": candidates,
+        "fetch": fetch,
+        "max_workers": params.max_workers,
+        "leg_filters": params.leg_filters(),
+        "passes_filters": params.passes_filters,
+        "on_leg": track_leg,
+        "on_update": on_update,
+        "deadline": deadline,
+    }
+
+    def collect(result):
+        out["calls"] += result["calls"]
+        out["calls_saved"] += result["calls_saved"]
+        out["missing"] += result["missing"]
+        out["failed"] += result["failed"]
+
+    def run_grid(grid_windows, combos, tensor):
+        if tensor is not None:
+            todo = [c for c in combos if not combo_known(tensor, params, *c)]
+            out["reused"] += len(combos) - len(todo)
+            combos = todo
+            if not combos:
+                tensor.add_candidates(candidates)
+                tensor.add_windows(grid_windows)
+                return tensor
+        if fetch_grid is not None:
+            result = fill_leg_grid(
+                origins, candidates, grid_windows, fetch_grid,
+                leg_filters=params.leg_filters(), on_update=on_update, combos=combos, tensor=tensor,
+            )
+        else:
+            result = run_leg_grid(windows=grid_windows, combos=combos, tensor=tensor, **grid_args)
+        collect(result)
+        return result["tensor"]
+
+    if calendar:
+        if on_phase:
+            on_phase(PHASE_CALENDAR)
+        if fetch_dates is None:
+            fetch_dates = getattr(fetch, "date_grid", None) or LegFetcher().date_grid
+        with stage(PHASE_CALENDAR):
+            screen = screen_calendar(params, candidates, fetch_dates, deadline, on_leg)
+        out["calls"] += screen["calls"]
+        out["missing"] += screen["missing"]
+        out["failed"] += screen["failed"]
+        out["calendar"] = {k: screen[k] for k in ("calls", "routes", "fallback")}
+        out["calendar"]["confirmed"] = len(screen["combos"])
+
+        if on_phase:
+            on_phase(PHASE_CONFIRM)
+        confirm_windows = list({window_key(w): w for _, w in screen["combos"]}.values())
+        with stage(PHASE_CONFIRM):
+            tensor = run_grid(confirm_windows, screen["combos"], base)
+    elif oneway_screen:
+        if on_phase:
+            on_phase(PHASE_ONEWAY)
+        # Eigene Deadline für die Einzelflüge, damit Zeit für die Bestätigung bleibt
+        now = time.monotonic()
+        screen_deadline = now + max(deadline - now, 0.0) * ONEWAY_SCREEN_DEADLINE_SHARE
+        with stage(PHASE_ONEWAY):
+            screen = screen_oneway(params, candidates, fetch_oneway, screen_deadline, on_leg)
+        out["calls"] += screen["calls"]
+        out["missing"] += screen["missing"]
+        out["failed"] += screen["failed"]
+        out["oneway"] = {k: screen[k] for k in (
+            "calls", "routes", "pairs", "roundtrip_calls", "first_departure", "last_departure", "fallback",
+        )}
+        out["oneway"].update(supported=True, screened=True, confirmed=len(screen["combos"]))
+
+        if on_phase:
+            on_phase(PHASE_CONFIRM)
+        confirm_windows = list({window_key(w): w for _, w in screen["combos"]}.values())
+        with stage(PHASE_CONFIRM):
+            tensor = run_grid(confirm_windows, screen["combos"], base)
+    else:
+        if oneway:
+            # Ohne Einzelflüge (Datenquelle) oder wenn sie sich nicht lohnen: gleichmäßig verteilte Hin-/Rückflug-Fenster
+            plan = oneway_plan(params)
+            out["oneway"] = {"supported": fetch_oneway is not None, "screened": False, "plan_calls": plan["calls"], "pairs": plan["pairs"]}
+        if on_phase:
+            on_phase(PHASE_COARSE if adaptive else PHASE_SEARCH)
+        with stage(PHASE_COARSE if adaptive else PHASE_SEARCH):
+            tensor = run_grid(windows, [(dest, w) for dest in candidates for w in windows], base)
+
+    # Verfeinerung nur, solange die Deadline noch nicht erreicht ist
+    if refine_count > 0 and time.monotonic() < deadline:
+        # Rest-Budget je Ziel rund um die günstigsten Fenster der Grobsuche einsetzen
+        radius = refine_radius(params.start_date, params.end_date, len(windows))
+        coarse_keys = {window_key(w) for w in windows}
+        first, last = params.start_date.isoformat(), params.end_date.isoformat()
+        refine_combos = []
+        for dest in candidates:
+            signal = [
+                (w, p) for w, p in tensor.combo_signal(tensor.dest_index(dest["iata"]))
+                if first <= w["depart_date"] <= last and min_nights <= w["nights"] <= max_nights
+            ]
+            # Früher schon verfeinerte Fenster im Zeitraum zählen aufs Budget (gleiche Suche = keine neuen Calls)
+            refined_before = sum(window_key(w) not in coarse_keys for w, _ in signal)
+            out["reused"] += min(refined_before, refine_count)
+            budget = max(refine_count - refined_before, 0)
+            proposals = refine_windows(
+                signal, params.start_date, params.end_date,
+                min_nights, max_nights, budget, radius_days=radius,
+            )
+            out["calls_saved"] += (budget - len(proposals)) * len(origins)
+            refine_combos.extend((dest, w) for w in proposals)
+
+        if refine_combos:
+            if on_phase:
+                on_phase(PHASE_REFINE)
+            refined_windows = list({window_key(w): w for _, w in refine_combos}.values())
+            with stage(PHASE_REFINE):
+                tensor = run_grid(refined_windows, refine_combos, tensor)
+
+    out["tensor"] = tensor
+    with stage("Tabelle"):
+        out["table"] = tensor.to_table()
+    return out
+
+
+# -----------------------------
+# Ranking
+# -----------------------------
+def rank_results(table: ResultTable, params: SearchParams, k: int = None):
+    """
+    Filter (Masken) + Score + Top-k; Rückgabe (idx, scores) wie `ResultTable.top_k`.
+    """
+    with stage("Ranking", rows=len(table)):
+        mask = table.filter_mask(
+            depart_range=(params.start_date, params.end_date) if params.start_date and params.end_date else None,
+            countries=params.countries,
+            nights_range=params.nights_range,
+            budget_per_person=params.budget_per_person,
+            nonstop_only=params.nonstop_only,
+        )
+        return table.top_k(k, mask)
+
+
+def search_job(params: dict, top_n: int = DEFAULT_RESULT_TOP_N, trace: SearchTrace = None) -> dict:
+    """
+    Eine Suche als JSON-fähiges Ergebnis (CLI, Batch-Service, Worker-Prozesse).
+    Ungültige Parameter ergeben {"errors": [...]} statt einer Exception.
+    `trace`: sammelt die Spans der Suche (z. B. für `search_cli --trace`);
+    die Zusammenfassung steht immer in `timings`.
+    """
+    search = SearchParams.from_dict(params)
+    errors = search.validate()
+    if errors:
+        return {"params": search.to_dict(), "errors": errors}
+
+    fetch = default_fetcher()
+    # Fehlende Zugangsdaten sofort melden statt jedes Leg einzeln scheitern zu lassen
+    client = get_client() if fetch.provider.live else None
+    trace = trace or SearchTrace()
+    t0 = time.monotonic()
+    with trace_scope(trace):
+        result = run_search(search, fetch)
+        fetch.record_demand(result["requested_keys"])
+        fetch.flush_history()
+        table = result["table"]
+        idx, scores = rank_results(table, search, top_n)
+    METRICS.inc("searches_total")
+    return {
+        "params": search.to_dict(),
+        "rows": table.to_records(idx, scores),
+        "combinations": len(table),
+        "calls": result["calls"],
+        "calls_saved": result["calls_saved"],
+        "missing": list(result["missing"]),
+        "failed": [{"leg": leg, "error": error} for leg, error in result["failed"]],
+        "calendar": result["calendar"],
+        "oneway": result["oneway"],
+        "prescreen": result["prescreen"],
+        "elapsed_s": round(time.monotonic() - t0, 3),
+        "api": client.stats() if client is not None else None,
+        "timings": trace.summary(),
+    }
@@ -0,0 +1,111 @@
+import math
+from datetime import date, timedelta
+
+
+def make_window(depart: date, nights: int) -> dict:
+    return {
+        "depart_date": depart.isoformat(),
+        "return_date": (depart + timedelta(days=int(nights))).isoformat(),
+        "nights": int(nights),
+    }
+
+
+def window_key(w: dict) -> tuple:
+    return (w["depart_date"], w["return_date"])
+
+
+def split_budget(windows_per_destination: int) -> tuple:
+    """
+    Teilt das Call-Budget pro Ziel in (Grobsuche, Verfeinerung) auf.
+    """
+    budget = max(int(windows_per_destination), 1)
+    coarse = max(math.ceil(budget / 2), 1)
+    return coarse, budget - coarse
+
+
+def coarse_windows(start_date: date, end_date: date, min_nights: int, max_nights: int, count: int) -> list:
+    """
+    Verteilt `count` Fenster gleichmäßig über den ganzen Zeitraum (Mitte je
+    Abschnitt) und wechselt dabei die Reisedauer durch, damit kurze und
+    lange Trips schon in der Grobsuche vorkommen.
+    """
+    if not start_date or not end_date or count <= 0:
+        return []
+
+    span_days = (end_date - start_date).days
+    preferred_nights = sorted({min_nights, (min_nights + max_nights) // 2, max_nights})
+
+    windows = []
+    seen = set()
+    for i in range(count):
+        offset = int((i + 0.5) * (span_days + 1) / count)
+        nights = preferred_nights[(i + len(preferred_nights) // 2) % len(preferred_nights)]
+        w = make_window(start_date + timedelta(days=min(offset, span_days)), nights)
+        if window_key(w) not in seen:
+            seen.add(window_key(w))
+            windows.append(w)
+    return windows
+
+
+def refine_windows(
+    priced: list,
+    start_date: date,
+    end_date: date,
+    min_nights: int,
+    max_nights: int,
+    count: int,
+    radius_days: int,
+    max_seeds: int = 3,
+) -> list:
+    """
+    Schlägt `count` neue Fenster rund um die günstigsten bisher gefundenen vor.
+
+    `priced`: Liste (window, preis) der bereits abgefragten Fenster eines
+    Ziels (Preis None = kein Angebot). Um die besten `max_seeds` Fenster
+    herum werden dichtere Abflugtage (±`radius_days`) und alle Reisedauern
+    im Bereich probiert, reihum über die Seeds (günstigster zuerst).
+    """
+    if count <= 0:
+        return []
+
+    tried = {window_key(w) for w, _ in priced}
+    seeds = sorted((p, w) for w, p in priced if p is not None and not math.isnan(p))
+    seeds = [w for _, w in seeds[:max_seeds]]
+    if not seeds:
+        return []
+
+    def neighbours(seed: dict):
+        seed_depart = date.fromisoformat(seed["depart_date"])
+        options = []
+        for delta in range(-radius_days, radius_days + 1):
+            depart = seed_depart + timedelta(days=delta)
+            if depart < start_date or depart > end_date:
+                continue
+            for nights in range(min_nights, max_nights + 1):
+                options.append((abs(delta) + abs(nights - seed["nights"]), delta, nights, depart))
+        options.sort()
+        for _, _, nights, depart in options:
+            yield make_window(depart, nights)
+
+    # Günstigster Seed bekommt pro Runde die meisten Vorschläge
+    generators = [(neighbours(seed), len(seeds) - i) for i, seed in enumerate(seeds)]
+    proposals = []
+    while generators and len(proposals) < count:
+        for entry in list(generators):
+            gen, picks = entry
+            for _ in range(picks):
+                w = next((w for w in gen if window_key(w) not in tried), None)
+                if w is None:
+                    generators.remove(entry)
+                    break
+                tried.add(window_key(w))
+                proposals.append(w)
+                if len(proposals) >= count:
+                    return proposals
+    return proposals
+
+
+def refine_radius(start_date: date, end_date: date, coarse_count: int) -> int:
+    # Halber Abstand zwischen zwei Grobsuche-Fenstern, mindestens 2 Tage
+    span_days = (end_date - start_date).days + 1
+    return max(2, span_days // max(2 * coarse_count, 1))